@@ -1,7 +1,6 @@
 from django import forms
 from django.contrib import admin
 from django.contrib import messages
-from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 from django.shortcuts import redirect
 from django.shortcuts import render
@@ -11,6 +10,8 @@ from django.utils.translation import gettext_lazy as _
 from appInstitutions.models import Institute
 
 from .forms import DualPasswordAuthenticationForm
+from .hashers import PASSWORD_PROFILE_CHOICES
+from .hashers import PASSWORD_PROFILE_DEFAULT
 from .models import Candidate
 from .models import User
 from .tasks import process_candidates_file
@@ -142,6 +143,10 @@ class CandidateAdmin(admin.ModelAdmin):
                 "file_format",
                 "auto",
             )  # auto, format1, or format2
+            password_profile = request.POST.get(
+                "password_profile",
+                PASSWORD_PROFILE_DEFAULT,
+            )
 
             # Validation
             if not uploaded_file:
@@ -162,27 +167,30 @@ class CandidateAdmin(admin.ModelAdmin):
                 messages.error(request, "Please select an institute.")
                 return redirect(request.get_full_path())
 
-            try:
-                # Save the file temporarily
-                file_name = f"candidate_imports/{institute_id}_{uploaded_file.name}"
-                file_path = default_storage.save(
-                    file_name,
-                    ContentFile(uploaded_file.read()),
-                )
+            if password_profile not in dict(PASSWORD_PROFILE_CHOICES):
+                messages.error(request, "Please select a valid password profile.")
+                return redirect(request.get_full_path())
 
-                # Validate file format before processing
+            try:
+                # Validate the upload's header before anything is stored
                 expected_format = None if file_format == "auto" else file_format
-                validation_result = validate_file_format(file_path, expected_format)
+                validation_result = validate_file_format(
+                    uploaded_file,
+                    uploaded_file.name,
+                    expected_format,
+                )
 
                 if not validation_result["is_valid"]:
-                    # Clean up the uploaded file
-                    default_storage.delete(file_path)
                     messages.error(
                         request,
                         f"File validation failed: {validation_result['error']}",
                     )
                     return redirect(request.get_full_path())
 
+                # Save the file for the worker, streamed from the upload
+                file_name = f"candidate_imports/{institute_id}_{uploaded_file.name}"
+                file_path = default_storage.save(file_name, uploaded_file)
+
                 # Use detected format if auto-detection was used
                 final_format = validation_result.get("detected_format", "format1")
 
@@ -191,12 +199,19 @@ class CandidateAdmin(admin.ModelAdmin):
                     file_path,
                     institute_id,
                     final_format,
+                    total_rows=validation_result["total_rows"],
+                    password_profile=password_profile,
                 )
 
+                total_rows = validation_result["total_rows"]
+                rows_label = str(total_rows) if total_rows else "all"
+                if total_rows and validation_result["rows_estimated"]:
+                    # Large CSV files only have an estimated row count
+                    rows_label = f"~{total_rows}"
                 messages.success(
                     request,
                     f"File upload started! Task ID: {task.id}. "
-                    f"Processing {validation_result['total_rows']} rows from {validation_result['file_type']} file "  # noqa: E501
+                    f"Processing {rows_label} rows from {validation_result['file_type']} file "  # noqa: E501
                     f"using {final_format}. "
                     "Processing will happen in the background. "
                     "You'll be notified when it's complete.",
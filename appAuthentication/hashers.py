@@ -0,0 +1,63 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.contrib.auth.hashers import make_password
+
+# Both the default hasher and PBKDF2 release the GIL while hashing, so a
+# thread per core scales like a process pool without forking the worker
+HASH_WORKERS = os.cpu_count() or 1
+
+PASSWORD_PROFILE_DEFAULT = "default"  # noqa: S105
+PASSWORD_PROFILE_EXAM = "exam"  # noqa: S105
+
+PASSWORD_PROFILE_CHOICES = [
+    (PASSWORD_PROFILE_DEFAULT, "Default (site password hasher)"),
+    (PASSWORD_PROFILE_EXAM, "Exam credentials (faster, short-lived)"),
+]
+
+
+class ExamCredentialPasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 with a lower work factor for generated exam credentials, which
+    only live for one exam. Never the default; chosen per candidate import.
+
+    Listed after the default hasher, so Django would re-hash these passwords
+    with it on the first successful check_password(). That would put a
+    full-cost hash and a user UPDATE on every candidate's first login, which
+    is exactly what this hasher exists to avoid, so User.check_password()
+    verifies them without the upgrade setter (see is_exam_credential()).
+    """
+
+    algorithm = "pbkdf2_sha256_exam"
+    iterations = 100_000
+
+
+def is_exam_credential(encoded):
+    """Whether `encoded` was hashed by ExamCredentialPasswordHasher."""
+    return bool(encoded) and encoded.startswith(
+        f"{ExamCredentialPasswordHasher.algorithm}$",
+    )
+
+
+def password_hasher(profile):
+    """Hasher argument for make_password() for an import profile."""
+    if profile == PASSWORD_PROFILE_EXAM:
+        return ExamCredentialPasswordHasher()
+    if profile == PASSWORD_PROFILE_DEFAULT:
+        return "default"
+    msg = f"Unknown password profile: {profile}"
+    raise ValueError(msg)
+
+
+def hash_passwords(raw_passwords, profile=PASSWORD_PROFILE_DEFAULT):
+    """Hash `raw_passwords` across HASH_WORKERS threads, keeping their order."""
+    hasher = password_hasher(profile)
+
+    def _hash(raw):
+        return make_password(raw, hasher=hasher)
+
+    if HASH_WORKERS == 1:
+        return [_hash(raw) for raw in raw_passwords]
+    with ThreadPoolExecutor(max_workers=HASH_WORKERS) as pool:
+        return list(pool.map(_hash, raw_passwords))
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.9 on 2026-10-16 10:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appAuthentication', '0013_user_token_version'),
+        ('appInstitutions', '0010_institute_show_student_submissions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='candidate',
+            name='symbol_prefix',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='candidate',
+            name='symbol_suffix',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='candidate',
+            index=models.Index(fields=['symbol_prefix', 'symbol_suffix'], name='candidate_symbol_range_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+import re
+
+from django.db import migrations
+
+BATCH_SIZE = 2000
+TRAILING_DIGITS = re.compile(r"(\d+)$")
+
+
+def backfill_symbol_components(apps, schema_editor):
+    Candidate = apps.get_model("appAuthentication", "Candidate")
+    batch = []
+    for candidate in Candidate.objects.only("id", "symbol_number").iterator(
+        chunk_size=BATCH_SIZE,
+    ):
+        symbol = (candidate.symbol_number or "").strip()
+        match = TRAILING_DIGITS.search(symbol)
+        if match:
+            candidate.symbol_prefix = symbol[: match.start()].lower()
+            candidate.symbol_suffix = int(match.group(1))
+        else:
+            candidate.symbol_prefix, candidate.symbol_suffix = "", None
+        batch.append(candidate)
+        if len(batch) >= BATCH_SIZE:
+            Candidate.objects.bulk_update(batch, ["symbol_prefix", "symbol_suffix"])
+            batch = []
+    if batch:
+        Candidate.objects.bulk_update(batch, ["symbol_prefix", "symbol_suffix"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appAuthentication', '0014_candidate_symbol_components'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_symbol_components, migrations.RunPython.noop),
+    ]
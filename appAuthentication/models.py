@@ -6,6 +6,8 @@ from django.contrib.auth.models import PermissionsMixin
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
+from appAuthentication.hashers import is_exam_credential
+from appAuthentication.utils.symbol_number import symbol_components
 from appAuthentication.utils.upload_to_institute import fingerprint_upload_to_institute
 from appAuthentication.utils.upload_to_institute import image_upload_to_institute
 from appInstitutions.models import Institute
@@ -45,6 +47,13 @@ class User(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return self.email
 
+    def check_password(self, raw_password):
+        # No setter, so exam credentials are never upgraded; see
+        # ExamCredentialPasswordHasher for why
+        if is_exam_credential(self.password):
+            return check_password(raw_password, self.password, setter=None)
+        return super().check_password(raw_password)
+
     def set_admin_password2(self, raw_password):
         """
         Securely sets the admin second password using Django's password hasher.
@@ -94,6 +103,9 @@ class Candidate(models.Model):
     admit_card_id = models.IntegerField()
     profile_id = models.IntegerField()
     symbol_number = models.CharField(max_length=100, unique=True)
+    # Normalized parts of symbol_number, so range enrollment can filter in SQL
+    symbol_prefix = models.CharField(max_length=100, blank=True, default="")
+    symbol_suffix = models.BigIntegerField(null=True, blank=True)
     exam_processing_id = models.IntegerField()
     gender = models.CharField(max_length=10)
     citizenship_no = models.CharField(max_length=100)
@@ -139,11 +151,34 @@ class Candidate(models.Model):
         blank=True,
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["symbol_prefix", "symbol_suffix"],
+                name="candidate_symbol_range_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.symbol_number})"
 
+    def save(self, *args, **kwargs):
+        self.fill_symbol_components()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "symbol_number" in update_fields:
+            kwargs["update_fields"] = {
+                *update_fields,
+                "symbol_prefix",
+                "symbol_suffix",
+            }
+        super().save(*args, **kwargs)
+
     def delete(self, *args, **kwargs):
         # delete linked user first
         if self.user:
             self.user.delete()
         super().delete(*args, **kwargs)
+
+    def fill_symbol_components(self):
+        """Derive symbol_prefix/symbol_suffix; bulk_create callers must call this"""
+        self.symbol_prefix, self.symbol_suffix = symbol_components(self.symbol_number)
@@ -1,14 +1,23 @@
+import contextlib
 import csv
+import io
 import logging
 import os
 import random
 import string
 
+import openpyxl
 import pandas as pd
 from celery import shared_task
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
 from django.core.files.storage import default_storage
+from django.db import IntegrityError
+from django.db import transaction
 
+from appAuthentication.hashers import PASSWORD_PROFILE_DEFAULT
+from appAuthentication.hashers import hash_passwords
+from appAuthentication.hashers import password_hasher
 from appAuthentication.models import Candidate
 from appCore.models import CeleryTask
 from appCore.utils.track_task import track_task
@@ -17,14 +26,23 @@ from appInstitutions.models import Institute
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
+IMPORT_CHUNK_SIZE = 1000
+# Bytes of a CSV upload read to validate its header and estimate its size
+SNIFF_BYTES = 64 * 1024
 
-def process_batch(users_batch, candidates_batch):
+
+def process_batch(
+    users_batch,
+    candidates_batch,
+    password_profile=PASSWORD_PROFILE_DEFAULT,
+):
     """
     BEST APPROACH: Process batch using get_or_create for robust duplicate handling
     Returns (created_count, errors_list)
     """
     created_count = 0
     errors = []
+    hasher = password_hasher(password_profile)
 
     for user_data, candidate_data in zip(users_batch, candidates_batch, strict=False):
         try:
@@ -48,7 +66,7 @@ def process_batch(users_batch, candidates_batch):
                 continue
 
             # Set password properly since get_or_create doesn't hash it
-            user.set_password(user_data["password"])
+            user.password = make_password(user_data["password"], hasher=hasher)
             user.save()
 
             # Create candidate - this is safe now since we checked for duplicates
@@ -64,10 +82,140 @@ def process_batch(users_batch, candidates_batch):
     return created_count, errors
 
 
+def import_candidate_chunk(entries, password_profile=PASSWORD_PROFILE_DEFAULT):
+    """
+    Insert one chunk of prepared rows [(row_number, user_data, candidate_data)]
+    with two bulk_create calls. Existing symbol numbers and emails are
+    prefetched with one query each and the chunk's passwords are hashed
+    in parallel up front. Returns (created_count, errors_list).
+    """
+    errors = []
+    symbols = {candidate_data["symbol_number"] for _, _, candidate_data in entries}
+    emails = {user_data["email"] for _, user_data, _ in entries}
+    taken_symbols = set(
+        Candidate.objects.filter(symbol_number__in=symbols).values_list(
+            "symbol_number",
+            flat=True,
+        ),
+    )
+    taken_emails = set(
+        User.objects.filter(email__in=emails).values_list("email", flat=True),
+    )
+
+    users = []
+    candidates = []
+    raw_passwords = []
+    for row_number, user_data, candidate_data in entries:
+        symbol = candidate_data["symbol_number"]
+        email = user_data["email"]
+        if symbol in taken_symbols:
+            errors.append(
+                f"Row {row_number}: Candidate with symbol number {symbol} "
+                "already exists",
+            )
+            continue
+        if email in taken_emails:
+            errors.append(f"Row {row_number}: User with email {email} already exists")
+            continue
+        # Later duplicates inside the file are reported like existing rows
+        taken_symbols.add(symbol)
+        taken_emails.add(email)
+
+        users.append(
+            User(
+                email=email,
+                is_candidate=user_data.get("is_candidate", True),
+            ),
+        )
+        raw_passwords.append(user_data["password"])
+        candidate = Candidate(**candidate_data)
+        candidate.fill_symbol_components()
+        candidates.append(candidate)
+
+    if not users:
+        return 0, errors
+
+    hashed = hash_passwords(raw_passwords, password_profile)
+    for user, password in zip(users, hashed, strict=True):
+        user.password = password
+
+    try:
+        with transaction.atomic():
+            User.objects.bulk_create(users, batch_size=IMPORT_CHUNK_SIZE)
+            for user, candidate in zip(users, candidates, strict=True):
+                candidate.user = user
+            Candidate.objects.bulk_create(candidates, batch_size=IMPORT_CHUNK_SIZE)
+    except IntegrityError:
+        # A concurrent import won a race for some rows; isolate them row by row
+        logger.warning("Bulk insert conflict, retrying chunk row by row")
+        created, row_errors = process_batch(
+            [user_data for _, user_data, _ in entries],
+            [candidate_data for _, _, candidate_data in entries],
+            password_profile,
+        )
+        return created, row_errors
+
+    return len(candidates), errors
+
+
+def prepare_row(row_number, row, institute, file_format):
+    """
+    Clean one raw row into (user_data, candidate_data, warnings), or raise
+    ValueError when it cannot be imported.
+    """
+    warnings = []
+    if file_format == "format2":
+        data = clean_row_data_format2(row)
+    else:
+        data = clean_row_data(row)
+
+    # Validate required fields
+    if not data.get("symbol_number") or not data.get("email"):
+        msg = f"Row {row_number}: Missing required fields (symbol_number or email)"
+        raise ValueError(msg)
+
+    # Process initial_image path
+    initial_image = data.get("initial_image", "").strip()
+    if initial_image:
+        data["initial_image"] = f"{institute.name}/candidatePhotos/{initial_image}"
+    else:
+        data["initial_image"] = None
+
+    email = data["email"].lower().strip().replace(" ", "")
+
+    # Basic validation
+    if not email or "@" not in email:
+        email += "@wrongmail.com"
+        warnings.append(
+            f"Row {row_number}: Invalid email format. Assigned default domain.",
+        )
+    data["email"] = email
+
+    allowed_digits = string.digits.replace("0", "").replace("1", "")
+    random_password = "".join(random.choices(allowed_digits, k=8))  # noqa: S311
+
+    user_data = {"email": email, "password": random_password, "is_candidate": True}
+    candidate_data = {
+        **data,
+        "institute": institute,
+        "generated_password": random_password,
+    }
+    return user_data, candidate_data, warnings
+
+
 @shared_task(bind=True)
-def process_candidates_file(self, file_path, institute_id, file_format="format1"):
+def process_candidates_file(  # noqa: PLR0913
+    self,
+    file_path,
+    institute_id,
+    file_format="format1",
+    total_rows=None,
+    password_profile=PASSWORD_PROFILE_DEFAULT,
+):
     """
-    IMPROVED: Process CSV or Excel file with robust error handling
+    Stream a CSV or Excel roster into User/Candidate rows, IMPORT_CHUNK_SIZE
+    rows at a time. `total_rows`, when known, only drives progress reporting;
+    `password_profile` picks the hasher for the generated passwords.
     """
     with track_task(self.request.id, "process_candidates_file") as task:
         try:
@@ -77,128 +225,68 @@ def process_candidates_file(self, file_path, institute_id, file_format="format1"
 
             institute = Institute.objects.get(id=institute_id)
             file_extension = os.path.splitext(file_path)[1].lower()
+            rows = iter_rows(file_path)
 
-            # Read file based on extension
-            if file_extension == ".csv":
-                task.message = "Reading CSV file"
-                task.save()
-                rows = read_csv_file(file_path)
-            elif file_extension in [".xlsx", ".xls"]:
-                task.message = "Reading Excel file"
-                task.save()
-                rows = read_excel_file(file_path)
-            else:
-                raise ValueError(f"Unsupported file format: {file_extension}")
-
-            total_rows = len(rows)
-            if total_rows == 0:
-                task.message = "File is empty - no candidates to process"
-                task.status = CeleryTask.get_status_value("FAILURE")
-                task.save()
-                return {"status": "error", "message": "File is empty"}
-
-            # Process in smaller batches for better memory management
-            batch_size = 50  # Reduced batch size for better error isolation
             processed_rows = 0
+            seen_rows = 0
             all_errors = []
-            users_batch = []
-            candidates_batch = []
+            chunk = []
 
             logger.info(
-                f"Starting to process {total_rows} candidates from {file_extension} file for institute {institute.name} using {file_format}",
+                f"Starting to import candidates from {file_extension} file for institute {institute.name} using {file_format}",
             )
 
-            task.message = f"Processing {total_rows} candidates ({file_format})"
+            task.message = f"Processing candidates ({file_format})"
             task.progress = 10
             task.save()
 
+            def flush(chunk):
+                nonlocal processed_rows
+                created, errors = import_candidate_chunk(chunk, password_profile)
+                processed_rows += created
+                all_errors.extend(errors)
+
+                if total_rows:
+                    # total_rows may be an estimate, so never report past it
+                    expected = max(total_rows, seen_rows)
+                    task.progress = min(90, int(10 + 80 * seen_rows / expected))
+                    task.message = f"Processed {seen_rows}/{expected} candidates"
+                else:
+                    task.message = f"Processed {seen_rows} candidates"
+                task.save()
+
             for index, row in enumerate(rows):
+                seen_rows = index + 1
                 try:
-                    # Clean data based on format
-                    if file_format == "format2":
-                        data = clean_row_data_format2(row)
-                    else:
-                        data = clean_row_data(row)
-
-                    # Validate required fields
-                    if not data.get("symbol_number") or not data.get("email"):
-                        all_errors.append(
-                            f"Row {index + 1}: Missing required fields (symbol_number or email)",
-                        )
-                        continue
-
-                    # Process initial_image path
-                    initial_image = data.get("initial_image", "").strip()
-                    if initial_image:
-                        data["initial_image"] = (
-                            f"{institute.name}/candidatePhotos/{initial_image}"
-                        )
-                    else:
-                        data["initial_image"] = None
-
-                    symbol = data["symbol_number"]
-                    email = data["email"].lower()
-
-                    email = email.strip().replace(" ", "")
-
-                    # Basic validation
-                    if not email or "@" not in email:
-                        email += "@wrongmail.com"
-                        all_errors.append(
-                            f"Row {index + 1}: Invalid email format. Assigned default domain."
-                        )
-
-                    allowed_digits = string.digits.replace("0", "").replace("1", "")
-
-                    random_password = "".join(random.choices(allowed_digits, k=8))  # noqa: S311
-                    
-                    users_batch.append(
-                        {
-                            "email": email,
-                            "password": random_password,
-                            "is_candidate": True,
-                        },
-                    )
-
-                    candidates_batch.append(
-                        {
-                            **data,
-                            "institute": institute,
-                            "generated_password": random_password,
-                        },
+                    user_data, candidate_data, warnings = prepare_row(
+                        seen_rows,
+                        row,
+                        institute,
+                        file_format,
                     )
-
-                    # Process batch when it reaches batch_size
-                    if len(candidates_batch) >= batch_size:
-                        batch_created, batch_errors = process_batch(
-                            users_batch,
-                            candidates_batch,
-                        )
-                        processed_rows += batch_created
-                        all_errors.extend(batch_errors)
-
-                        users_batch.clear()
-                        candidates_batch.clear()
-
-                        # Update progress
-                        progress = min(90, int(10 + 80 * (index + 1) / total_rows))
-                        task.message = f"Processed {index + 1}/{total_rows} candidates"
-                        task.progress = progress
-                        task.save()
-
+                except ValueError as e:
+                    all_errors.append(str(e))
+                    continue
                 except Exception as e:
-                    error_msg = f"Row {index + 1}: {e!s}"
+                    error_msg = f"Row {seen_rows}: {e!s}"
                     logger.exception(error_msg)
                     all_errors.append(error_msg)
+                    continue
 
-            # Process remaining candidates in final batch
-            if candidates_batch:
-                batch_created, batch_errors = process_batch(
-                    users_batch,
-                    candidates_batch,
-                )
-                processed_rows += batch_created
-                all_errors.extend(batch_errors)
+                all_errors.extend(warnings)
+                chunk.append((seen_rows, user_data, candidate_data))
+                if len(chunk) >= IMPORT_CHUNK_SIZE:
+                    flush(chunk)
+                    chunk = []
+
+            if chunk:
+                flush(chunk)
+
+            if seen_rows == 0:
+                task.message = "File is empty - no candidates to process"
+                task.status = CeleryTask.get_status_value("FAILURE")
+                task.save()
+                return {"status": "error", "message": "File is empty"}
 
             # Clean up uploaded file
             try:
@@ -207,7 +295,7 @@ def process_candidates_file(self, file_path, institute_id, file_format="format1"
                 logger.warning(f"Failed to delete file {file_path}: {e!s}")
 
             logger.info(
-                f"Completed processing. {processed_rows}/{total_rows} candidates created successfully",
+                f"Completed processing. {processed_rows}/{seen_rows} candidates created successfully",
             )
 
             # Set final task status - ALWAYS SUCCESS to prevent retry loops
@@ -226,16 +314,14 @@ def process_candidates_file(self, file_path, institute_id, file_format="format1"
                 task.status = CeleryTask.get_status_value("SUCCESS")
 
             result_data = {
-                "total_rows": total_rows,
+                "total_rows": seen_rows,
                 "processed_rows": processed_rows,
                 "errors": all_errors[:50],  # Limit errors to prevent huge responses
                 "total_errors": len(all_errors),
                 "institute_name": institute.name,
                 "file_type": file_extension,
                 "format_used": file_format,
-                "success_rate": f"{(processed_rows / total_rows * 100):.1f}%"
-                if total_rows > 0
-                else "0%",
+                "success_rate": f"{(processed_rows / seen_rows * 100):.1f}%",
             }
 
             task.result = str(result_data)
@@ -268,22 +354,96 @@ def process_candidates_file(self, file_path, institute_id, file_format="format1"
             raise self.retry(countdown=30, max_retries=2, exc=e)
 
 
-# Keep existing helper functions unchanged
-def read_csv_file(file_path):
-    """Read CSV file and return list of dictionaries"""
-    with default_storage.open(file_path, "r") as csvfile:
-        content = csvfile.read()
-    csv_reader = csv.DictReader(content.splitlines())
-    return list(csv_reader)
+def iter_rows(file_path):
+    """Stream the rows of a CSV or Excel roster as dictionaries"""
+    file_extension = os.path.splitext(file_path)[1].lower()
+    if file_extension == ".csv":
+        return iter_csv_rows(file_path)
+    if file_extension in [".xlsx", ".xls"]:
+        return iter_excel_rows(file_path)
+    raise ValueError(f"Unsupported file format: {file_extension}")
+
+
+def iter_csv_rows(file_path):
+    """Yield CSV rows as dictionaries without loading the whole file"""
+    with default_storage.open(file_path, "rb") as raw:
+        reader = csv.reader(io.TextIOWrapper(raw, encoding="utf-8-sig", newline=""))
+        header = next(reader, None)
+        if header is None:
+            return
+        header = [column.strip() for column in header]
+        for values in reader:
+            if any(values):
+                yield dict(zip(header, values, strict=False))
+
+
+def iter_excel_rows(file_path):
+    """Yield worksheet rows as dictionaries using openpyxl's read-only mode"""
+    with default_storage.open(file_path, "rb") as excel_file:
+        workbook = openpyxl.load_workbook(excel_file, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            header = [
+                "" if column is None else str(column).strip() for column in header
+            ]
+            for values in rows:
+                if any(value not in (None, "") for value in values):
+                    yield {
+                        column: "" if value is None else value
+                        for column, value in zip(header, values, strict=False)
+                    }
+        finally:
+            workbook.close()
+
+
+def sniff_csv(file_obj, size):
+    """
+    Read the header and at most SNIFF_BYTES of a CSV upload. Returns
+    (columns, estimated data rows); the estimate is exact for small files.
+    """
+    sample = file_obj.read(SNIFF_BYTES)
+    complete = len(sample) < SNIFF_BYTES
+    if not complete:
+        # Only count rows that fit entirely in the sample
+        sample = sample[: sample.rfind(b"\n") + 1]
+
+    lines = sample.decode("utf-8-sig", errors="replace").splitlines()
+    rows = []
+    # A quoted field may be cut off by the sample boundary
+    with contextlib.suppress(csv.Error):
+        rows.extend(csv.reader(lines))
+    if not rows:
+        return [], 0
 
+    columns = [column.strip() for column in rows[0]]
+    data_rows = sum(1 for values in rows[1:] if any(values))
+    if complete or not sample:
+        return columns, data_rows
+    return columns, round(size * data_rows / len(sample))
 
-def read_excel_file(file_path):
-    """Read Excel file and return list of dictionaries"""
-    with default_storage.open(file_path, "rb") as excel_file:
-        df = pd.read_excel(excel_file, engine="openpyxl")
-        df = df.fillna("")
-        df.columns = df.columns.astype(str).str.strip()
-        return df.to_dict("records")
+
+def sniff_excel(file_obj):
+    """
+    Read the header row and the sheet dimensions of an Excel upload.
+    Returns (columns, data rows), with None rows when the sheet has no
+    dimension record.
+    """
+    workbook = openpyxl.load_workbook(file_obj, read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+        header = next(sheet.iter_rows(max_row=1, values_only=True), None)
+        if header is None:
+            return [], 0
+        columns = [
+            str(column).strip() for column in header if column not in (None, "")
+        ]
+        max_row = sheet.max_row
+        return columns, (max_row - 1 if max_row else None)
+    finally:
+        workbook.close()
 
 
 def clean_row_data(row):
@@ -370,35 +530,42 @@ def clean_row_data_format2(row):
     }
 
 
-def validate_file_format(file_path, expected_format=None):
+def validate_file_format(file_obj, file_name, expected_format=None):
     """
     Validate if the uploaded file has the correct format and required columns
     If expected_format is None, auto-detect the format
+
+    Only the header (and, for CSV, a short sample) is read, so this runs on
+    the upload before it is saved. `total_rows` is an estimate for large
+    CSV files (flagged by `rows_estimated`) and None when an Excel sheet
+    does not record its size.
     """
-    file_extension = os.path.splitext(file_path)[1].lower()
+    file_extension = os.path.splitext(file_name)[1].lower()
 
     try:
+        file_obj.seek(0)
         if file_extension == ".csv":
-            rows = read_csv_file(file_path)
+            columns, total_rows = sniff_csv(file_obj, file_obj.size)
         elif file_extension in [".xlsx", ".xls"]:
-            rows = read_excel_file(file_path)
+            columns, total_rows = sniff_excel(file_obj)
         else:
             return {
                 "is_valid": False,
                 "error": f"Unsupported file format: {file_extension}. Please upload CSV or Excel files.",
             }
+        file_obj.seek(0)
 
-        if not rows:
+        if not columns or total_rows == 0:
             return {
                 "is_valid": False,
                 "error": "File is empty or has no data rows.",
             }
 
-        available_columns = set(rows[0].keys())
+        available_columns = set(columns)
 
         # Auto-detect format if not specified
         if expected_format is None:
-            detected_format = detect_file_format(rows)
+            detected_format = detect_file_format(available_columns)
             if detected_format == "unknown":
                 return {
                     "is_valid": False,
@@ -445,7 +612,9 @@ def validate_file_format(file_path, expected_format=None):
 
         return {
             "is_valid": True,
-            "total_rows": len(rows),
+            "total_rows": total_rows,
+            # sniff_csv only counts a sample of files at least this large
+            "rows_estimated": file_extension == ".csv" and file_obj.size >= SNIFF_BYTES,
             "columns": list(available_columns),
             "file_type": file_extension,
             "detected_format": expected_format,
@@ -458,15 +627,13 @@ def validate_file_format(file_path, expected_format=None):
         }
 
 
-def detect_file_format(rows):
+def detect_file_format(available_columns):
     """
     Auto-detect the file format based on available columns
     """
-    if not rows:
+    if not available_columns:
         return "unknown"
 
-    available_columns = set(rows[0].keys())
-
     # Check for format2 columns (simplified format)
     format2_columns = {"Name", "Mobile", "Email", "Symbol Number", "Level"}
     format2_match = len(format2_columns.intersection(available_columns))
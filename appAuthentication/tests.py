@@ -1,3 +1,401 @@
-from django.test import TestCase
+import csv
+import io
+import json
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import openpyxl
+import pytest
+from django.contrib.auth.hashers import check_password
+from django.contrib.auth.hashers import make_password
+from django.contrib.messages import get_messages
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from appAuthentication import hashers
+from appAuthentication import tasks as candidate_tasks
+from appAuthentication.hashers import PASSWORD_PROFILE_DEFAULT
+from appAuthentication.hashers import PASSWORD_PROFILE_EXAM
+from appAuthentication.hashers import hash_passwords
+from appAuthentication.hashers import is_exam_credential
+from appAuthentication.models import Candidate
+from appAuthentication.models import User
+from appAuthentication.tasks import import_candidate_chunk
+from appAuthentication.tasks import prepare_row
+from appAuthentication.tasks import process_candidates_file
+from appAuthentication.tasks import validate_file_format
+from appAuthentication.utils.closest_enrollment import get_closest_enrollment
+from appAuthentication.utils.symbol_number import symbol_components
+from appExam.models import ExamSession
+from appExam.models import StudentExamEnrollment
+from appExam.tasks import parse_flexible_range_string
+from appExam.tasks import symbol_range_q
+from appExam.utils.paper import cache_paper
+from appExam.utils.randomize import randomize_unless_done
+
+
+def _login(candidate, password="password"):  # noqa: S107
+    return APIClient().post(
+        reverse("api:candidate-login"),
+        {"symbol_number": candidate.symbol_number, "password": password},
+        format="json",
+    )
+
+
+def test_login_randomizes_and_publishes_the_paper(
+    enrollments,
+    redis_client,
+    django_capture_on_commit_callbacks,
+):
+    enrollment = enrollments[0]
+    with django_capture_on_commit_callbacks(execute=True):
+        response = _login(enrollment.candidate)
+    assert response.status_code == status.HTTP_200_OK, response.content
+
+    enrollment.refresh_from_db()
+    assert len(enrollment.question_order) == enrollment.session.question_set.count()
+    paper = json.loads(redis_client.get(f"exam_paper_{enrollment.id}"))
+    assert paper["pages"] == enrollment.question_order
+
+
+def test_login_keeps_an_order_stored_by_the_warm_up(
+    enrollments,
+    redis_client,
+    django_capture_on_commit_callbacks,
+):
+    enrollment = enrollments[0]
+    ExamSession.objects.filter(pk=enrollment.session_id).update(
+        base_start=timezone.now() + timedelta(hours=1),
+    )
+    # The login resolves from a cached copy taken before the warm-up ran
+    assert not get_closest_enrollment(enrollment.candidate).question_order
+    warmed = StudentExamEnrollment.objects.get(pk=enrollment.pk)
+    randomize_unless_done(warmed)
+    cache_paper(warmed)
+    published = redis_client.get(f"exam_paper_{enrollment.id}")
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = _login(enrollment.candidate)
+    assert response.status_code == status.HTTP_200_OK, response.content
+
+    enrollment.refresh_from_db()
+    assert enrollment.question_order == warmed.question_order
+    assert enrollment.answer_order == warmed.answer_order
+    assert redis_client.get(f"exam_paper_{enrollment.id}") == published
+
+
+def test_randomize_unless_done_copies_the_stored_order(enrollments):
+    stale = enrollments[0]
+    current = StudentExamEnrollment.objects.get(pk=stale.pk)
+    assert randomize_unless_done(current)
+
+    assert not randomize_unless_done(stale)
+    assert stale.question_order == current.question_order
+    assert stale.answer_order == current.answer_order
+
+
+@pytest.mark.parametrize("password", ["wrong", ""])
+def test_login_rejects_a_wrong_password(enrollments, password):
+    response = _login(enrollments[0].candidate, password)
+    assert response.status_code in {
+        status.HTTP_400_BAD_REQUEST,
+        status.HTTP_401_UNAUTHORIZED,
+    }
+    enrollments[0].refresh_from_db()
+    assert not enrollments[0].question_order
+
+
+@pytest.mark.parametrize(
+    ("symbol", "components"),
+    [
+        ("b10001", ("b", 10001)),
+        (" MG12XX10 ", ("mg12xx", 10)),
+        ("10001", ("", 10001)),
+        ("abc", ("", None)),
+        ("", ("", None)),
+    ],
+)
+def test_symbol_components(symbol, components):
+    assert symbol_components(symbol) == components
+
+
+def test_candidate_symbol_components_follow_the_symbol(make_candidate):
+    candidate = make_candidate("B10042")
+    assert (candidate.symbol_prefix, candidate.symbol_suffix) == ("b", 10042)
+
+    candidate.symbol_number = "p7"
+    candidate.save(update_fields=["symbol_number"])
+    candidate.refresh_from_db()
+    assert (candidate.symbol_prefix, candidate.symbol_suffix) == ("p", 7)
+
+
+def test_symbol_ranges_match_in_sql(make_candidate):
+    for symbol in ["b10001", "b10005", "b10010", "B10011", "p10005", "b20001"]:
+        make_candidate(symbol)
+
+    def matching(range_string):
+        ranges = parse_flexible_range_string(range_string)
+        return sorted(
+            Candidate.objects.filter(symbol_range_q(ranges)).values_list(
+                "symbol_number",
+                flat=True,
+            ),
+        )
+
+    assert matching("b10010|b10001") == ["b10001", "b10005", "b10010"]
+    assert matching("b10011, p10005") == ["B10011", "p10005"]
+    assert matching("b10005|p10005") == []
+    assert len(matching("*")) == Candidate.objects.count()
+
+
+CANDIDATE_HEADER = ["Name", "Mobile", "Email", "Symbol Number", "Level"]
+
+
+def _entries(institute, rows):
+    entries = []
+    for row_number, row in enumerate(rows, start=1):
+        user_data, candidate_data, _ = prepare_row(
+            row_number,
+            dict(zip(CANDIDATE_HEADER, row, strict=True)),
+            institute,
+            "format2",
+        )
+        entries.append((row_number, user_data, candidate_data))
+    return entries
+
+
+def test_import_candidate_chunk_reports_taken_rows(institute, make_candidate):
+    make_candidate("b10000")
+    make_candidate("b10001")
+    entries = _entries(
+        institute,
+        [
+            ["Ram Bahadur Thapa", "1", "new1@example.com", "z1", "L"],
+            ["Taken Symbol", "1", "new2@example.com", "b10000", "L"],
+            ["Taken Email", "1", "b10001@example.com", "z2", "L"],
+            ["Same Symbol", "1", "new3@example.com", "z1", "L"],
+            ["Same Email", "1", "new1@example.com", "z3", "L"],
+        ],
+    )
+
+    created, errors = import_candidate_chunk(entries)
+
+    assert created == 1
+    assert [error.split(":")[0] for error in errors] == [
+        "Row 2",
+        "Row 3",
+        "Row 4",
+        "Row 5",
+    ]
+    candidate = Candidate.objects.get(symbol_number="z1")
+    assert candidate.user.email == "new1@example.com"
+    assert candidate.user.check_password(candidate.generated_password)
+    assert (candidate.first_name, candidate.middle_name, candidate.last_name) == (
+        "Ram",
+        "Bahadur",
+        "Thapa",
+    )
+    assert (candidate.symbol_prefix, candidate.symbol_suffix) == ("z", 1)
+
+
+def test_import_candidate_chunk_falls_back_row_by_row(institute, monkeypatch):
+    entries = _entries(
+        institute,
+        [[f"A B{n}", "1", f"s{n}@example.com", f"z{n}", "L"] for n in range(3)],
+    )
+
+    hash_passwords = candidate_tasks.hash_passwords
+
+    def lose_the_race(raw_passwords, profile):
+        # Another import commits one of the rows after the prefetch
+        User.objects.create_user(email="s1@example.com", password="password")  # noqa: S106
+        return hash_passwords(raw_passwords, profile)
+
+    monkeypatch.setattr(candidate_tasks, "hash_passwords", lose_the_race)
+
+    created, errors = import_candidate_chunk(entries)
+
+    assert created == 2  # noqa: PLR2004
+    assert errors == ["User with email s1@example.com already exists"]
+    assert sorted(
+        Candidate.objects.values_list("symbol_number", flat=True),
+    ) == ["z0", "z2"]
+    # The rolled back bulk insert leaves no extra users behind
+    assert User.objects.filter(email__startswith="s").count() == 3  # noqa: PLR2004
+    assert not Candidate.objects.filter(user__email="s1@example.com").exists()
+
+
+def _roster(extension, rows):
+    if extension == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CANDIDATE_HEADER)
+        writer.writerows(rows)
+        return buffer.getvalue().encode()
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(CANDIDATE_HEADER)
+    for row in rows:
+        sheet.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("extension", ["csv", "xlsx"])
+def test_process_candidates_file_streams_in_chunks(
+    settings,
+    tmp_path,
+    monkeypatch,
+    make_candidate,
+    extension,
+):
+    settings.MEDIA_ROOT = tmp_path
+    monkeypatch.setattr(candidate_tasks, "IMPORT_CHUNK_SIZE", 10)
+    make_candidate("b10000")
+    rows = [[f"A B{n}", "1", f"s{n}@example.com", f"z{n}", "L"] for n in range(25)]
+    rows.append(["Dup", "1", "s1@example.com", "zz1", "L"])
+    rows.append(["Dup", "1", "new@example.com", "b10000", "L"])
+    rows.append(["", "", "", "", ""])
+    path = default_storage.save(
+        f"candidate_imports/roster.{extension}",
+        ContentFile(_roster(extension, rows)),
+    )
+    institute = Candidate.objects.get().institute
+
+    result = process_candidates_file.apply(
+        args=(path, institute.id, "format2"),
+        kwargs={"total_rows": len(rows)},
+    ).get()
+
+    assert result["processed_rows"] == 25  # noqa: PLR2004
+    assert result["total_errors"] == 2  # noqa: PLR2004
+    assert Candidate.objects.filter(symbol_number__startswith="z").count() == 25  # noqa: PLR2004
+    candidate = Candidate.objects.get(symbol_number="z7")
+    assert candidate.user.email == "s7@example.com"
+    assert candidate.user.check_password(candidate.generated_password)
+    assert not default_storage.exists(path)
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_hash_passwords_keeps_order_per_profile(monkeypatch, workers):
+    monkeypatch.setattr(hashers, "HASH_WORKERS", workers)
+    raw_passwords = [f"secret{n}" for n in range(6)]
+
+    exam = hash_passwords(raw_passwords, PASSWORD_PROFILE_EXAM)
+    default = hash_passwords(raw_passwords, PASSWORD_PROFILE_DEFAULT)
+
+    assert all(is_exam_credential(encoded) for encoded in exam)
+    assert not any(is_exam_credential(encoded) for encoded in default)
+    for raw, *encoded in zip(raw_passwords, exam, default, strict=True):
+        assert all(check_password(raw, value) for value in encoded)
+
+
+def test_hash_passwords_rejects_an_unknown_profile():
+    with pytest.raises(ValueError, match="Unknown password profile"):
+        hash_passwords(["secret"], "fast")
+
+
+def test_exam_credential_is_not_upgraded_on_login(
+    enrollments,
+    django_capture_on_commit_callbacks,
+    django_assert_num_queries,
+):
+    user = enrollments[0].candidate.user
+    (encoded,) = hash_passwords(["password"], PASSWORD_PROFILE_EXAM)
+    User.objects.filter(pk=user.pk).update(password=encoded)
+    user.refresh_from_db()
+
+    with django_assert_num_queries(0):
+        assert user.check_password("password")
+        assert not user.check_password("wrong")
+    with django_capture_on_commit_callbacks(execute=True):
+        response = _login(enrollments[0].candidate)
+    assert response.status_code == status.HTTP_200_OK, response.content
+
+    user.refresh_from_db()
+    assert user.password == encoded
+
+
+def test_other_passwords_are_still_upgraded(settings, make_candidate):
+    settings.PASSWORD_HASHERS = [
+        *settings.PASSWORD_HASHERS,
+        "django.contrib.auth.hashers.ScryptPasswordHasher",
+    ]
+    user = make_candidate("b10000").user
+    user.password = make_password("secret", hasher="scrypt")
+    user.save(update_fields=["password"])
+
+    assert user.check_password("secret")
+    user.refresh_from_db()
+    assert user.password.startswith("md5$")
+
+
+def _upload(extension, rows):
+    return SimpleUploadedFile(f"roster.{extension}", _roster(extension, rows))
+
+
+@pytest.mark.parametrize("extension", ["csv", "xlsx"])
+def test_validate_file_format_counts_rows(extension):
+    rows = [[f"A B{n}", "1", f"s{n}@example.com", f"z{n}", "L"] for n in range(7)]
+    upload = _upload(extension, rows)
+
+    result = validate_file_format(upload, upload.name)
+
+    assert result["is_valid"], result
+    assert result["detected_format"] == "format2"
+    assert result["total_rows"] == 7  # noqa: PLR2004
+    assert not result["rows_estimated"]
+    # The view saves the same upload afterwards
+    assert upload.tell() == 0
+
+
+def test_validate_file_format_estimates_a_large_csv():
+    rows = [[f"A, B{n}", n, f"s{n}@example.com", f"z{n}", "L"] for n in range(20000)]
+    upload = _upload("csv", rows)
+
+    result = validate_file_format(upload, upload.name)
+
+    assert result["is_valid"], result
+    assert result["rows_estimated"]
+    assert abs(result["total_rows"] - 20000) < 3000  # noqa: PLR2004
+
+
+@pytest.mark.parametrize(("rows", "label"), [(7, "7"), (20000, "~")])
+def test_candidate_import_marks_only_estimated_row_counts(
+    admin_client,
+    institute,
+    rows,
+    label,
+):
+    upload = _upload(
+        "csv",
+        [[f"A B{n}", "1", f"s{n}@example.com", f"z{n}", "L"] for n in range(rows)],
+    )
+
+    with mock.patch.object(candidate_tasks.process_candidates_file, "delay") as delay:
+        response = admin_client.post(
+            reverse("admin:appAuthentication_candidate_import"),
+            {"candidate_file": upload, "institute_id": institute.id},
+        )
+
+    (path, *_), _ = delay.call_args
+    default_storage.delete(path)
+    (message,) = get_messages(response.wsgi_request)
+    assert f"Processing {label}" in str(message)
+    assert ("~" in str(message)) == (label == "~")
+
+
+def test_validate_file_format_rejects_unusable_files():
+    header_only = _upload("csv", [])
+    assert not validate_file_format(header_only, header_only.name)["is_valid"]
+
+    unknown = SimpleUploadedFile("roster.csv", b"x,y\n1,2\n")
+    result = validate_file_format(unknown, unknown.name)
+    assert not result["is_valid"]
+    assert "detect" in result["error"]
@@ -2,9 +2,20 @@
 from django.utils import timezone
 
 from appExam.models import StudentExamEnrollment
+from appExam.utils.enrollment_cache import cached_resolution
 
 
 def get_closest_enrollment(candidate):
+    """Cached `_resolve_closest_enrollment`, keyed by the candidate's user."""
+    _, enrollment = cached_resolution(
+        "closest",
+        candidate.user_id,
+        lambda: (candidate, _resolve_closest_enrollment(candidate)),
+    )
+    return enrollment
+
+
+def _resolve_closest_enrollment(candidate):
     """
     Return the enrollment that
       1) is currently ongoing (start_time ≤ now < end_time),
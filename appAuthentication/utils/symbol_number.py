@@ -0,0 +1,34 @@
+import re
+
+
+def extract_symbol_components(symbol):
+    """
+    Extract prefix and numeric parts from a symbol number.
+    Handles complex formats like 'MG12XX10', 'b10001', etc.
+    Examples:
+    - 'MG12XX10' -> {'prefix': 'mg12xx', 'number': 10}
+    - 'b10001' -> {'prefix': 'b', 'number': 10001}
+    - 'CSE2023001' -> {'prefix': 'cse2023', 'number': 1}
+    """
+    if not symbol:
+        return None
+
+    symbol = symbol.strip()
+
+    # Find the last continuous sequence of digits
+    match = re.search(r"(\d+)$", symbol)
+    if not match:
+        return None
+
+    number_part = match.group(1)
+    prefix_part = symbol[: match.start()]
+
+    return {"prefix": prefix_part.lower(), "number": int(number_part)}
+
+
+def symbol_components(symbol):
+    """(prefix, number) as stored on Candidate, or ("", None) when unparsable."""
+    comp = extract_symbol_components(symbol)
+    if not comp:
+        return "", None
+    return comp["prefix"], comp["number"]
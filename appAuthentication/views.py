@@ -1,8 +1,7 @@
 import logging
-import random
-from collections import defaultdict
 
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.decorators import api_view
@@ -10,9 +9,10 @@ from rest_framework.decorators import permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 
-from appExam.models import Answer
-from appExam.models import Question
 from appExam.models import StudentExamEnrollment
+from appExam.utils.paper import cache_paper
+from appExam.utils.randomize import is_randomized
+from appExam.utils.randomize import randomize_unless_done
 
 from .models import Candidate
 from .serializers import CandidateLoginSerializer
@@ -118,10 +118,12 @@ def candidate_login_view(request):
             status=status.HTTP_403_FORBIDDEN,
         )
 
-    # If enrollment exists but questions haven't been randomized yet, do it now
-    if not enrollment.question_order or not enrollment.answer_order:
-        randomize_questions_and_answers_for_enrollment(enrollment)
-        enrollment.save()
+    # If enrollment exists but questions haven't been randomized yet, do it
+    # now. The enrollment may come from the resolution cache, so the check is
+    # repeated under a row lock; if the warm-up won, it already published the
+    # paper and ours must not replace it.
+    if not is_randomized(enrollment) and randomize_unless_done(enrollment):
+        transaction.on_commit(lambda: cache_paper(enrollment))
 
     tokens = get_tokens_for_user(user)
     access_token = tokens["access"]
@@ -131,40 +133,6 @@ def candidate_login_view(request):
 
 
 # ------------------------- Helper Functions -------------------------
-def randomize_questions_and_answers_for_enrollment(enrollment):
-    """
-    Randomize questions and answers for an existing enrollment.
-    This happens only once when the candidate first logs in successfully.
-    """
-    session = enrollment.session
-
-    # 1) Get all question IDs for this session
-    question_ids = list(
-        Question.objects.filter(session=session).values_list("id", flat=True),
-    )
-    random.shuffle(question_ids)
-    enrollment.question_order = question_ids
-
-    # 2) Fetch all (question_id, answer_id) in a single query
-    all_pairs = Answer.objects.filter(
-        question__session=session,
-    ).values_list("question_id", "id")
-
-    # Group them: { question_id: [answer_id, ...], ... }
-    grouped = defaultdict(list)
-    for qid, aid in all_pairs:
-        grouped[qid].append(aid)
-
-    # 3) For each question in our shuffled question_order, shuffle that question's answers  # noqa: E501
-    answer_order = {}
-    for qid in question_ids:
-        answer_list = grouped.get(qid, [])
-        random.shuffle(answer_list)
-        answer_order[str(qid)] = answer_list
-
-    enrollment.answer_order = answer_order
-
-
 def build_candidate_login_payload(candidate, access_token, enrollment):
     """
     Build the response payload for successful candidate login.
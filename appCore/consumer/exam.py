@@ -1,27 +1,55 @@
 import asyncio
 import json
+import time
+from dataclasses import dataclass
+from datetime import datetime
 from urllib.parse import parse_qs
 
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.paginator import Paginator
-from django.utils import timezone
 from rest_framework_simplejwt.exceptions import InvalidToken
 from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework_simplejwt.tokens import UntypedToken
 
-from appExam.models import Answer
+from appAuthentication.utils.closest_enrollment import get_closest_enrollment
+from appCore.utils.broadcast import enrollment_group
+from appCore.utils.broadcast import session_group
 from appExam.models import Candidate
-from appExam.models import Question
 from appExam.models import StudentAnswer
 from appExam.models import StudentExamEnrollment
-from config.settings.local import SECRET_KEY
+from appExam.utils.answer_batch import save_answer_batch
+from appExam.utils.answer_buffer import buffer_answer
+from appExam.utils.answer_buffer import write_behind_enabled
+from appExam.utils.answered_index import answered_answer_id
+from appExam.utils.answered_index import get_answered
+from appExam.utils.paper import Paper
+from appExam.utils.paper import get_paper
+from appExam.utils.question_bank import get_session_bank
+from appExam.utils.timer import TimerState
 
 User = get_user_model()
 
+TIMER_RESYNC_INTERVAL = 30  # seconds, only used without a channel layer
+
+
+@dataclass(frozen=True)
+class ConnectionContext:
+    """What a socket needs to serve its candidate, loaded once per connection"""
+
+    candidate_id: int
+    enrollment_id: int
+    session_id: int
+    program_id: int
+    paper: Paper | None
+
 
 class ExamConsumer(AsyncWebsocketConsumer):
+    context = None
+    context_error = None
+    timer = None
+
     async def connect(self):
         # Extract token from query string
         query_string = self.scope["query_string"].decode()
@@ -41,7 +69,10 @@ class ExamConsumer(AsyncWebsocketConsumer):
             # For now, let's decode manually:
             from rest_framework_simplejwt.backends import TokenBackend
 
-            token_backend = TokenBackend(algorithm="HS256", signing_key=SECRET_KEY)
+            token_backend = TokenBackend(
+                algorithm="HS256",
+                signing_key=settings.SECRET_KEY,
+            )
             valid_data = token_backend.decode(token, verify=True)
             user_id = valid_data["user_id"]
             user = await database_sync_to_async(User.objects.get)(id=user_id)
@@ -53,6 +84,7 @@ class ExamConsumer(AsyncWebsocketConsumer):
 
         # Accept the connection if authenticated
         await self.accept()
+        await self.refresh_context()
 
     async def disconnect(self, close_code):
         # Cancel the background task when the socket disconnects
@@ -62,15 +94,86 @@ class ExamConsumer(AsyncWebsocketConsumer):
                 await self.time_task
             except asyncio.CancelledError:
                 pass
+        await self._leave_groups()
+
+    # --- Connection context ---
+
+    async def refresh_context(self):
+        """(Re)load the context and follow its session/enrollment groups"""
+        context, error = await self.load_context()
+        await self._leave_groups()
+        self.context = context
+        self.context_error = error
+        if context and self.channel_layer is not None:
+            for group in self._groups_for(context):
+                await self.channel_layer.group_add(group, self.channel_name)
+
+    async def _leave_groups(self):
+        if self.context and self.channel_layer is not None:
+            for group in self._groups_for(self.context):
+                await self.channel_layer.group_discard(group, self.channel_name)
+
+    @staticmethod
+    def _groups_for(context):
+        return (
+            session_group(context.session_id),
+            enrollment_group(context.enrollment_id),
+        )
+
+    async def get_context(self):
+        """Return (context, error); retries while the paper is not randomized"""
+        if self.context is None or self.context.paper is None:
+            await self.refresh_context()
+        return self.context, self.context_error
 
-    async def receive(self, text_data):
+    @database_sync_to_async
+    def load_context(self):
+        try:
+            candidate = Candidate.objects.get(user=self.user)
+        except Candidate.DoesNotExist:
+            return None, {"error": "Candidate profile not found", "status": 404}
+
+        enrollment = get_closest_enrollment(candidate)
+        if enrollment is None:
+            return None, {
+                "error": "No exam enrollment found for this candidate",
+                "status": 404,
+            }
+
+        context = ConnectionContext(
+            candidate_id=candidate.id,
+            enrollment_id=enrollment.id,
+            session_id=enrollment.session_id,
+            program_id=enrollment.session.exam.program_id,
+            paper=get_paper(enrollment),
+        )
+        return context, None
+
+    async def exam_context_invalidated(self, event):
+        """Pushed when the enrollment or its paper changed server-side"""
+        await self.refresh_context()
+
+    # --- Client actions ---
+
+    async def receive(self, text_data):  # noqa: C901
         try:
             data = json.loads(text_data)
             action = data.get("action")
 
+            if action == "stop_timer":
+                # Stop the time remaining loop
+                if hasattr(self, "time_task"):
+                    self.time_task.cancel()
+                return
+
+            context, error = await self.get_context()
+            if error:
+                await self.send(text_data=json.dumps(error))
+                return
+
             if action == "get_question":
                 page = data.get("page", 1)
-                response = await self.get_paginated_question(page)
+                response = await self.get_paginated_question(context, page)
                 await self.send(text_data=json.dumps(response))
 
             elif action == "save_answer":
@@ -78,15 +181,19 @@ class ExamConsumer(AsyncWebsocketConsumer):
                 answer_letter = data.get(
                     "selected_answer",
                 )  # Changed from answer_id to selected_answer (letter)
-                response = await self.save_answer(question_id, answer_letter)
+                response = await self.save_answer(context, question_id, answer_letter)
+                await self.send(text_data=json.dumps(response))
+
+            elif action == "save_answers":
+                response = await self.save_answers(context, data.get("answers"))
                 await self.send(text_data=json.dumps(response))
 
             elif action == "get_exam_session":
-                response = await self.get_exam_session()
+                response = await self.get_exam_session(context)
                 await self.send(text_data=json.dumps(response))
 
             elif action == "get_answers_summary":
-                response = await self.get_answers_summary()
+                response = await self.get_answers_summary(context)
                 await self.send(text_data=json.dumps(response))
 
             elif action == "start_timer":
@@ -96,49 +203,74 @@ class ExamConsumer(AsyncWebsocketConsumer):
                         self.send_time_remaining_loop(),
                     )
 
-            elif action == "stop_timer":
-                # Stop the time remaining loop
-                if hasattr(self, "time_task"):
-                    self.time_task.cancel()
-
         except Exception as e:  # noqa: BLE001
             await self.send(text_data=json.dumps({"error": str(e), "status": 500}))
 
+    # --- Timer ---
+
     async def send_time_remaining_loop(self):
+        """Send the remaining time every second, computed locally"""
         try:
+            self.timer = await self.load_timer(self.context)
+            last_sync = time.monotonic()
             while True:
-                time_data = await self.get_time_remaining()
+                # Without a channel layer no events arrive; fall back to polling
+                if (
+                    self.channel_layer is None
+                    and time.monotonic() - last_sync >= TIMER_RESYNC_INTERVAL
+                ):
+                    self.timer = await self.load_timer(self.context)
+                    last_sync = time.monotonic()
+
                 await self.send(
-                    text_data=json.dumps({"type": "time_remaining", "data": time_data}),
+                    text_data=json.dumps(
+                        {"type": "time_remaining", "data": self.get_time_remaining()},
+                    ),
                 )
                 await asyncio.sleep(1)  # send every 1 second
         except asyncio.CancelledError:
             pass  # task cancelled on disconnect
 
     @database_sync_to_async
+    def load_timer(self, context):
+        enrollment = StudentExamEnrollment.objects.get(pk=context.enrollment_id)
+        return TimerState.from_enrollment(enrollment)
+
     def get_time_remaining(self):
-        try:
-            candidate = Candidate.objects.get(user=self.user)
-            enrollment = StudentExamEnrollment.objects.select_related("session").get(
-                candidate=candidate,
-            )
-            now = timezone.now()
-            end_time = enrollment.session.end_time
-            remaining = end_time - now
+        if self.timer is None:
+            return {"seconds": 0, "expired": True}
 
-            if remaining.total_seconds() <= 0:
-                return {"seconds": 0, "expired": True}
+        remaining = self.timer.remaining()
+        if remaining.total_seconds() <= 0:
+            return {"seconds": 0, "expired": True}
 
-            return {"seconds": int(remaining.total_seconds()), "expired": False}
+        return {"seconds": int(remaining.total_seconds()), "expired": False}
 
-        except Exception as e:  # noqa: BLE001
-            return {"seconds": 0, "expired": True, "error": str(e)}
+    async def exam_timer_updated(self, event):
+        """New timer inputs for this enrollment (pause, resume, extra time)"""
+        self.timer = TimerState.from_dict(event["timer"])
+
+    async def exam_session_started(self, event):
+        """The session started after this socket loaded its (inactive) timer"""
+        if self.context:
+            self.timer = await self.load_timer(self.context)
+
+    async def exam_session_paused(self, event):
+        if self.timer:
+            self.timer = self.timer.paused(datetime.fromisoformat(event["at"]))
+
+    async def exam_session_resumed(self, event):
+        if self.timer:
+            self.timer = self.timer.resumed(datetime.fromisoformat(event["at"]))
+
+    async def exam_session_ended(self, event):
+        if self.timer:
+            self.timer = self.timer.submitted()
 
     @database_sync_to_async
-    def get_exam_session(self):
+    def get_exam_session(self, context):
         """Get exam session details - equivalent to get_exam_session_view"""
         try:
-            candidate = Candidate.objects.get(user=self.user)
             enrollment = StudentExamEnrollment.objects.select_related(
                 "session",
                 "session__exam",
@@ -146,26 +278,21 @@ class ExamConsumer(AsyncWebsocketConsumer):
                 "session__exam__subject",
                 "hall_assignment",
                 "hall_assignment__hall",
-            ).get(candidate=candidate)
+            ).get(pk=context.enrollment_id)
 
             session = enrollment.session
             exam = session.exam
 
             # Count total questions for this session
-            total_questions = Question.objects.filter(session=session).count()
+            total_questions = len(get_session_bank(session.id))
 
             # Calculate duration
-            duration_minutes = None
-            if session.start_time and session.end_time:
-                duration = session.end_time - session.start_time
-                duration_minutes = int(duration.total_seconds() // 60)
+            duration_minutes = int(session.base_duration.total_seconds() // 60)
 
             # Get time remaining for this specific candidate
-            time_remaining_minutes = None
-            if enrollment.time_remaining:
-                time_remaining_minutes = int(
-                    enrollment.time_remaining.total_seconds() // 60,
-                )
+            time_remaining_minutes = int(
+                enrollment.effective_time_remaining.total_seconds() // 60,
+            )
 
             # Build response data
             session_data = {
@@ -176,10 +303,8 @@ class ExamConsumer(AsyncWebsocketConsumer):
                 "subject": exam.subject.name if exam.subject else None,
                 "total_marks": exam.total_marks,
                 "description": exam.description,
-                "start_time": session.start_time.isoformat()
-                if session.start_time
-                else None,
-                "end_time": session.end_time.isoformat() if session.end_time else None,
+                "start_time": session.base_start.isoformat(),
+                "end_time": session.expected_end.isoformat(),
                 "duration_minutes": duration_minutes,
                 "time_remaining_minutes": time_remaining_minutes,
                 "total_questions": total_questions,
@@ -200,8 +325,6 @@ class ExamConsumer(AsyncWebsocketConsumer):
                 "status": 200,
             }
 
-        except Candidate.DoesNotExist:
-            return {"error": "Candidate profile not found", "status": 404}
         except StudentExamEnrollment.DoesNotExist:
             return {
                 "error": "No exam enrollment found for this candidate",
@@ -211,86 +334,53 @@ class ExamConsumer(AsyncWebsocketConsumer):
             return {"error": str(e), "status": 500}
 
     @database_sync_to_async
-    def get_paginated_question(self, page):
+    def get_paginated_question(self, context, page):
         """Get paginated question matching the expected payload structure"""
         try:
-            candidate = Candidate.objects.get(user=self.user)
-            enrollment = StudentExamEnrollment.objects.select_related("session").get(
-                candidate=candidate,
-            )
-
-            question_order = enrollment.question_order
-            answer_order = enrollment.answer_order
+            paper = context.paper
 
-            if not question_order:
+            if not paper:
                 return {
                     "error": "Questions not yet randomized for this candidate",
                     "status": 400,
                 }
 
-            page_size = 1
-            paginator = Paginator(question_order, page_size)
-
-            if page > paginator.num_pages:
+            question_id = paper.question_for_page(page)
+            if question_id is None:
                 return {
                     "error": "Page number out of range",
                     "status": 404,
                 }
 
-            question_id = paginator.get_page(page).object_list[0]
-            question = Question.objects.get(id=question_id)
-
-            # Get randomized answer order for this question
-            randomized_answer_ids = answer_order.get(str(question_id), [])
-
-            # Fetch answers in the randomized order with answer letters
-            answers_data = []
-            answer_letters = ["a", "b", "c", "d"]  # Standard answer numbering
-
-            for index, answer_id in enumerate(randomized_answer_ids):
-                try:
-                    answer = Answer.objects.get(id=answer_id)
-                    answers_data.append(
-                        {
-                            "options": answer.text,
-                            "answer_number": answer_letters[index]
-                            if index < len(answer_letters)
-                            else str(index + 1),
-                        },
-                    )
-                except Answer.DoesNotExist:
-                    continue
+            # Question and answer texts come from the compiled session bank
+            bank = get_session_bank(context.session_id)
+            question_text = bank.questions.get(question_id)
+            if question_text is None:
+                return {"error": "Question not found", "status": 404}
+
+            # Build answers in the candidate's order with answer letters
+            answers_data = [
+                {
+                    "options": bank.answers[answer_id],
+                    "answer_number": letter,
+                }
+                for letter, answer_id in paper.options(question_id)
+                if answer_id in bank.answers
+            ]
 
             # Check if student has already answered this question
-            student_answer = None
-            is_answered = False
-
-            try:
-                student_answer_obj = StudentAnswer.objects.get(
-                    enrollment=enrollment,
-                    question=question,
-                )
-                if student_answer_obj.selected_answer:
-                    # Find which answer letter corresponds to the selected answer
-                    selected_answer_id = student_answer_obj.selected_answer.id
-                    # Find the position of this answer in the randomized order
-                    for index, answer_id in enumerate(randomized_answer_ids):
-                        if answer_id == selected_answer_id:
-                            student_answer = (
-                                answer_letters[index]
-                                if index < len(answer_letters)
-                                else str(index + 1)
-                            )
-                            break
-                    is_answered = True
-            except StudentAnswer.DoesNotExist:
-                pass
+            selected_answer_id = answered_answer_id(
+                context.enrollment_id,
+                question_id,
+            )
+            student_answer = paper.letter_for(question_id, selected_answer_id)
+            is_answered = student_answer is not None
 
             # Build the response data matching the expected payload structure
             question_data = {
-                "id": question.id,
-                "shift_plan_program_id": enrollment.session.exam.program.id,
-                "question": question.text,
+                "id": question_id,
+                "shift_plan_program_id": context.program_id,
+                "question": question_text,
                 "answers": answers_data,
                 "student_answer": student_answer,
                 "is_answered": is_answered,
@@ -303,86 +393,77 @@ class ExamConsumer(AsyncWebsocketConsumer):
                 "status": 200,
             }
 
-        except Candidate.DoesNotExist:
-            return {"error": "Candidate not found", "status": 404}
-        except StudentExamEnrollment.DoesNotExist:
-            return {"error": "Enrollment not found", "status": 404}
-        except Question.DoesNotExist:
-            return {"error": "Question not found", "status": 404}
         except Exception as e:
             return {"error": str(e), "status": 500}
 
     @database_sync_to_async
-    def save_answer(self, question_id, answer_letter):
+    def save_answer(self, context, question_id, answer_letter):  # noqa: C901
         """Save student answer using answer letter (a, b, c, d)"""
         try:
-            candidate = Candidate.objects.get(user=self.user)
-            enrollment = StudentExamEnrollment.objects.select_related("session").get(
-                candidate=candidate,
-            )
-
             if not question_id:
                 return {"error": "question_id is required", "status": 400}
 
-            # Validate that the question belongs to this exam session
+            # Validate that the question belongs to this candidate's paper
+            paper = context.paper
+            bank = get_session_bank(context.session_id)
             try:
-                question = Question.objects.get(
-                    id=question_id,
-                    session=enrollment.session,
-                )
-            except Question.DoesNotExist:
+                question_id = int(question_id)
+            except (TypeError, ValueError):
+                question_id = None
+
+            if (
+                not paper
+                or question_id not in paper
+                or question_id not in bank.questions
+            ):
                 return {
                     "error": "Question not found or doesn't belong to your exam session",
                     "status": 404,
                 }
 
-            # Convert answer letter to Answer object if provided
-            selected_answer = None
+            # Convert answer letter to answer id if provided
+            selected_answer_id = None
             if answer_letter:
-                # Get the randomized answer order for this question
-                answer_order = enrollment.answer_order
-                randomized_answer_ids = answer_order.get(str(question_id), [])
-
-                if not randomized_answer_ids:
+                if not paper.options(question_id):
                     return {
                         "error": "Answer order not found for this question",
                         "status": 400,
                     }
 
-                # Convert answer letter to answer ID
-                answer_letters = ["a", "b", "c", "d"]
-                try:
-                    answer_index = answer_letters.index(answer_letter.lower())
-                    selected_answer_id = randomized_answer_ids[answer_index]
-                    selected_answer = Answer.objects.get(id=selected_answer_id)
-                except (ValueError, IndexError, Answer.DoesNotExist):
+                selected_answer_id = paper.answer_id(question_id, answer_letter)
+                if selected_answer_id is None or selected_answer_id not in bank.answers:
                     return {
                         "error": "Invalid answer selection",
                         "status": 400,
                     }
 
-            # Create or update the student answer
-            student_answer, created = StudentAnswer.objects.update_or_create(
-                enrollment=enrollment,
-                question=question,
-                defaults={
-                    "selected_answer": selected_answer,
-                },
-            )
+            if write_behind_enabled():
+                # Acknowledge straight away; the flusher persists it in bulk
+                buffer_answer(context.enrollment_id, question_id, selected_answer_id)
+                created = False
+            else:
+                # Create or update the student answer
+                _, created = StudentAnswer.objects.update_or_create(
+                    enrollment_id=context.enrollment_id,
+                    question_id=question_id,
+                    defaults={
+                        "selected_answer_id": selected_answer_id,
+                    },
+                )
 
             # Prepare response message
             if created:
                 message = "Answer saved successfully"
-            elif selected_answer:
+            elif selected_answer_id:
                 message = "Answer updated successfully"
             else:
                 message = "Answer cleared successfully"
 
             return {
                 "data": {
-                    "question_id": question.id,
+                    "question_id": question_id,
                     "selected_answer": answer_letter,
-                    "is_answered": selected_answer is not None,
+                    "is_answered": selected_answer_id is not None,
                     "created": created,
                 },
                 "message": message,
@@ -390,67 +471,40 @@ class ExamConsumer(AsyncWebsocketConsumer):
                 "status": 200,
             }
 
-        except Candidate.DoesNotExist:
-            return {"error": "Candidate profile not found", "status": 404}
-        except StudentExamEnrollment.DoesNotExist:
-            return {
-                "error": "No exam enrollment found for this candidate",
-                "status": 404,
-            }
         except Exception as e:
             return {"error": str(e), "status": 500}
 
     @database_sync_to_async
-    def get_answers_summary(self):
-        """Get summary of all student answers with answer letters"""
+    def save_answers(self, context, entries):
+        """Save several answers at once; returns per-item results"""
         try:
-            candidate = Candidate.objects.get(user=self.user)
-            enrollment = StudentExamEnrollment.objects.select_related("session").get(
-                candidate=candidate,
-            )
+            return save_answer_batch(context.paper, context.session_id, entries)
+        except Exception as e:  # noqa: BLE001
+            return {"error": str(e), "status": 500}
 
-            # Get all student answers for this enrollment
-            student_answers = StudentAnswer.objects.filter(
-                enrollment=enrollment,
-            ).select_related("question", "selected_answer")
+    @database_sync_to_async
+    def get_answers_summary(self, context):
+        """Get summary of all student answers with answer letters"""
+        try:
+            paper = context.paper
+            question_order = paper.pages if paper else []
 
-            # Get the randomized question order for this candidate
-            question_order = enrollment.question_order
-            answer_order = enrollment.answer_order
+            # Answered questions come from the per-enrollment index, no query
+            sa_map = get_answered(context.enrollment_id)
             total_questions = len(question_order)
 
             # Build summary data
             answers_summary = []
             answered_count = 0
-            answer_letters = ["a", "b", "c", "d"]
 
             for question_id in question_order:
-                question_answered = False
-                selected_answer_letter = None
-
-                # Find if this question has been answered
-                for student_answer in student_answers:
-                    if student_answer.question.id == question_id:
-                        if student_answer.selected_answer:
-                            question_answered = True
-                            answered_count += 1
-
-                            # Convert answer ID back to letter
-                            randomized_answer_ids = answer_order.get(
-                                str(question_id),
-                                [],
-                            )
-                            selected_answer_id = student_answer.selected_answer.id
-
-                            for index, answer_id in enumerate(randomized_answer_ids):
-                                if answer_id == selected_answer_id:
-                                    selected_answer_letter = (
-                                        answer_letters[index]
-                                        if index < len(answer_letters)
-                                        else str(index + 1)
-                                    )
-                                    break
-                        break
+                selected_answer_letter = paper.letter_for(
+                    question_id,
+                    sa_map.get(question_id),
+                )
+                question_answered = selected_answer_letter is not None
+                if question_answered:
+                    answered_count += 1
 
                 answers_summary.append(
                     {
@@ -478,12 +532,5 @@ class ExamConsumer(AsyncWebsocketConsumer):
                 "status": 200,
             }
 
-        except Candidate.DoesNotExist:
-            return {"error": "Candidate profile not found", "status": 404}
-        except StudentExamEnrollment.DoesNotExist:
-            return {
-                "error": "No exam enrollment found for this candidate",
-                "status": 404,
-            }
         except Exception as e:
             return {"error": str(e), "status": 500}
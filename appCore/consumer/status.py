@@ -1,4 +1,3 @@
-import json
 import logging
 
 from asgiref.sync import sync_to_async
@@ -6,17 +5,17 @@ from channels.generic.websocket import AsyncJsonWebsocketConsumer
 from django.db import transaction
 from django.utils import timezone
 
+from appAuthentication.utils.closest_enrollment import get_closest_enrollment
 from appCore.models import AdminNotification  # Ensure this is imported
 from appCore.tasks import complete_expired_sessions
-from appCore.tasks import submit_student_exam
-from appCore.utils.redis_client import get_redis_client
+from appCore.utils.broadcast import enrollment_group
+from appCore.utils.broadcast import session_group
 from appExam.models import StudentExamEnrollment
-from appAuthentication.utils.closest_enrollment import get_closest_enrollment
+from appExam.utils.enrollment_state import get_enrollment_state
 
 logger = logging.getLogger(__name__)
 
 UNAUTHORIZED_CODE = 4001
-EVENT_TTL = 60  # seconds
 
 
 class ExamStatusConsumer(AsyncJsonWebsocketConsumer):
@@ -33,12 +32,26 @@ class ExamStatusConsumer(AsyncJsonWebsocketConsumer):
             await self.send_error("No active enrollment")
             return await self.close()
 
+        # Admin actions are pushed to these groups (see appCore.utils.broadcast)
+        for group in self._groups():
+            await self.channel_layer.group_add(group, self.channel_name)
+
         await self._sync_and_start_timer()
         await self.send_status()  # noqa: RET503
 
     async def disconnect(self, code):
+        if not getattr(self, "enrollment", None):
+            return
+        for group in self._groups():
+            await self.channel_layer.group_discard(group, self.channel_name)
         await self._log_disconnect()
 
+    def _groups(self):
+        return (
+            session_group(self.enrollment.session_id),
+            enrollment_group(self.enrollment.id),
+        )
+
     async def receive_json(self, data, **kwargs):
         msg_type = data.get("type")
         handlers = {
@@ -61,6 +74,30 @@ class ExamStatusConsumer(AsyncJsonWebsocketConsumer):
         await sync_to_async(complete_expired_sessions.delay)()
         await self.send_status()
 
+    # --- Pushed events ---
+
+    async def exam_session_started(self, event):
+        await self._push_status("session_started", event)
+
+    async def exam_session_paused(self, event):
+        await self._push_status("session_paused", event)
+
+    async def exam_session_resumed(self, event):
+        await self._push_status("session_resumed", event)
+
+    async def exam_session_ended(self, event):
+        await self._push_status("session_ended", event)
+
+    async def exam_timer_updated(self, event):
+        await self._push_status("timer_updated", event)
+
+    async def exam_context_invalidated(self, event):
+        await self._push_status("context_invalidated", event)
+
+    async def _push_status(self, name, event):
+        payload = {key: value for key, value in event.items() if key != "type"}
+        await self.send_status(event={"type": name, **payload})
+
     # --- Core logic ---
 
     @sync_to_async
@@ -77,21 +114,16 @@ class ExamStatusConsumer(AsyncJsonWebsocketConsumer):
         enroll.refresh_from_db()
 
         if enroll.session.status == "ongoing" and not enroll.present:
+            # Saving indexes the deadline; submit_due_enrollments submits on expiry
             enroll.handle_connect()
-
-            remaining = enroll.effective_time_remaining.total_seconds()
-            if remaining > 0:
-                submit_student_exam.apply_async(
-                    args=(enroll.id,),
-                    countdown=remaining,
-                    task_id=f"submit_exam_{enroll.id}",
-                )
         return True
 
     @sync_to_async
     @transaction.atomic
     def _log_disconnect(self):
         enroll = self.enrollment
+        # Status replies come from the state cache, so this copy may be stale
+        enroll.refresh_from_db()
         if (
             enroll.present
             and enroll.session.status == "ongoing"
@@ -100,16 +132,33 @@ class ExamStatusConsumer(AsyncJsonWebsocketConsumer):
             enroll.handle_disconnect()
 
             AdminNotification.objects.create(
-                text=f"{enroll.candidate.full_name} disconnected during the exam.",
+                text=f"{enroll.candidate.first_name} {enroll.candidate.last_name} "
+                "disconnected during the exam.",
                 level="warning",
             )
         elif enroll.present:
             enroll.handle_disconnect()
         return True
 
-    async def send_status(self, data=None):
-        data = await self._gather_status()
-        event = await self._pop_redis_event(self.enrollment.id)
+    async def send_status(self, data=None, event=None):
+        """
+        Reply with the enrollment state. A client that sends the `version`
+        it last saw gets a short "not modified" reply when nothing changed.
+        """
+        seen_version = data.get("version") if isinstance(data, dict) else None
+        state = await self._gather_status()
+        if not event and seen_version is not None and seen_version == state["version"]:
+            await self.send_json(
+                {
+                    "type": "status",
+                    "not_modified": True,
+                    "version": state["version"],
+                    "timestamp": timezone.localtime(timezone.now()).isoformat(),
+                },
+            )
+            return
+
+        data = state
         if event:
             data["event"] = event
         await self.send_json(
@@ -122,33 +171,7 @@ class ExamStatusConsumer(AsyncJsonWebsocketConsumer):
 
     @sync_to_async
     def _gather_status(self):
-        enroll = self.enrollment
-        enroll.refresh_from_db()
-        sess = enroll.session
-        return {
-            "status": enroll.status,
-            "present": enroll.present,
-            "session_status": sess.status,
-            "time_remaining": max(0, enroll.effective_time_remaining.total_seconds()),
-            "session_effective_end": (
-                timezone.localtime(sess.expected_end).isoformat()
-                if sess.expected_end
-                else None
-            ),
-        }
-
-    @sync_to_async
-    def _pop_redis_event(self, eid):
-        client = get_redis_client()
-        key = f"exam_event_{eid}"
-        raw = client.get(key)
-        if raw:
-            client.delete(key)
-            try:
-                return json.loads(raw)
-            except Exception:  # noqa: BLE001
-                logger.error("Invalid JSON event for %s", key)  # noqa: TRY400
-        return None
+        return get_enrollment_state(self.enrollment.id, self.enrollment.session_id)
 
     async def send_error(self, msg):
         logger.error(msg)
@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand
+
+from appExam.models import StudentExamEnrollment
+from appExam.utils.deadlines import schedule_deadlines
+from config import celery_app
+
+SUBMIT_TASK = "appCore.tasks.submit_student_exam"
+
+
+class Command(BaseCommand):
+    help = (
+        "Report per-enrollment submit_student_exam ETA tasks held by workers. "
+        "Auto-submit now runs from the deadline index, so these are leftovers; "
+        "--purge revokes them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--purge",
+            action="store_true",
+            help="Revoke the tasks found (deadlines are re-indexed first).",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=5.0,
+            help="Seconds to wait for worker replies.",
+        )
+
+    def handle(self, *args, **options):
+        inspector = celery_app.control.inspect(timeout=options["timeout"])
+        scheduled = inspector.scheduled() or {}
+
+        tasks = []  # (worker, task id, enrollment id)
+        for worker, entries in scheduled.items():
+            for entry in entries:
+                request = entry.get("request", {})
+                if request.get("name") != SUBMIT_TASK:
+                    continue
+                task_args = request.get("args") or []
+                enrollment_id = task_args[0] if task_args else None
+                tasks.append((worker, request["id"], enrollment_id))
+
+        if not tasks:
+            self.stdout.write(f"No {SUBMIT_TASK} ETA tasks on {len(scheduled)} workers")
+            return
+
+        statuses = dict(
+            StudentExamEnrollment.objects.filter(
+                id__in={eid for _, _, eid in tasks if eid is not None},
+            ).values_list("id", "status"),
+        )
+        running = {
+            eid for _, _, eid in tasks if statuses.get(eid) in ("active", "paused")
+        }
+        stale = sum(1 for _, _, eid in tasks if eid not in running)
+
+        for worker in sorted({worker for worker, _, _ in tasks}):
+            count = sum(1 for w, _, _ in tasks if w == worker)
+            self.stdout.write(f"{worker}: {count} tasks")
+        self.stdout.write(
+            f"{len(tasks)} ETA tasks: {stale} for submitted or deleted enrollments, "
+            f"{len(tasks) - stale} for running exams",
+        )
+
+        if not options["purge"]:
+            return
+
+        # Make sure running exams are covered by the deadline index before
+        # their countdown tasks go away
+        schedule_deadlines(StudentExamEnrollment.objects.filter(id__in=running))
+        celery_app.control.revoke([task_id for _, task_id, _ in tasks])
+        self.stdout.write(self.style.SUCCESS(f"Revoked {len(tasks)} ETA tasks"))
@@ -2,12 +2,23 @@ import logging
 from datetime import timedelta
 
 from celery import shared_task
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
+from redis.exceptions import RedisError
 
+from appCore.utils.redis_client import get_redis_client
 from appExam.models import ExamSession
 from appExam.models import StudentExamEnrollment
+from appExam.tasks import warm_up_exam_session
+from appExam.utils.answer_buffer import flush_dirty_enrollments
+from appExam.utils.deadlines import pop_due_enrollments
+from appExam.utils.deadlines import schedule_deadlines
+from appExam.utils.timer import publish_session_event
+from appExam.utils.timer import publish_timer
 
 logger = logging.getLogger(__name__)
+redis_client = get_redis_client()
 
 # Constants
 SESSION_COMPLETION_BUFFER = 60  # seconds grace period after session end
@@ -17,12 +28,48 @@ CONNECTION_TIMEOUT = 15  # minutes
 @shared_task
 def exam_monitor():
     """Central task that coordinates all exam checks."""
+    warm_up_upcoming_sessions.delay()
     activate_scheduled_sessions.delay()
     complete_expired_sessions.delay()
-    submit_expired_students.delay()  # NEW: Check individual student time limits
+    # Individual time limits are enforced by submit_due_enrollments; this
+    # single-statement sweep catches anything the deadline index missed
+    submit_expired_students.delay()
     return "Exam monitoring tasks dispatched"
 
 
+@shared_task
+def warm_up_upcoming_sessions():
+    """Queue one warm-up for each session starting within the warm-up lead"""
+    now = timezone.now()
+    lead = timedelta(minutes=settings.EXAM_WARMUP_LEAD_MINUTES)
+    queued = 0
+
+    sessions = ExamSession.objects.filter(
+        status="scheduled",
+        base_start__gt=now,
+        base_start__lte=now + lead,
+    ).values_list("id", "base_start")
+
+    for session_id, base_start in sessions:
+        # Keyed on base_start so a rescheduled session is warmed up again
+        key = f"exam_warmup_{session_id}_{int(base_start.timestamp())}"
+        try:
+            claimed = redis_client.set(
+                key,
+                1,
+                nx=True,
+                ex=int(lead.total_seconds()) + 3600,
+            )
+        except RedisError:
+            logger.warning("Redis unavailable claiming warm-up for %s", session_id)
+            continue
+        if claimed:
+            warm_up_exam_session.delay(session_id)
+            queued += 1
+
+    return f"Queued warm-up for {queued} sessions"
+
+
 @shared_task
 def activate_scheduled_sessions():
     """Activate sessions that have reached their start time"""
@@ -61,51 +108,70 @@ def complete_expired_sessions():
 
 
 @shared_task
-def submit_expired_students():
-    """NEW: Submit individual students whose time has expired"""
-    now = timezone.now()
-    submitted = 0
+def submit_due_enrollments():
+    """Submit students whose indexed deadline has passed (ticks every second)"""
+    try:
+        due = pop_due_enrollments()
+    except RedisError:
+        logger.warning("Redis unavailable reading exam deadlines")
+        return "Deadline index unavailable"
+    if not due:
+        return "No deadlines due"
 
-    # Get all active/paused enrollments from ongoing sessions
+    now = timezone.now()
+    # Disconnected students keep their own clock after the session ends
     enrollments = StudentExamEnrollment.objects.filter(
-        status__in=["active", "paused"], session__status__in=["ongoing", "paused"],
-    ).select_related("session")
+        id__in=due,
+        status__in=["active", "paused"],
+    )
+    try:
+        with transaction.atomic():
+            submitted = enrollments.expired(now).submit(now)
+    except Exception:
+        logger.exception("Error submitting due enrollments %s", due)
+        # Back into the index so the next tick retries them
+        schedule_deadlines(enrollments)
+        return "Deadline submission failed"
 
-    for enrollment in enrollments:
-        try:
-            # Check if student's individual time has expired
-            if enrollment.should_submit:
-                if enrollment.submit_exam():
-                    submitted += 1
-                    logger.info(
-                        f"Auto-submitted enrollment {enrollment.id} - time expired",  # noqa: G004
-                    )
-        except Exception as e:
-            logger.error(f"Error checking enrollment {enrollment.id}: {e}")  # noqa: G004
+    # Extra time or a pause moved these deadlines after they were indexed
+    moved = list(enrollments.exclude(id__in=submitted))
+    if moved:
+        schedule_deadlines(moved)
 
-    return f"Auto-submitted {submitted} students whose time expired"
+    return f"Auto-submitted {len(submitted)} of {len(due)} due students"
+
+
+@shared_task
+def submit_expired_students():
+    """
+    Submit every student whose time has expired in one set-based UPDATE.
+    Safety net behind the deadline index, e.g. for timers changed while
+    Redis was unreachable.
+    """
+    submitted = StudentExamEnrollment.objects.expired().submit()
+    if submitted:
+        logger.info("Auto-submitted enrollments %s - time expired", submitted)
+    return f"Auto-submitted {len(submitted)} students whose time expired"
+
+
+@shared_task
+def flush_answer_buffers(enrollment_ids=None):
+    """Persist answers buffered in Redis (write-behind mode)"""
+    flushed = flush_dirty_enrollments(enrollment_ids)
+    return f"Flushed {flushed} buffered answers"
 
 
 @shared_task
 def handle_student_disconnect(enrollment_id):
-    """Process student disconnection and schedule submission"""
+    """Process student disconnection"""
     try:
         enrollment = StudentExamEnrollment.objects.get(id=enrollment_id)
 
-        # Just log disconnection without freezing/pause logic
+        # Just log disconnection without freezing/pause logic. The timer keeps
+        # running and the save re-indexes its deadline, so
+        # submit_due_enrollments submits the student once it expires.
         enrollment.handle_disconnect()
 
-        # FIXED: Better handling of submission scheduling
-        remaining_seconds = enrollment.effective_time_remaining.total_seconds()
-
-        # If time already expired, submit immediately
-        if remaining_seconds <= 0:
-            submit_student_exam.delay(enrollment_id)
-        else:
-            # Schedule submission with minimum 1 second countdown to avoid timing issues
-            countdown = max(1, int(remaining_seconds))
-            submit_student_exam.apply_async((enrollment_id,), countdown=countdown)
-
         return f"Handled disconnect for {enrollment_id}"  # noqa: TRY300
     except StudentExamEnrollment.DoesNotExist:
         return f"Enrollment {enrollment_id} not found"
@@ -132,16 +198,16 @@ def submit_student_exam(enrollment_id):
 def pause_exam_session(session_id):
     """Pause entire exam session"""
     try:
-        session = ExamSession.objects.get(id=session_id)
-        if session.status == "ongoing":
-            session.pause_session()
-            #  pause each student
-            for enrollment in session.enrollments.filter(status="active"):
-                enrollment.status = "paused"
-                enrollment.paused_at = timezone.now()
-                enrollment.save()
-            return f"Paused session {session_id}"
-        return f"Session {session_id} not in ongoing state"  # noqa: TRY300
+        with transaction.atomic():
+            session = ExamSession.objects.select_for_update().get(id=session_id)
+            if session.status != "ongoing":
+                return f"Session {session_id} not in ongoing state"
+            # One instant for the session and every student keeps clocks aligned
+            now = timezone.now()
+            session.pause_session(now)
+            paused = session.enrollments.pause(now, push_timers=False)
+            publish_session_event(session_id, "exam.session_paused", at=now)
+        return f"Paused session {session_id} ({len(paused)} students)"
     except ExamSession.DoesNotExist:
         return f"Session {session_id} not found"
 
@@ -150,21 +216,15 @@ def pause_exam_session(session_id):
 def resume_exam_session(session_id):
     """Resume paused exam session"""
     try:
-        session = ExamSession.objects.get(id=session_id)
-        if session.status == "paused":
-            session.resume_session()
-            # Optional: resume each student
-            for enrollment in session.enrollments.filter(
-                status="paused",
-                paused_at__isnull=False,
-            ):
-                pause_time = timezone.now() - enrollment.paused_at
-                enrollment.paused_duration += pause_time
-                enrollment.paused_at = None
-                enrollment.status = "active"
-                enrollment.save()
-            return f"Resumed session {session_id}"
-        return f"Session {session_id} not in paused state"  # noqa: TRY300
+        with transaction.atomic():
+            session = ExamSession.objects.select_for_update().get(id=session_id)
+            if session.status != "paused":
+                return f"Session {session_id} not in paused state"
+            now = timezone.now()
+            session.resume_session(now)
+            resumed = session.enrollments.resume(now, push_timers=False)
+            publish_session_event(session_id, "exam.session_resumed", at=now)
+        return f"Resumed session {session_id} ({len(resumed)} students)"
     except ExamSession.DoesNotExist:
         return f"Session {session_id} not found"
 
@@ -173,16 +233,18 @@ def resume_exam_session(session_id):
 def halt_exam_session(session_id):
     """Immediately end an exam session (admin override)"""
     try:
-        session = ExamSession.objects.get(id=session_id)
-        session.status = "cancelled"
-        session.save()
-
-        # Submit all active/paused students
-        enrollments = session.enrollments.filter(status__in=["active", "paused"])
-        for enrollment in enrollments:
-            enrollment.submit_exam()
-
-        return f"Halted session {session_id}"  # noqa: TRY300
+        with transaction.atomic():
+            session = ExamSession.objects.select_for_update().get(id=session_id)
+            session.status = "cancelled"
+            session.save()
+
+            # Submit all active/paused students
+            submitted = session.enrollments.filter(
+                status__in=["active", "paused"],
+            ).submit(push_timers=False)
+            publish_session_event(session_id, "exam.session_ended")
+
+        return f"Halted session {session_id} ({len(submitted)} students submitted)"
     except ExamSession.DoesNotExist:
         return f"Session {session_id} not found"
 
@@ -199,6 +261,7 @@ def evaluate_disconnection_pause(enrollment_id):
                 enrollment.individual_paused_at = now
                 enrollment.status = "paused"
                 enrollment.save()
+                publish_timer(enrollment)
                 return f"Enrollment {enrollment_id} individually paused"
         return f"Enrollment {enrollment_id} already reconnected"  # noqa: TRY300
     except StudentExamEnrollment.DoesNotExist:
@@ -1,3 +1,464 @@
-from django.test import TestCase
+import io
+import json
+import time
+from datetime import timedelta
+from unittest import mock
+
+import pytest
+from asgiref.sync import async_to_sync
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.utils import timezone
+from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
+
+from appAuthentication.utils.closest_enrollment import get_closest_enrollment
+from appCore.consumer import exam as exam_consumer
+from appCore.consumer.exam import ExamConsumer
+from appCore.consumer.status import ExamStatusConsumer
+from appCore.management.commands import purge_eta_tasks
+from appCore.tasks import halt_exam_session
+from appCore.tasks import pause_exam_session
+from appCore.tasks import resume_exam_session
+from appCore.tasks import submit_due_enrollments
+from appCore.tasks import warm_up_upcoming_sessions
+from appCore.utils.broadcast import enrollment_group
+from appCore.utils.broadcast import session_group
+from appExam.models import ExamSession
+from appExam.models import StudentExamEnrollment
+from appExam.models import StudentExamEnrollmentQuerySet
+from appExam.tasks import warm_up_exam_session
+from appExam.utils.deadlines import DEADLINE_KEY
+from appExam.utils.deadlines import pop_due_enrollments
+from appExam.utils.timer import TimerState
+
+
+@pytest.fixture
+def exam_socket():
+    """Connects an ExamConsumer for an enrollment's candidate."""
+    token_for = sync_to_async(
+        lambda enrollment: AccessToken.for_user(enrollment.candidate.user),
+    )
+
+    async def connect(enrollment):
+        token = await token_for(enrollment)
+        communicator = WebsocketCommunicator(
+            ExamConsumer.as_asgi(),
+            f"/ws/exam/?token={token}",
+        )
+        connected, _ = await communicator.connect()
+        assert connected
+        return communicator
+
+    return connect
+
+
+async def _request(communicator, action, **data):
+    await communicator.send_to(text_data=json.dumps({"action": action, **data}))
+    return json.loads(await communicator.receive_from())
+
+
+async def _tick(communicator):
+    message = json.loads(await communicator.receive_from(timeout=2))
+    assert message["type"] == "time_remaining"
+    return message["data"]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_exam_socket_resolves_its_context_once(enrollment, exam_socket):
+    first = enrollment.question_order[0]
+
+    async def run():
+        communicator = await exam_socket(enrollment)
+        page = await _request(communicator, "get_question", page=1)
+        assert page["data"]["id"] == first
+        saved = await _request(
+            communicator,
+            "save_answer",
+            question_id=first,
+            selected_answer="b",
+        )
+        assert saved["status"] == status.HTTP_200_OK, saved
+        batch = await _request(
+            communicator,
+            "save_answers",
+            answers=[{"question_id": first, "selected_answer": "c", "client_seq": 1}],
+        )
+        assert batch["status"] == status.HTTP_200_OK, batch
+        summary = await _request(communicator, "get_answers_summary")
+        assert summary["data"]["answered_count"] == 1
+        session = await _request(communicator, "get_exam_session")
+        assert session["status"] == status.HTTP_200_OK, session
+        assert resolve.call_count == 1
+
+        # Server-side changes make the socket reload its context
+        await get_channel_layer().group_send(
+            enrollment_group(enrollment.id),
+            {"type": "exam.context_invalidated"},
+        )
+        await _request(communicator, "get_question", page=1)
+        assert resolve.call_count == 2  # noqa: PLR2004
+        await communicator.disconnect()
+
+    with mock.patch.object(
+        exam_consumer,
+        "get_closest_enrollment",
+        wraps=get_closest_enrollment,
+    ) as resolve:
+        async_to_sync(run)()
+
+
+def test_timer_state_applies_session_pause_and_resume():
+    now = timezone.now()
+    timer = TimerState(
+        status="active",
+        session_started_at=now - timedelta(minutes=10),
+        individual_duration=timedelta(hours=1),
+        paused_duration=timedelta(),
+        individual_paused_duration=timedelta(),
+    )
+    assert timer.remaining(now) == timedelta(minutes=50)
+
+    paused = timer.paused(now)
+    assert paused.remaining(now + timedelta(minutes=5)) == timedelta(minutes=50)
+    resumed = paused.resumed(now + timedelta(minutes=5))
+    assert resumed.paused_duration == timedelta(minutes=5)
+    assert resumed.remaining(now + timedelta(minutes=6)) == timedelta(minutes=49)
+    assert TimerState.from_dict(resumed.to_dict()) == resumed
+    assert resumed.submitted().remaining(now) == timedelta()
+
+
+def test_timer_state_matches_the_enrollment(
+    enrollment,
+    django_capture_on_commit_callbacks,
+):
+    with (
+        mock.patch("appExam.utils.timer.send_to_group") as send,
+        django_capture_on_commit_callbacks(execute=True),
+    ):
+        enrollment.pause()
+    (group, event_type), payload = send.call_args
+    assert (group, event_type) == (
+        enrollment_group(enrollment.id),
+        "exam.timer_updated",
+    )
+    now = timezone.now()
+    assert TimerState.from_dict(payload["timer"]).remaining(now) == (
+        TimerState.from_enrollment(enrollment).remaining(now)
+    )
+
+
+def test_session_pause_is_pushed_once_for_the_session(
+    enrollment,
+    django_capture_on_commit_callbacks,
+):
+    session_id = enrollment.session_id
+    with (
+        mock.patch("appExam.utils.timer.send_to_group") as send,
+        django_capture_on_commit_callbacks(execute=True),
+    ):
+        pause_exam_session(session_id)
+    send.assert_called_once()
+    (group, event_type), payload = send.call_args
+    assert (group, event_type) == (session_group(session_id), "exam.session_paused")
+    enrollment.refresh_from_db()
+    assert payload["at"] == enrollment.paused_at.isoformat()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_exam_socket_timer_stops_on_pushed_pause(enrollment, exam_socket):
+    async def run():
+        communicator = await exam_socket(enrollment)
+        await communicator.send_to(text_data=json.dumps({"action": "start_timer"}))
+        assert (await _tick(communicator))["seconds"] > 0
+
+        await get_channel_layer().group_send(
+            session_group(enrollment.session_id),
+            {"type": "exam.session_paused", "at": timezone.now().isoformat()},
+        )
+        await communicator.receive_nothing(timeout=0.1)
+        paused_at = await _tick(communicator)
+        assert await _tick(communicator) == paused_at
+        await communicator.send_to(text_data=json.dumps({"action": "stop_timer"}))
+        await communicator.disconnect()
+
+    async_to_sync(run)()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_exam_socket_timer_follows_a_later_session_start(
+    exam_session,
+    enrollments,
+    exam_socket,
+):
+    async def run():
+        communicator = await exam_socket(enrollments[0])
+        await communicator.send_to(text_data=json.dumps({"action": "start_timer"}))
+        assert (await _tick(communicator))["expired"]
+
+        await sync_to_async(exam_session.start_session)()
+        await communicator.receive_nothing(timeout=0.1)
+        assert (await _tick(communicator))["seconds"] > 0
+        await communicator.send_to(text_data=json.dumps({"action": "stop_timer"}))
+        await communicator.disconnect()
+
+    async_to_sync(run)()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_exam_socket_timer_follows_a_duration_change(enrollment, exam_socket):
+    session = enrollment.session
+
+    async def run():
+        communicator = await exam_socket(enrollment)
+        await communicator.send_to(text_data=json.dumps({"action": "start_timer"}))
+        before = (await _tick(communicator))["seconds"]
+
+        session.base_duration += timedelta(minutes=30)
+        await sync_to_async(session.save)()
+        await communicator.receive_nothing(timeout=0.1)
+        after = (await _tick(communicator))["seconds"]
+        assert after > before + 29 * 60
+        await communicator.send_to(text_data=json.dumps({"action": "stop_timer"}))
+        await communicator.disconnect()
+
+    async_to_sync(run)()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_status_socket_receives_session_events(enrollment):
+    user = enrollment.candidate.user
+
+    async def run():
+        communicator = WebsocketCommunicator(
+            ExamStatusConsumer.as_asgi(),
+            "/ws/exam/status/",
+        )
+        communicator.scope["user"] = user
+        connected, _ = await communicator.connect()
+        assert connected
+        message = await communicator.receive_json_from(timeout=3)
+        assert message["type"] == "status"
+        assert message["data"]["status"] == "active"
+
+        await sync_to_async(pause_exam_session)(enrollment.session_id)
+        while True:
+            message = await communicator.receive_json_from(timeout=3)
+            event = message["data"].get("event", {})
+            if event.get("type") == "session_paused":
+                break
+        assert message["data"]["session_status"] == "paused"
+        assert event["at"]
+        await communicator.disconnect()
+
+    async_to_sync(run)()
+
+
+def test_warm_up_is_queued_once_per_session_start(exam_session):
+    ExamSession.objects.filter(pk=exam_session.pk).update(
+        base_start=timezone.now() + timedelta(minutes=10),
+    )
+    with mock.patch.object(warm_up_exam_session, "delay") as delay:
+        warm_up_upcoming_sessions()
+        warm_up_upcoming_sessions()
+    delay.assert_called_once_with(exam_session.id)
+
+    # Rescheduling the session warms it up again
+    ExamSession.objects.filter(pk=exam_session.pk).update(
+        base_start=timezone.now() + timedelta(minutes=20),
+    )
+    with mock.patch.object(warm_up_exam_session, "delay") as delay:
+        warm_up_upcoming_sessions()
+    delay.assert_called_once_with(exam_session.id)
+
+
+def test_deadline_index_tracks_running_timers(
+    enrollment,
+    enrollments,
+    redis_client,
+    django_capture_on_commit_callbacks,
+):
+    deadline = redis_client.zscore(DEADLINE_KEY, enrollment.id)
+    expected = enrollment.session_started_at + enrollment.individual_duration
+    assert deadline == pytest.approx(expected.timestamp(), abs=1)
+    assert redis_client.zcard(DEADLINE_KEY) == len(enrollments)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        enrollment.pause()
+    assert redis_client.zscore(DEADLINE_KEY, enrollment.id) is None
+    with django_capture_on_commit_callbacks(execute=True):
+        enrollment.resume()
+    assert redis_client.zscore(DEADLINE_KEY, enrollment.id) > deadline
+
+
+def test_due_enrollments_are_submitted_from_the_index(
+    enrollment,
+    enrollments,
+    redis_client,
+    expire,
+    django_capture_on_commit_callbacks,
+):
+    expired, early = enrollments[0], enrollments[1]
+    expire(expired)
+    # Indexed as due, but a pause credit moved its deadline since
+    StudentExamEnrollment.objects.filter(pk=early.pk).update(
+        paused_duration=timedelta(minutes=5),
+    )
+    redis_client.zadd(DEADLINE_KEY, {expired.id: 0, early.id: 0})
+
+    with django_capture_on_commit_callbacks(execute=True):
+        assert submit_due_enrollments() == "Auto-submitted 1 of 2 due students"
+
+    expired.refresh_from_db()
+    assert expired.status == "submitted"
+    assert redis_client.zscore(DEADLINE_KEY, expired.id) is None
+    early.refresh_from_db()
+    assert early.status == "active"
+    assert redis_client.zscore(DEADLINE_KEY, early.id) > timezone.now().timestamp()
+    assert submit_due_enrollments() == "No deadlines due"
+
+
+def test_due_enrollments_are_reindexed_when_the_submit_fails(
+    enrollment,
+    redis_client,
+    expire,
+    monkeypatch,
+):
+    expire(enrollment)
+    redis_client.zadd(DEADLINE_KEY, {enrollment.id: 0})
+
+    def fail(queryset, now=None):
+        raise DatabaseError
+
+    monkeypatch.setattr(StudentExamEnrollmentQuerySet, "submit", fail)
+    assert submit_due_enrollments() == "Deadline submission failed"
+
+    enrollment.refresh_from_db()
+    assert enrollment.status == "active"
+    # Still due, so the next tick picks it up again
+    assert pop_due_enrollments() == [enrollment.id]
+
+
+def test_due_enrollments_are_claimed_once(redis_client):
+    redis_client.zadd(DEADLINE_KEY, {1: 0, 2: 0, 3: time.time() + 60})
+    assert sorted(pop_due_enrollments()) == [1, 2]
+    assert pop_due_enrollments() == []
+
+
+def test_session_pause_resume_and_halt(
+    enrollment,
+    enrollments,
+    redis_client,
+    django_capture_on_commit_callbacks,
+):
+    session = enrollment.session
+    with django_capture_on_commit_callbacks(execute=True):
+        assert pause_exam_session(session.id) == (
+            f"Paused session {session.id} ({len(enrollments)} students)"
+        )
+    session.refresh_from_db()
+    assert session.status == "paused"
+    assert set(session.enrollments.values_list("status", "paused_at")) == {
+        ("paused", session.pause_start),
+    }
+    assert redis_client.zcard(DEADLINE_KEY) == 0
+
+    with django_capture_on_commit_callbacks(execute=True):
+        resume_exam_session(session.id)
+    session.refresh_from_db()
+    assert session.status == "ongoing"
+    assert set(session.enrollments.values_list("status", "paused_duration")) == {
+        ("active", session.total_paused),
+    }
+    assert redis_client.zcard(DEADLINE_KEY) == len(enrollments)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        assert halt_exam_session(session.id) == (
+            f"Halted session {session.id} ({len(enrollments)} students submitted)"
+        )
+    assert set(session.enrollments.values_list("status", flat=True)) == {"submitted"}
+    assert redis_client.zcard(DEADLINE_KEY) == 0
+
+
+def test_session_tasks_ignore_other_states(exam_session):
+    assert pause_exam_session(exam_session.id) == (
+        f"Session {exam_session.id} not in ongoing state"
+    )
+    assert resume_exam_session(exam_session.id) == (
+        f"Session {exam_session.id} not in paused state"
+    )
+    assert pause_exam_session(0) == "Session 0 not found"
+
+
+def test_end_session_leaves_disconnected_students_to_the_ticker(
+    enrollment,
+    enrollments,
+    redis_client,
+    expire,
+    django_capture_on_commit_callbacks,
+):
+    connected, disconnected = enrollments[0], enrollments[1]
+    StudentExamEnrollment.objects.filter(pk=connected.pk).update(present=True)
+    session = enrollment.session
+    session.refresh_from_db()
+    with django_capture_on_commit_callbacks(execute=True):
+        assert session.end_session()
+
+    connected.refresh_from_db()
+    assert connected.status == "submitted"
+    assert redis_client.zscore(DEADLINE_KEY, connected.id) is None
+    assert redis_client.zcard(DEADLINE_KEY) == len(enrollments) - 1
+
+    # The disconnected student's own time runs out later
+    expire(disconnected)
+    redis_client.zadd(DEADLINE_KEY, {disconnected.id: 0})
+    with django_capture_on_commit_callbacks(execute=True):
+        assert submit_due_enrollments() == "Auto-submitted 1 of 1 due students"
+    disconnected.refresh_from_db()
+    assert disconnected.status == "submitted"
+
+
+def _scheduled(name, task_id, *args):
+    return {"request": {"name": name, "id": task_id, "args": list(args)}}
+
+
+@pytest.mark.parametrize("purge", [False, True])
+def test_purge_eta_tasks_reports_stale_countdowns(
+    enrollment,
+    enrollments,
+    redis_client,
+    purge,
+):
+    running, submitted = enrollments[0], enrollments[1]
+    StudentExamEnrollment.objects.filter(pk=submitted.pk).update(status="submitted")
+    redis_client.delete(DEADLINE_KEY)
+    control = mock.Mock()
+    control.inspect.return_value.scheduled.return_value = {
+        "worker1": [
+            _scheduled(purge_eta_tasks.SUBMIT_TASK, "running", running.id),
+            _scheduled(purge_eta_tasks.SUBMIT_TASK, "submitted", submitted.id),
+            _scheduled("appCore.tasks.exam_monitor", "monitor"),
+        ],
+        "worker2": [_scheduled(purge_eta_tasks.SUBMIT_TASK, "deleted", 0)],
+    }
+    stdout = io.StringIO()
+
+    with mock.patch.object(purge_eta_tasks.celery_app, "control", control):
+        call_command("purge_eta_tasks", *(["--purge"] if purge else []), stdout=stdout)
+
+    output = stdout.getvalue()
+    assert "worker1: 2 tasks\nworker2: 1 tasks\n" in output
+    assert (
+        "3 ETA tasks: 2 for submitted or deleted enrollments, 1 for running exams"
+    ) in output
+    if not purge:
+        control.revoke.assert_not_called()
+        assert redis_client.zcard(DEADLINE_KEY) == 0
+        return
+    control.revoke.assert_called_once_with(["running", "submitted", "deleted"])
+    # Only the running exam is handed over to the deadline index
+    assert redis_client.zrange(DEADLINE_KEY, 0, -1) == [str(running.id).encode()]
 
-# Create your tests here.
@@ -0,0 +1,31 @@
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+logger = logging.getLogger(__name__)
+
+
+def session_group(session_id):
+    return f"exam_session_{session_id}"
+
+
+def enrollment_group(enrollment_id):
+    return f"exam_enrollment_{enrollment_id}"
+
+
+def send_to_group(group, event_type, **payload):
+    """
+    Publish one event to every socket in `group`, on any node.
+    `event_type` is the consumer handler, e.g. "exam.context_invalidated".
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(
+            group,
+            {"type": event_type, **payload},
+        )
+    except Exception:
+        logger.exception("Failed to publish %s to %s", event_type, group)
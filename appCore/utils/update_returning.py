@@ -0,0 +1,48 @@
+from django.db import connections
+from django.db import transaction
+from django.db.models import sql
+
+# Backends whose UPDATE accepts a RETURNING clause (SQLite from 3.35)
+RETURNING_VENDORS = ("postgresql", "sqlite")
+
+
+def _supports_update_returning(connection):
+    return (
+        connection.vendor in RETURNING_VENDORS
+        and connection.features.can_return_rows_from_bulk_insert
+    )
+
+
+def update_returning_ids(queryset, **values):
+    """
+    Apply `queryset.update(**values)` and return the primary keys of the rows
+    it changed, in one `UPDATE ... RETURNING` statement where supported.
+
+    Other backends lock and read the matching keys first, then update exactly
+    those rows.
+    """
+    db = queryset.db
+    connection = connections[db]
+    model = queryset.model
+
+    if not _supports_update_returning(connection):
+        with transaction.atomic(using=db):
+            ids = list(queryset.select_for_update().values_list("pk", flat=True))
+            if ids:
+                model._default_manager.using(db).filter(pk__in=ids).update(**values)  # noqa: SLF001
+        return ids
+
+    query = queryset.query.chain(sql.UpdateQuery)
+    query.add_update_values(values)
+    query.annotations = {}
+    compiler = query.get_compiler(db)
+    # Rewrites joined filters into a pk subquery, as QuerySet.update() would
+    compiler.pre_sql_setup()
+    statement, params = compiler.as_sql()
+    if not statement:
+        return []
+
+    pk_column = connection.ops.quote_name(model._meta.pk.column)  # noqa: SLF001
+    with connection.cursor() as cursor:
+        cursor.execute(f"{statement} RETURNING {pk_column}", params)
+        return [row[0] for row in cursor.fetchall()]
@@ -2,6 +2,7 @@ from datetime import timedelta
 
 from django.contrib import admin
 from django.contrib import messages
+from django.db import transaction
 from django.http import HttpResponseRedirect
 from django.shortcuts import get_object_or_404
 from django.urls import path
@@ -14,8 +15,8 @@ from django.utils.safestring import mark_safe
 from appCore.tasks import pause_exam_session
 from appCore.tasks import resume_exam_session
 
-from .admin_view import enroll_students_view
 from .admin_view import download_results_csv_view
+from .admin_view import enroll_students_view
 from .forms import ExamSessionForm
 from .models import Answer
 from .models import Exam
@@ -28,9 +29,11 @@ from .models import StudentExamEnrollment
 from .question_admin_view import import_questions_document_view
 from .question_admin_view import import_questions_view
 from .question_admin_view import parse_questions_view
-
-from .utils.export_student_details_pdf import download_exam_pdf_view  # noqa: ERA001
+from .tasks import warm_up_exam_session
 from .utils.export_student_details_pdf import download_exam_excel_view
+from .utils.export_student_details_pdf import download_exam_pdf_view  # noqa: ERA001
+from .utils.paper import invalidate_paper
+from .utils.question_text import question_text_hash
 
 admin.site.register(StudentAnswer)
 
@@ -107,7 +110,7 @@ class ExamSessionAdmin(admin.ModelAdmin):
     date_hierarchy = "base_start"
     list_display_links = ("id", "exam")
     list_per_page = 10
-    actions = ["bulk_pause", "bulk_resume", "bulk_end"]
+    actions = ["bulk_pause", "bulk_resume", "bulk_end", "bulk_warm_up"]
     inlines = [EnrollmentInline]
 
     readonly_fields = (
@@ -289,6 +292,15 @@ class ExamSessionAdmin(admin.ModelAdmin):
 
     bulk_end.short_description = "End selected sessions"
 
+    def bulk_warm_up(self, request, queryset):
+        count = 0
+        for sess in queryset.filter(status="scheduled"):
+            warm_up_exam_session.delay(sess.id)
+            count += 1
+        self.message_user(request, f"Preparing papers for {count} scheduled sessions")
+
+    bulk_warm_up.short_description = "Prepare papers for selected sessions"
+
     # Custom action for student enrollment
     def enroll_students_action(self, request, queryset):
         """Admin action to enroll students for selected exam sessions"""
@@ -375,6 +387,11 @@ class StudentExamEnrollmentAdmin(admin.ModelAdmin):
         "created_at",
     )
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if {"question_order", "answer_order"} & set(form.changed_data):
+            transaction.on_commit(lambda: invalidate_paper(obj.id))
+
     def effective_time_remaining_display(self, obj):
         return obj.effective_time_remaining
 
@@ -384,21 +401,14 @@ class StudentExamEnrollmentAdmin(admin.ModelAdmin):
         return False
 
     def force_submit(self, request, queryset):
-        count = 0
-        for enroll in queryset.filter(status="active"):
-            if enroll.submit_exam():
-                count += 1
-        self.message_user(request, f"Forcibly submitted {count} students")
+        submitted = queryset.filter(status="active").submit()
+        self.message_user(request, f"Forcibly submitted {len(submitted)} students")
 
     force_submit.short_description = "Force submit selected students"
 
     def grant_extra_time(self, request, queryset):
-        count = 0
-        for enroll in queryset:
-            if enroll.individual_paused_duration.total_seconds() > 0:
-                enroll.grant_extra_time()
-                count += 1
-        self.message_user(request, f"Granted extra time to {count} students.")
+        granted = queryset.grant_extra_time()
+        self.message_user(request, f"Granted extra time to {len(granted)} students.")
 
     grant_extra_time.short_description = "Grant paused time to selected students"
 
@@ -413,6 +423,16 @@ class AnswerAdmin(admin.ModelAdmin):
 class QuestionAdmin(admin.ModelAdmin):
     list_display = ("text", "session")
     list_per_page = 10
+    search_fields = ("text",)
+
+    def get_search_results(self, request, queryset, search_term):
+        # A pasted question is found through the text_hash index before
+        # falling back to a substring scan of every text
+        if search_term:
+            exact = queryset.filter(text_hash=question_text_hash(search_term))
+            if exact.exists():
+                return exact, False
+        return super().get_search_results(request, queryset, search_term)
 
     def all_answers(self, obj):
         answers = obj.answers.all()
@@ -88,6 +88,7 @@ def enroll_students_view(request, session_id):
                 session_id=session.id,
                 hall_assignment_id=hall_assignment.id,
                 range_string=range_string,
+                seat_strategy=form.cleaned_data["seat_strategy"],
             )
 
             messages.success(
@@ -5,6 +5,8 @@ from django.contrib.admin.widgets import AdminSplitDateTime
 
 from .models import ExamSession
 from .models import Hall
+from .utils.seat_allocator import SEQUENTIAL
+from .utils.seat_allocator import STRATEGY_CHOICES
 
 
 class DocumentUploadForm(forms.Form):
@@ -58,6 +60,13 @@ class EnrollmentRangeForm(forms.Form):
             help_text="Enter comma-separated ranges or individual symbols.",
         )
 
+        self.fields["seat_strategy"] = forms.ChoiceField(
+            choices=STRATEGY_CHOICES,
+            initial=SEQUENTIAL,
+            label="Seat Allocation",
+            help_text="How seats are handed out in the session's time slot.",
+        )
+
 
 class CleanAdminSplitDateTime(AdminSplitDateTime):
     def __init__(self, attrs=None):
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.9 on 2026-10-16 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appExam', '0042_alter_hallandstudentassignment_roll_number_range'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='question',
+            name='unique_session_text',
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='text_hash',
+            field=models.CharField(default='', editable=False, max_length=64),
+            preserve_default=False,
+        ),
+    ]
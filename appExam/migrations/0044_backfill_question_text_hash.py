@@ -0,0 +1,55 @@
+import hashlib
+import logging
+
+from django.db import migrations
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 2000
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def backfill_text_hash(apps, schema_editor):
+    Question = apps.get_model("appExam", "Question")
+    seen = set()
+    disambiguated = []
+    batch = []
+    for question in Question.objects.only("id", "session_id", "text").iterator(
+        chunk_size=BATCH_SIZE,
+    ):
+        text = question.text or ""
+        question.text_hash = _digest(" ".join(text.split()))
+        if (question.session_id, question.text_hash) in seen:
+            # Existing rows that only differ in whitespace were allowed by the
+            # old constraint; keep them apart with a per-row digest, which
+            # Question.save() keeps until the text is edited
+            question.text_hash = _digest(f"{question.id}:{text}")
+            disambiguated.append(question.id)
+        seen.add((question.session_id, question.text_hash))
+        batch.append(question)
+        if len(batch) >= BATCH_SIZE:
+            Question.objects.bulk_update(batch, ["text_hash"])
+            batch = []
+    if batch:
+        Question.objects.bulk_update(batch, ["text_hash"])
+    if disambiguated:
+        logger.warning(
+            "%d questions repeat another question of their session up to "
+            "whitespace and were given per-row text hashes: %s",
+            len(disambiguated),
+            disambiguated,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appExam', '0043_question_text_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_text_hash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.9 on 2026-10-16 14:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appExam', '0044_backfill_question_text_hash'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='question',
+            constraint=models.UniqueConstraint(fields=('text_hash', 'session'), name='unique_session_text_hash'),
+        ),
+    ]
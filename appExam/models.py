@@ -5,9 +5,19 @@ from datetime import timedelta
 from ckeditor.fields import RichTextField
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import Case
+from django.db.models import F
+from django.db.models import Value
+from django.db.models import When
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import LessThanOrEqual
 from django.utils import timezone
 
 from appAuthentication.models import Candidate
+from appExam.utils.question_text import question_text_hash
+from appExam.utils.timer import TimerState
+from appExam.utils.timer import publish_session_event
+from appExam.utils.timer import publish_timer
 from appInstitutions.models import Program
 from appInstitutions.models import Subject
 
@@ -114,6 +124,18 @@ class ExamSession(models.Model):
             msg = "Completion time must be set when marking as completed"
             raise ValidationError(msg)
 
+    def _invalidate_enrollments(self):
+        """Refresh cached lookups, states and deadlines after bulk updates"""
+        from appExam.utils.deadlines import schedule_session_deadlines_on_commit
+        from appExam.utils.enrollment_cache import (
+            invalidate_session_enrollments_on_commit,
+        )
+        from appExam.utils.enrollment_state import store_session_states_on_commit
+
+        invalidate_session_enrollments_on_commit(self.id)
+        store_session_states_on_commit(self.id)
+        schedule_session_deadlines_on_commit(self.id)
+
     def start_session(self):
         if self.status == "scheduled":
             start_time = timezone.now()
@@ -121,20 +143,28 @@ class ExamSession(models.Model):
             self.save()
             # Activate all student enrollments
             self.enrollments.update(status="active", session_started_at=start_time)
+            self._invalidate_enrollments()
+            # Sockets opened before the start reload their timers
+            publish_session_event(self.id, "exam.session_started", start_time)
+
+            # Compile the question bank before candidates start paging
+            from appExam.utils.question_bank import build_session_bank
+
+            build_session_bank(self.id)
             return True
         return False
 
-    def pause_session(self):
+    def pause_session(self, now=None):
         if self.status == "ongoing":
             self.status = "paused"
-            self.pause_start = timezone.now()
+            self.pause_start = now or timezone.now()
             self.save()
             return True
         return False
 
-    def resume_session(self):
+    def resume_session(self, now=None):
         if self.status == "paused" and self.pause_start:
-            pause_duration = timezone.now() - self.pause_start
+            pause_duration = (now or timezone.now()) - self.pause_start
             self.total_paused += pause_duration
             self.status = "ongoing"
             self.pause_start = None
@@ -149,18 +179,15 @@ class ExamSession(models.Model):
             self.save()
 
             # Submit connected students immediately
-            connected = self.enrollments.filter(present=True)
-            connected.update(status="submitted")
-
-            # Handle disconnected students
-            disconnected = self.enrollments.filter(present=False, status="active")
-            for enrollment in disconnected:
-                from appCore.tasks import submit_student_exam
-
-                submit_student_exam.apply_async(
-                    (enrollment.id,),
-                    countdown=enrollment.effective_time_remaining.total_seconds(),
-                )
+            self.enrollments.filter(present=True).submit(
+                self.completed_at,
+                push_timers=False,
+            )
+            publish_session_event(self.id, "exam.session_ended")
+
+            # Disconnected students keep their remaining time. Their deadlines
+            # stay in the index (re-written by the save above) and
+            # submit_due_enrollments submits each one when it runs out.
             return True
         return False
 
@@ -192,19 +219,63 @@ class HallAndStudentAssignment(models.Model):
 # ===================== Question Model ===============================
 class Question(models.Model):
     text = models.TextField()
+    # Digest of the normalized text; keeps the uniqueness index small
+    text_hash = models.CharField(max_length=64, editable=False)
     session = models.ForeignKey(ExamSession, on_delete=models.CASCADE)
 
     class Meta:
         constraints = [
+            # text_hash leads so admin search by hash can use the index too
             models.UniqueConstraint(
-                fields=["session", "text"],
-                name="unique_session_text",
+                fields=["text_hash", "session"],
+                name="unique_session_text_hash",
             ),
         ]
 
     def __str__(self):
         return self.text[:50]
 
+    def save(self, *args, **kwargs):
+        self.fill_text_hash()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "text" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "text_hash"}
+        super().save(*args, **kwargs)
+
+    def clean(self):
+        self.fill_text_hash()
+        if (
+            self.session_id
+            and Question.objects.filter(
+                session_id=self.session_id,
+                text_hash=self.text_hash,
+            )
+            .exclude(pk=self.pk)
+            .exists()
+        ):
+            msg = "This session already has this question."
+            raise ValidationError({"text": msg})
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values, strict=True))
+        instance._loaded_text = loaded.get("text")  # noqa: SLF001
+        return instance
+
+    def fill_text_hash(self):
+        """
+        Set text_hash from text; bulk_create callers must call this.
+
+        A stored hash is kept while the text is unchanged: migration 0044 gave
+        rows that only differed in whitespace per-row digests, and recomputing
+        those on an unrelated save would break unique_session_text_hash.
+        """
+        loaded_text = getattr(self, "_loaded_text", None)
+        if self.text_hash and loaded_text is not None and self.text == loaded_text:
+            return
+        self.text_hash = question_text_hash(self.text)
+
 
 # ======================== Answer Model ========================
 class Answer(models.Model):
@@ -221,6 +292,117 @@ class Answer(models.Model):
 
 
 # ======================== Student Exam Enrollment Model ========================
+def _bulk_transition(queryset, values, push_timers):
+    from appCore.utils.update_returning import update_returning_ids
+    from appExam.utils.bulk_refresh import refresh_enrollments_on_commit
+
+    ids = update_returning_ids(queryset, **values)
+    refresh_enrollments_on_commit(ids, push_timers=push_timers)
+    return ids
+
+
+class StudentExamEnrollmentQuerySet(models.QuerySet):
+    @staticmethod
+    def deadline_expression(now):
+        """
+        SQL form of TimerState.remaining(): the moment the enrollment's time
+        runs out. A pause in progress pushes it back by its length so far.
+        """
+        running = (
+            F("session_started_at")
+            + F("individual_duration")
+            + F("paused_duration")
+            + F("individual_paused_duration")
+        )
+        zero = Value(timedelta(), output_field=models.DurationField())
+        ongoing_pause = Coalesce(Value(now) - F("paused_at"), zero) + Coalesce(
+            Value(now) - F("individual_paused_at"),
+            zero,
+        )
+        return Case(
+            When(status="paused", then=running + ongoing_pause),
+            default=running,
+            output_field=models.DateTimeField(),
+        )
+
+    def expired(self, now=None):
+        """Active or paused enrollments whose time is up"""
+        now = now or timezone.now()
+        return self.filter(
+            LessThanOrEqual(self.deadline_expression(now), Value(now)),
+            status__in=["active", "paused"],
+            session_started_at__isnull=False,
+        )
+
+    # Bulk transitions: one UPDATE each, returning the ids they changed.
+    # Session-wide callers pass the session's own `now` so every clock in the
+    # session moves by exactly the same amount, and push_timers=False when a
+    # session event already reaches the sockets.
+
+    def pause(self, now=None, *, push_timers=True):
+        now = now or timezone.now()
+        return _bulk_transition(
+            self.filter(status="active"),
+            {"status": "paused", "paused_at": now, "updated_at": now},
+            push_timers,
+        )
+
+    def resume(self, now=None, *, push_timers=True):
+        now = now or timezone.now()
+        return _bulk_transition(
+            self.filter(status="paused", paused_at__isnull=False),
+            {
+                "status": "active",
+                "paused_duration": F("paused_duration") + (Value(now) - F("paused_at")),
+                "paused_at": None,
+                "updated_at": now,
+            },
+            push_timers,
+        )
+
+    def grant_extra_time(self, now=None, *, push_timers=True):
+        """Bulk form of StudentExamEnrollment.grant_extra_time()"""
+        now = now or timezone.now()
+        return _bulk_transition(
+            self.filter(individual_paused_duration__gt=timedelta()),
+            {
+                "individual_duration": (
+                    F("individual_duration") + F("individual_paused_duration")
+                ),
+                "individual_paused_duration": timedelta(),
+                "updated_at": now,
+            },
+            push_timers,
+        )
+
+    def extend_duration(self, delta, now=None, *, push_timers=True):
+        """Shift every individual duration by `delta` (base_duration changes)"""
+        now = now or timezone.now()
+        return _bulk_transition(
+            self,
+            {
+                "individual_duration": F("individual_duration") + delta,
+                "updated_at": now,
+            },
+            push_timers,
+        )
+
+    def submit(self, now=None, *, push_timers=True):
+        """Bulk form of submit_exam()"""
+        from appExam.utils.answer_buffer import flush_dirty_enrollments
+        from appExam.utils.answer_buffer import write_behind_enabled
+
+        now = now or timezone.now()
+        ids = _bulk_transition(
+            self.exclude(status="submitted"),
+            {"status": "submitted", "present": False, "updated_at": now},
+            push_timers,
+        )
+        if ids and write_behind_enabled():
+            flush_dirty_enrollments(ids)
+        return ids
+
+
 class StudentExamEnrollment(models.Model):
     STATUS_CHOICES = [
         ("inactive", "Inactive"),
@@ -265,6 +447,8 @@ class StudentExamEnrollment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = StudentExamEnrollmentQuerySet.as_manager()
+
     class Meta:
         indexes = [
             models.Index(fields=["status", "session"]),
@@ -276,24 +460,7 @@ class StudentExamEnrollment(models.Model):
 
     @property
     def effective_time_remaining(self):
-        if not self.session_started_at or self.status not in ["active", "paused"]:
-            return timedelta(0)
-
-        base_elapsed = timezone.now() - self.session_started_at
-
-        ongoing_pause = timedelta()
-        if self.status == "paused":
-            if self.paused_at:
-                ongoing_pause += timezone.now() - self.paused_at
-            if self.individual_paused_at:
-                ongoing_pause += timezone.now() - self.individual_paused_at
-
-        total_pause = (
-            self.paused_duration + self.individual_paused_duration + ongoing_pause
-        )
-        adjusted_elapsed = base_elapsed - total_pause
-
-        return max(self.individual_duration - adjusted_elapsed, timedelta(0))
+        return TimerState.from_enrollment(self).remaining()
 
     @property
     def should_submit(self):
@@ -307,6 +474,7 @@ class StudentExamEnrollment(models.Model):
             self.status = "paused"
             self.paused_at = timezone.now()
             self.save()
+            publish_timer(self)
             return True
         return False
 
@@ -326,6 +494,7 @@ class StudentExamEnrollment(models.Model):
         if self.status != "submitted":
             self.status = "active"
             self.save()
+            publish_timer(self)
         return True
 
     def handle_connect(self):
@@ -341,6 +510,7 @@ class StudentExamEnrollment(models.Model):
         self.status = "active"
         self.disconnected_at = None
         self.save()
+        publish_timer(self)
         return True
 
     def handle_disconnect(self):
@@ -353,9 +523,17 @@ class StudentExamEnrollment(models.Model):
     def submit_exam(self):
         """Finalize exam submission"""
         if self.status != "submitted":
+            # Persist any buffered answers before the exam is closed
+            from appExam.utils.answer_buffer import flush_dirty_enrollments
+            from appExam.utils.answer_buffer import write_behind_enabled
+
+            if write_behind_enabled():
+                flush_dirty_enrollments([self.id])
+
             self.status = "submitted"
             self.present = False
             self.save()
+            publish_timer(self)
             return True
         return False
 
@@ -363,6 +541,7 @@ class StudentExamEnrollment(models.Model):
         self.individual_duration += self.individual_paused_duration
         self.individual_paused_duration = timedelta()
         self.save()
+        publish_timer(self)
         return True
 
 
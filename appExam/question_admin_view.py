@@ -12,12 +12,19 @@ from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 
 from .forms import DocumentUploadForm
-from .models import Answer
 from .models import ExamSession
-from .models import Question
+from .utils.question_import import CREATED
+from .utils.question_import import import_questions
+from .utils.question_staging import discard_staged_questions
+from .utils.question_staging import load_staged_questions
+from .utils.question_staging import stage_questions
+from .utils.questionParser import question_count
 
 logger = logging.getLogger(__name__)
 
+# Skipped rows listed by name in the import result message
+SKIPPED_ROWS_SHOWN = 10
+
 
 def import_questions_view(self, request):
     exam_sessions = ExamSession.objects.all().order_by("-base_start")
@@ -53,11 +60,26 @@ def import_questions_document_view(self, request, session_id):
                 )
 
             try:
+                from .utils.questionParser import iter_questions
                 from .utils.questionParser import parse_questions_from_csv
 
                 parsed_questions = parse_questions_from_csv(document)
 
-                request.session["parsed_questions"] = parsed_questions
+                previous_id = request.session.pop("question_staging_id", None)
+                if previous_id:
+                    discard_staged_questions(previous_id)
+                staging_id = stage_questions(parsed_questions)
+                if staging_id is None:
+                    messages.error(
+                        request,
+                        "The questions could not be held for review. "
+                        "Please upload the file again.",
+                    )
+                    return redirect(
+                        "admin:appExam_question_import_document",
+                        session_id=session_id,
+                    )
+                request.session["question_staging_id"] = staging_id
                 request.session["session_id"] = session_id
                 request.session["document_name"] = document.name
 
@@ -66,7 +88,9 @@ def import_questions_document_view(self, request, session_id):
                     "title": f"Import Questions - {session}",
                     "session": session,
                     "document_name": document.name,
-                    "questions": parsed_questions,
+                    "questions": [
+                        question for _, question in iter_questions(parsed_questions)
+                    ],
                     "opts": self.model._meta,
                     "has_view_permission": True,
                     "current_time": timezone.localtime(timezone.now()),
@@ -110,7 +134,8 @@ def parse_questions_view(self, request):
 
     try:
         session_id = request.session.get("session_id")
-        parsed_questions = request.session.get("parsed_questions")
+        staging_id = request.session.get("question_staging_id")
+        parsed_questions = staging_id and load_staged_questions(staging_id)
 
         if not session_id or not parsed_questions:
             messages.error(request, "Session expired or missing data.")
@@ -118,140 +143,56 @@ def parse_questions_view(self, request):
 
         session = get_object_or_404(ExamSession, id=session_id)
 
-        # DEBUG: Log all POST data
-        logger.info("=== POST DATA DEBUG ===")
-        for key, value in request.POST.items():
-            logger.info(f"POST[{key}] = {value}")
-        logger.info("=== END POST DATA ===")
-
-        # DEBUG: Log original parsed questions count
-        logger.info(f"Original parsed questions count: {len(parsed_questions)}")
-
-        updated_questions = []
-
-        # ISSUE 1: Your original code collects question numbers from POST keys
-        # This can miss questions if any field is empty or malformed
-        question_numbers = set()
-        for key in request.POST.keys():
-            if key.startswith("question_"):
-                try:
-                    question_numbers.add(int(key.split("_")[1]))
-                except ValueError:
-                    continue
-
-        question_numbers = sorted(question_numbers)
-        logger.info(f"Question numbers found in POST: {question_numbers}")
-
-        # BETTER APPROACH: Use the original parsed count
-        total_expected = len(parsed_questions)
-        logger.info(
-            f"Expected questions: {total_expected}, Found in POST: {len(question_numbers)}",
-        )
-
-        for question_num in range(
-            1,
-            total_expected + 1,
-        ):  # Use expected count instead
-            logger.info(f"\n--- Processing Question {question_num} ---")
-
-            question_text = request.POST.get(f"question_{question_num}", "").strip()
-            logger.info(f"Question text length: {len(question_text)}")
-
-            # ISSUE 2: This skips questions with empty text
-            if not question_text:
-                logger.warning(
-                    f"Question {question_num}: Empty question text - SKIPPING",
-                )
-                continue  # This is likely causing your issue!
-
+        rows = []
+        for question_num in range(1, question_count(parsed_questions) + 1):
             correct_letter = (
                 request.POST.get(f"correct_{question_num}", "").strip().lower()
             )
-            logger.info(f"Correct letter: '{correct_letter}'")
-
-            answers = []
-            for letter in ["a", "b", "c", "d"]:
-                option_text = request.POST.get(
-                    f"option_{question_num}_{letter}",
-                    "",
-                ).strip()
-                logger.info(
-                    f"Option {letter}: '{option_text}' (length: {len(option_text)})",
-                )
-
-                # ISSUE 3: This only adds non-empty options
-                if (
-                    option_text
-                ):  # This might skip empty options that should be preserved
-                    answers.append(
-                        {
-                            "text": option_text,
-                            "option_letter": letter.upper(),
-                            "is_correct": (letter == correct_letter),
-                        },
-                    )
-
-            logger.info(f"Question {question_num}: Created {len(answers)} answers")
-
-            # ISSUE 4: This skips questions without answers
-            if answers:  # This could skip questions with all empty options
-                updated_questions.append(
+            answers = [
+                {
+                    "text": request.POST.get(
+                        f"option_{question_num}_{letter}",
+                        "",
+                    ).strip(),
+                    "is_correct": letter == correct_letter,
+                }
+                for letter in ["a", "b", "c", "d"]
+            ]
+            rows.append(
+                (
+                    question_num,
                     {
-                        "question": question_text,
+                        "question": request.POST.get(f"question_{question_num}", ""),
                         "answers": answers,
                     },
-                )
-                logger.info(f"Question {question_num}: ADDED to updated_questions")
-            else:
-                logger.warning(f"Question {question_num}: No answers - SKIPPING")
-
-        logger.info(f"\nFinal updated_questions count: {len(updated_questions)}")
-
-        # ISSUE 5: Database creation might fail silently
-        created_count = 0
-        for idx, question_data in enumerate(updated_questions, 1):
-            try:
-                logger.info(f"Creating question {idx} in database...")
-                question = Question.objects.create(
-                    text=question_data["question"],
-                    session=session,
-                )
-                logger.info(f"Question {idx} created with ID: {question.id}")
-
-                answer_count = 0
-                for answer_data in question_data["answers"]:
-                    try:
-                        Answer.objects.create(
-                            question=question,
-                            text=answer_data["text"],
-                            is_correct=answer_data["is_correct"],
-                        )
-                        answer_count += 1
-                        logger.info(
-                            f"Answer created: {answer_data['text'][:50]}...",
-                        )
-                    except Exception as e:
-                        logger.error(f"Failed to create answer: {e!s}")
-
-                logger.info(f"Question {idx}: Created with {answer_count} answers")
-                created_count += 1
-
-            except Exception as e:
-                logger.error(f"Failed to create question {idx}: {e!s}")
-                import traceback
+                ),
+            )
 
-                logger.error(traceback.format_exc())
+        report = import_questions(session, rows)
+        created_count = sum(1 for entry in report if entry["status"] == CREATED)
+        skipped = [entry for entry in report if entry["status"] != CREATED]
 
         # Clear session data
-        for key in ["parsed_questions", "session_id", "document_name"]:
+        discard_staged_questions(staging_id)
+        for key in ["question_staging_id", "session_id", "document_name"]:
             request.session.pop(key, None)
 
-        logger.info(f"=== FINAL RESULT: Created {created_count} questions ===")
-
         messages.success(
             request,
             f"Successfully imported {created_count} question{'s' if created_count != 1 else ''} from CSV.",
         )
+        if skipped:
+            details = "; ".join(
+                f"row {entry['row']}: {entry['message']}"
+                for entry in skipped[:SKIPPED_ROWS_SHOWN]
+            )
+            if len(skipped) > SKIPPED_ROWS_SHOWN:
+                details += f"; and {len(skipped) - SKIPPED_ROWS_SHOWN} more"
+            plural = "s" if len(skipped) != 1 else ""
+            messages.warning(
+                request,
+                f"Skipped {len(skipped)} question{plural} ({details}).",
+            )
         return redirect("admin:appExam_question_changelist")
 
     except Exception as e:
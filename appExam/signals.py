@@ -1,8 +1,21 @@
-from django.db.models import F
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
 from django.db.models.signals import pre_save
 from django.dispatch import receiver
 
+from appExam.models import Answer
 from appExam.models import ExamSession
+from appExam.models import Question
+from appExam.models import StudentAnswer
+from appExam.models import StudentExamEnrollment
+from appExam.utils.answered_index import reindex_answers_on_commit
+from appExam.utils.deadlines import schedule_deadline_on_commit
+from appExam.utils.deadlines import schedule_session_deadlines_on_commit
+from appExam.utils.enrollment_cache import invalidate_enrollment_on_commit
+from appExam.utils.enrollment_cache import invalidate_session_enrollments_on_commit
+from appExam.utils.enrollment_state import store_enrollment_state_on_commit
+from appExam.utils.enrollment_state import store_session_states_on_commit
+from appExam.utils.question_bank import invalidate_session_bank_on_commit
 
 
 @receiver(pre_save, sender=ExamSession)
@@ -14,8 +27,53 @@ def update_enrollment_durations(sender, instance, **kwargs):
         original = ExamSession.objects.get(pk=instance.pk)
         if original.base_duration != instance.base_duration:
             time_diff = instance.base_duration - original.base_duration
-            instance.enrollments.update(
-                individual_duration=F("individual_duration") + time_diff,
-            )
+            # Pushes the new timers to open sockets once committed
+            instance.enrollments.extend_duration(time_diff)
     except ExamSession.DoesNotExist:
         pass
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def invalidate_bank_for_question(sender, instance, **kwargs):
+    invalidate_session_bank_on_commit(instance.session_id)
+
+
+@receiver(post_save, sender=Answer)
+@receiver(post_delete, sender=Answer)
+def invalidate_bank_for_answer(sender, instance, **kwargs):
+    session_id = (
+        Question.objects.filter(pk=instance.question_id)
+        .values_list("session_id", flat=True)
+        .first()
+    )
+    if session_id:
+        invalidate_session_bank_on_commit(session_id)
+
+
+@receiver(post_save, sender=ExamSession)
+def invalidate_enrollments_for_session(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_session_enrollments_on_commit(instance.pk)
+        store_session_states_on_commit(instance.pk)
+        schedule_session_deadlines_on_commit(instance.pk)
+
+
+@receiver(post_save, sender=StudentExamEnrollment)
+@receiver(post_delete, sender=StudentExamEnrollment)
+def invalidate_enrollment_resolution(sender, instance, **kwargs):
+    invalidate_enrollment_on_commit(instance)
+
+
+@receiver(post_save, sender=StudentExamEnrollment)
+def update_enrollment_state(sender, instance, **kwargs):
+    store_enrollment_state_on_commit(instance)
+    schedule_deadline_on_commit(instance)
+
+
+@receiver(post_save, sender=StudentAnswer)
+@receiver(post_delete, sender=StudentAnswer)
+def reindex_answer(sender, instance, **kwargs):
+    # Covers admin edits and deletes and cascades from answers, questions and
+    # enrollments; the committed row is indexed, not this instance's copy
+    reindex_answers_on_commit(instance.enrollment_id, [instance.question_id])
@@ -1,48 +1,30 @@
 import logging
-import re
 
 from celery import shared_task
-from django.db import IntegrityError
 from django.db import transaction
+from django.db.models import Q
 
 from appAuthentication.models import Candidate
+from appAuthentication.utils.symbol_number import extract_symbol_components
 from appCore.models import CeleryTask
 from appCore.utils.track_task import track_task
 from appExam.models import ExamSession
 from appExam.models import Hall
 from appExam.models import SeatAssignment
 from appExam.models import StudentExamEnrollment
+from appExam.utils.bulk_refresh import refresh_enrollments_on_commit
+from appExam.utils.enrollment_cache import invalidate_user_enrollments
+from appExam.utils.paper import cache_papers
+from appExam.utils.question_bank import build_session_bank
+from appExam.utils.randomize import is_randomized
+from appExam.utils.randomize import load_session_layout
+from appExam.utils.randomize import randomize_enrollment
+from appExam.utils.seat_allocator import SEQUENTIAL
+from appExam.utils.seat_allocator import SeatAllocator
 
 logger = logging.getLogger(__name__)
-BATCH_LOG_INTERVAL = 100
-
-
-def extract_symbol_components(symbol):
-    """
-    Extract prefix and numeric parts from a symbol number.
-    Handles complex formats like 'MG12XX10', 'b10001', etc.
-    Examples: 
-    - 'MG12XX10' -> {'prefix': 'mg12xx', 'number': 10}
-    - 'b10001' -> {'prefix': 'b', 'number': 10001}
-    - 'CSE2023001' -> {'prefix': 'cse2023', 'number': 1}
-    """
-    if not symbol:
-        return None
-    
-    symbol = symbol.strip()
-    
-    # Find the last continuous sequence of digits
-    match = re.search(r'(\d+)$', symbol)
-    if not match:
-        return None
-    
-    number_part = match.group(1)
-    prefix_part = symbol[:match.start()]
-    
-    return {
-        'prefix': prefix_part.lower(),
-        'number': int(number_part)
-    }
+ENROLL_CHUNK_SIZE = 1000
+WARMUP_CHUNK_SIZE = 500
 
 
 def parse_flexible_range_string(range_string):
@@ -90,77 +72,94 @@ def parse_flexible_range_string(range_string):
     return ranges
 
 
-def is_symbol_in_range(symbol, ranges):
+def symbol_range_q(ranges):
     """
-    Check if a symbol falls within any of the given ranges.
-    Now prefix-aware: 'b10001' will only match ranges with prefix 'b'.
+    Compile parsed ranges into an OR of
+    (symbol_prefix = p AND symbol_suffix BETWEEN start AND end) predicates,
+    served by the candidate_symbol_range_idx index.
     """
     if ranges == "*":
-        return True
-    
-    comp = extract_symbol_components(symbol)
-    if not comp:
-        return False
-    
-    return any(
-        range_item['prefix'] == comp['prefix'] and
-        range_item['start'] <= comp['number'] <= range_item['end']
-        for range_item in ranges
-    )
+        return Q()
+    if not ranges:
+        return Q(pk__in=[])
+
+    condition = Q()
+    for range_item in ranges:
+        condition |= Q(
+            symbol_prefix=range_item["prefix"],
+            symbol_suffix__range=(range_item["start"], range_item["end"]),
+        )
+    return condition
 
 
-def is_seat_available(hall, seat_number, session):
-    """
-    Check if a seat is available by looking for existing assignments
-    with the same hall, seat_number, and session_base_start
+def bulk_enroll(session, candidates, halls, strategy=SEQUENTIAL):
     """
-    return not SeatAssignment.objects.filter(
-        hall=hall,
-        seat_number=seat_number,
-        session_base_start=session.base_start,
-    ).exists()
+    Enroll `candidates` [(id, symbol_number), ...] into `session`, seating
+    them with SeatAllocator using `strategy`.
 
-
-def assign_seat_to_enrollment(enrollment, session, halls):
-    """
-    Try to assign a seat to an enrollment.
-    Returns True if successful, False otherwise.
+    Enrollments and seats are written with chunked bulk_create in a single
+    transaction. Returns (enrolled symbols, unassigned symbols).
     """
-    for hall in halls:
-        # Get all currently occupied seats for this hall and time slot
-        occupied_seats = set(
-            SeatAssignment.objects.filter(
-                hall=hall,
-                session_base_start=session.base_start,
-            ).values_list("seat_number", flat=True)
+    with transaction.atomic():
+        allocator = SeatAllocator.for_session(session, halls)
+        seats = allocator.allocate(len(candidates), strategy)
+        placed = [
+            (candidate_id, symbol_number, seat)
+            for (candidate_id, symbol_number), seat in zip(
+                candidates,
+                seats,
+                strict=False,
+            )
+        ]
+        unassigned = [symbol_number for _, symbol_number in candidates[len(seats) :]]
+
+        enrollments = StudentExamEnrollment.objects.bulk_create(
+            [
+                StudentExamEnrollment(
+                    candidate_id=candidate_id,
+                    session=session,
+                    status="inactive",
+                    individual_duration=session.base_duration,
+                )
+                for candidate_id, _, _ in placed
+            ],
+            batch_size=ENROLL_CHUNK_SIZE,
+        )
+        SeatAssignment.objects.bulk_create(
+            [
+                # bulk_create skips save(), which normally fills session_base_start
+                SeatAssignment(
+                    enrollment=enrollment,
+                    session=session,
+                    hall=hall,
+                    seat_number=seat_number,
+                    session_base_start=session.base_start,
+                )
+                for enrollment, (_, _, (hall, seat_number)) in zip(
+                    enrollments,
+                    placed,
+                    strict=True,
+                )
+            ],
+            batch_size=ENROLL_CHUNK_SIZE,
+        )
+        # bulk_create fires no post_save: drop cached lookups and index states
+        refresh_enrollments_on_commit(
+            [enrollment.id for enrollment in enrollments],
+            push_timers=False,
         )
 
-        # Try to find an available seat
-        for seat_number in range(1, hall.capacity + 1):
-            if seat_number not in occupied_seats:
-                try:
-                    # Each seat assignment attempt gets its own atomic block
-                    with transaction.atomic():
-                        SeatAssignment.objects.create(
-                            enrollment=enrollment,
-                            session=session,
-                            hall=hall,
-                            seat_number=seat_number,
-                        )
-                    return True  # Successfully assigned
-                except IntegrityError as seat_error:
-                    # This atomic block failed, but we can continue with the next seat
-                    logger.warning(
-                        f"Seat conflict for enrollment {enrollment.id} at seat {seat_number}: {seat_error}"
-                    )
-                    # Add this seat to occupied_seats to avoid trying it again
-                    occupied_seats.add(seat_number)
-                    continue
-    return False  # No seat could be assigned
+    return [symbol for _, symbol, _ in placed], unassigned
 
 
 @shared_task(bind=True)
-def enroll_students_by_symbol_range(self, session_id, hall_assignment_id, range_string):
+def enroll_students_by_symbol_range(
+    self,
+    session_id,
+    hall_assignment_id,
+    range_string,
+    seat_strategy=SEQUENTIAL,
+):
     with track_task(self.request.id, "enroll_students_by_symbol_range") as task:
         try:
             task.message = "Starting enrollment"
@@ -173,8 +172,7 @@ def enroll_students_by_symbol_range(self, session_id, hall_assignment_id, range_
             # Filter candidates by both institute and program
             candidates = Candidate.objects.filter(
                 institute=program.institute, program_id=program.program_id,
-            )
-            total_candidates = candidates.count()
+            ).order_by("id")
 
             try:
                 ranges = parse_flexible_range_string(range_string)
@@ -183,85 +181,45 @@ def enroll_students_by_symbol_range(self, session_id, hall_assignment_id, range_
                 msg = f"Invalid range format: {e!s}"
                 raise ValueError(msg) from e
 
-            enrolled_count = 0
-            skipped_count = 0
-            error_count = 0
-            not_in_program_count = 0
-            errors = []
-            candidates_in_range = []
-            unassigned_candidates = []
-            halls = Hall.objects.all()
-
-            for idx, candidate in enumerate(candidates, start=1):
-                try:
-                    if ranges == "*":
-                        in_range = True
-                    else:
-                        in_range = is_symbol_in_range(candidate.symbol_number, ranges)
-
-                    if not in_range:
-                        continue
-
-                    candidates_in_range.append(candidate.symbol_number)
-
-                    # No need to check program since we already filtered by it
-                    if StudentExamEnrollment.objects.filter(
-                        candidate=candidate,
-                        session=session,
-                    ).exists():
-                        skipped_count += 1
-                        continue
-
-                    # Create enrollment in its own transaction
-                    try:
-                        with transaction.atomic():
-                            enrollment = StudentExamEnrollment.objects.create(
-                                candidate=candidate,
-                                session=session,
-                                status="inactive",
-                                individual_duration=session.base_duration,
-                            )
-                    except IntegrityError as e:
-                        error_count += 1
-                        error_msg = f"{candidate.symbol_number}: Failed to create enrollment - {e!s}"
-                        errors.append(error_msg)
-                        logger.error(error_msg)
-                        continue
-
-                    # Try to assign a seat
-                    seat_assigned = assign_seat_to_enrollment(
-                        enrollment, session, halls
-                    )
-
-                    if not seat_assigned:
-                        # Clean up the enrollment if no seat could be assigned
-                        try:
-                            with transaction.atomic():
-                                enrollment.delete()
-                        except Exception as delete_error:
-                            logger.warning(
-                                f"Could not delete enrollment for {candidate.symbol_number}: {delete_error}",
-                            )
-                        unassigned_candidates.append(candidate.symbol_number)
-                        continue
-
-                    enrolled_count += 1
-
-                except Exception as e:
-                    error_count += 1
-                    error_msg = f"{candidate.symbol_number}: {e!s}"
-                    errors.append(error_msg)
-                    logger.error(error_msg)
-
-                if idx % BATCH_LOG_INTERVAL == 0 or idx == total_candidates:
-                    progress = 30 + int(60 * (idx / total_candidates))
-                    task.message = (
-                        f"Processed {idx}/{total_candidates}: "
-                        f"{enrolled_count} enrolled, {skipped_count} skipped, "
-                        f"{not_in_program_count} not in program"
-                    )
-                    task.progress = min(90, progress)
-                    task.save()
+            task.message = "Selecting candidates"
+            task.progress = 20
+            task.save()
+
+            total_candidates = candidates.count()
+            in_range = list(
+                candidates.filter(symbol_range_q(ranges)).values_list(
+                    "id",
+                    "symbol_number",
+                ),
+            )
+            candidates_in_range = [symbol for _, symbol in in_range]
+
+            task.message = f"Enrolling {len(in_range)} candidates in range"
+            task.progress = 50
+            task.save()
+
+            with transaction.atomic():
+                # Locking the session serializes concurrent runs for it
+                ExamSession.objects.select_for_update().get(id=session_id)
+                already_enrolled = set(
+                    StudentExamEnrollment.objects.filter(session=session).values_list(
+                        "candidate_id",
+                        flat=True,
+                    ),
+                )
+                to_enroll = [
+                    (candidate_id, symbol_number)
+                    for candidate_id, symbol_number in in_range
+                    if candidate_id not in already_enrolled
+                ]
+                enrolled, unassigned_candidates = bulk_enroll(
+                    session,
+                    to_enroll,
+                    Hall.objects.all(),
+                    seat_strategy,
+                )
+            skipped_count = len(in_range) - len(to_enroll)
+            enrolled_count = len(enrolled)
 
             result = {
                 "success": True,
@@ -269,9 +227,6 @@ def enroll_students_by_symbol_range(self, session_id, hall_assignment_id, range_
                 "range_processed": range_string,
                 "enrolled_count": enrolled_count,
                 "skipped_count": skipped_count,
-                "not_in_program_count": not_in_program_count,
-                "error_count": error_count,
-                "errors": errors,
                 "total_candidates_checked": total_candidates,
                 "candidates_in_range": candidates_in_range,
                 "unassigned_candidates": unassigned_candidates,
@@ -280,8 +235,8 @@ def enroll_students_by_symbol_range(self, session_id, hall_assignment_id, range_
 
             task.message = (
                 f"Complete: {enrolled_count} enrolled, "
-                f"{skipped_count} skipped, {error_count} errors, "
-                f"{not_in_program_count} not in program"
+                f"{skipped_count} skipped, "
+                f"{len(unassigned_candidates)} without a seat"
             )
             task.status = CeleryTask.get_status_value("SUCCESS")
             task.result = str(result)
@@ -307,4 +262,83 @@ def enroll_students_by_symbol_range(self, session_id, hall_assignment_id, range_
                 "session_id": session_id,
                 "range_processed": range_string,
                 "error": error_msg,
-            }
\ No newline at end of file
+            }
+
+
+def _warm_up_chunk(session_id, last_id, question_ids, grouped):
+    """
+    Randomize and publish papers for the next WARMUP_CHUNK_SIZE enrollments
+    after `last_id`. Returns (chunk, randomized count).
+    """
+    with transaction.atomic():
+        # Row locks stop us overwriting an order saved by a concurrent login
+        chunk = list(
+            StudentExamEnrollment.objects.select_for_update()
+            .filter(session_id=session_id, id__gt=last_id)
+            .only("id", "question_order", "answer_order")
+            .order_by("id")[:WARMUP_CHUNK_SIZE],
+        )
+        pending = [enrollment for enrollment in chunk if not is_randomized(enrollment)]
+        for enrollment in pending:
+            randomize_enrollment(enrollment, question_ids, grouped)
+        StudentExamEnrollment.objects.bulk_update(
+            pending,
+            ["question_order", "answer_order"],
+        )
+
+    if pending:
+        # Cached login lookups still hold the unrandomized enrollments
+        invalidate_user_enrollments(
+            StudentExamEnrollment.objects.filter(
+                id__in=[enrollment.id for enrollment in pending],
+            ).values_list("candidate__user_id", flat=True),
+        )
+    cache_papers(chunk)
+    return chunk, len(pending)
+
+
+@shared_task(bind=True)
+def warm_up_exam_session(self, session_id):
+    """
+    Prepare a scheduled session before base_start: compile the question bank,
+    randomize every enrollment that has no paper yet and publish all papers
+    to Redis, so candidate logins and first page loads are cache reads.
+    """
+    with track_task(self.request.id, "warm_up_exam_session") as task:
+        session = ExamSession.objects.get(id=session_id)
+
+        task.message = "Compiling question bank"
+        task.progress = 5
+        task.save()
+        build_session_bank(session.id)
+
+        question_ids, grouped = load_session_layout(session.id)
+        total = session.enrollments.count()
+        processed = randomized = 0
+        last_id = 0
+
+        while True:
+            chunk, count = _warm_up_chunk(session.id, last_id, question_ids, grouped)
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+            processed += len(chunk)
+            randomized += count
+
+            task.message = (
+                f"Prepared {processed}/{total} papers, {randomized} randomized"
+            )
+            task.progress = min(95, 10 + int(85 * processed / max(total, 1)))
+            task.save()
+
+        result = {
+            "session_id": session_id,
+            "questions": len(question_ids),
+            "papers": processed,
+            "randomized": randomized,
+        }
+        task.message = (
+            f"Complete: {processed} papers ready, {randomized} newly randomized"
+        )
+        task.result = str(result)
+        return result
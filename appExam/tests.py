@@ -1,3 +1,1048 @@
-from django.test import TestCase
+import io
+import json
+from datetime import timedelta
+from types import SimpleNamespace
 
-# Create your tests here.
+import pandas as pd
+import pytest
+from django.contrib import admin
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError
+from django.db import connection
+from django.db import transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.urls import reverse
+from django.utils import timezone
+from redis.exceptions import RedisError
+from rest_framework import status
+
+from appAuthentication.utils.closest_enrollment import get_closest_enrollment
+from appCore.models import CeleryTask
+from appCore.tasks import submit_expired_students
+from appExam.admin import QuestionAdmin
+from appExam.models import Answer
+from appExam.models import Hall
+from appExam.models import Question
+from appExam.models import SeatAssignment
+from appExam.models import StudentAnswer
+from appExam.models import StudentExamEnrollment
+from appExam.tasks import enroll_students_by_symbol_range
+from appExam.tasks import warm_up_exam_session
+from appExam.utils import answer_buffer
+from appExam.utils import answered_index
+from appExam.utils import paper as papers
+from appExam.utils import question_bank
+from appExam.utils import question_import
+from appExam.utils import question_staging
+from appExam.utils.active_enrollment import get_candidate_active_enrollment
+from appExam.utils.answer_batch import save_answer_batch
+from appExam.utils.enrollment_state import get_enrollment_state
+from appExam.utils.old_questionParser import parse_questions_from_csv as old_parse_csv
+from appExam.utils.question_import import import_questions
+from appExam.utils.question_text import question_text_hash
+from appExam.utils.questionParser import iter_questions
+from appExam.utils.questionParser import parse_questions_from_csv
+from appExam.utils.questionParser import question_count
+from appExam.utils.seat_allocator import FILL_HALL_FIRST
+from appExam.utils.seat_allocator import INTERLEAVE
+from appExam.utils.seat_allocator import SEQUENTIAL
+from appExam.utils.seat_allocator import SeatAllocator
+
+
+def test_session_bank_is_served_from_redis(
+    exam_session,
+    django_assert_num_queries,
+):
+    bank = question_bank.get_session_bank(exam_session.id)
+    assert bank.questions == dict(
+        Question.objects.filter(session=exam_session).values_list("id", "text"),
+    )
+    assert bank.answers == dict(
+        Answer.objects.filter(question__session=exam_session).values_list(
+            "id",
+            "text",
+        ),
+    )
+
+    question_bank._local_banks.clear()  # noqa: SLF001
+    with django_assert_num_queries(0):
+        cached = question_bank.get_session_bank(exam_session.id)
+    assert cached.questions == bank.questions
+    assert cached.answers == bank.answers
+
+
+def test_session_bank_recompiles_after_answer_change(
+    exam_session,
+    django_capture_on_commit_callbacks,
+):
+    bank = question_bank.get_session_bank(exam_session.id)
+    question = Question.objects.filter(session=exam_session).first()
+    with django_capture_on_commit_callbacks(execute=True):
+        answer = Answer.objects.create(question=question, text="Late answer")
+
+    rebuilt = question_bank.get_session_bank(exam_session.id)
+    assert rebuilt.version > bank.version
+    assert rebuilt.answers[answer.id] == "Late answer"
+
+
+def test_paper_follows_the_enrollment_order(enrollment):
+    paper = papers.get_paper(enrollment)
+    assert paper.pages == enrollment.question_order
+    for question_id in paper.pages:
+        answer_ids = enrollment.answer_order[str(question_id)]
+        assert [aid for _, aid in paper.options(question_id)] == answer_ids
+        assert paper.answer_id(question_id, "B") == answer_ids[1]
+        assert paper.letter_for(question_id, answer_ids[3]) == "d"
+    assert paper.question_for_page(0) is None
+    assert paper.question_for_page(paper.num_pages + 1) is None
+
+
+def test_paper_is_served_from_redis(enrollment, django_assert_num_queries):
+    papers.cache_paper(enrollment)
+    papers._local_papers.clear()  # noqa: SLF001
+    with django_assert_num_queries(0):
+        paper = papers.get_paper(enrollment)
+    assert paper.pages == enrollment.question_order
+
+
+def test_question_page_uses_the_paper(enrollment, api_client):
+    response = api_client.get("/api/exam/questions/", {"page": 2})
+    assert response.status_code == status.HTTP_200_OK, response.content
+    data = response.json()["data"]
+    question_id = enrollment.question_order[1]
+    assert data["id"] == question_id
+    assert data["question"] == Question.objects.get(pk=question_id).text
+    texts = dict(
+        Answer.objects.filter(question_id=question_id).values_list("id", "text"),
+    )
+    assert [answer["options"] for answer in data["answers"]] == [
+        texts[answer_id] for answer_id in enrollment.answer_order[str(question_id)]
+    ]
+    assert data["is_answered"] is False
+
+    response = api_client.get("/api/exam/questions/", {"page": 6})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def _answer_id(enrollment, page, index):
+    question_id = enrollment.question_order[page]
+    return question_id, enrollment.answer_order[str(question_id)][index]
+
+
+@pytest.mark.usefixtures("write_behind")
+def test_buffered_answers_are_read_before_flush(enrollment):
+    first, first_answer = _answer_id(enrollment, 0, 2)
+    answer_buffer.buffer_answers(enrollment.id, {first: first_answer})
+
+    assert not StudentAnswer.objects.exists()
+    assert answer_buffer.current_answer_ids(enrollment.id, [first]) == {
+        first: first_answer,
+    }
+
+
+@pytest.mark.usefixtures("write_behind")
+def test_flush_enrollment_upserts_and_deletes_cleared(
+    enrollment,
+    redis_client,
+    django_capture_on_commit_callbacks,
+):
+    first, first_answer = _answer_id(enrollment, 0, 2)
+    second, second_answer = _answer_id(enrollment, 1, 0)
+    answer_buffer.buffer_answers(
+        enrollment.id,
+        {first: first_answer, second: second_answer},
+    )
+    with django_capture_on_commit_callbacks(execute=True):
+        assert answer_buffer.flush_dirty_enrollments() == 2  # noqa: PLR2004
+    assert dict(
+        StudentAnswer.objects.values_list("question_id", "selected_answer_id"),
+    ) == {first: first_answer, second: second_answer}
+
+    _, new_answer = _answer_id(enrollment, 0, 3)
+    answer_buffer.buffer_answers(enrollment.id, {first: new_answer, second: None})
+    assert answer_buffer.current_answer_ids(enrollment.id, [first, second]) == {
+        first: new_answer,
+        second: None,
+    }
+    with django_capture_on_commit_callbacks(execute=True):
+        assert answer_buffer.flush_enrollment(enrollment.id) == 2  # noqa: PLR2004
+    # A buffered clear deletes the row, like the synchronous path
+    assert dict(
+        StudentAnswer.objects.values_list("question_id", "selected_answer_id"),
+    ) == {first: new_answer}
+    assert not redis_client.exists(
+        f"exam_answers_{enrollment.id}",
+        f"exam_answers_flushing_{enrollment.id}",
+    )
+    assert answer_buffer.flush_enrollment(enrollment.id) == 0
+
+
+@pytest.mark.usefixtures("write_behind")
+def test_flush_retries_a_failed_flush_first(
+    enrollment,
+    redis_client,
+    django_capture_on_commit_callbacks,
+):
+    first, first_answer = _answer_id(enrollment, 0, 1)
+    _, second_answer = _answer_id(enrollment, 0, 2)
+    answer_buffer.buffer_answers(enrollment.id, {first: first_answer})
+    # A flush that renamed the buffer aside but never committed
+    redis_client.rename(
+        f"exam_answers_{enrollment.id}",
+        f"exam_answers_flushing_{enrollment.id}",
+    )
+    answer_buffer.buffer_answers(enrollment.id, {first: second_answer})
+    assert answer_buffer.current_answer_ids(enrollment.id, [first]) == {
+        first: second_answer,
+    }
+
+    with django_capture_on_commit_callbacks(execute=True):
+        answer_buffer.flush_enrollment(enrollment.id)
+    assert StudentAnswer.objects.get().selected_answer_id == first_answer
+    with django_capture_on_commit_callbacks(execute=True):
+        answer_buffer.flush_dirty_enrollments()
+    assert StudentAnswer.objects.get().selected_answer_id == second_answer
+
+
+@pytest.mark.usefixtures("write_behind")
+def test_submit_flushes_buffered_answers(
+    enrollment,
+    django_capture_on_commit_callbacks,
+):
+    first, first_answer = _answer_id(enrollment, 0, 2)
+    answer_buffer.buffer_answers(enrollment.id, {first: first_answer})
+    with django_capture_on_commit_callbacks(execute=True):
+        enrollment.submit_exam()
+    assert StudentAnswer.objects.get().selected_answer_id == first_answer
+
+
+def test_answer_batch_keeps_the_latest_entry_per_question(enrollment, answer_mode):
+    first, second, third = enrollment.question_order[:3]
+    entries = [
+        {"question_id": first, "selected_answer": "a", "client_seq": 1},
+        {"question_id": second, "selected_answer": "z", "client_seq": 2},
+        {"question_id": 0, "selected_answer": "a", "client_seq": 3},
+        {"question_id": first, "selected_answer": "b", "client_seq": 5},
+        {"question_id": third, "selected_answer": "c", "client_seq": 4},
+        {"question_id": third, "selected_answer": "d", "client_seq": 3},
+        {"question_id": second, "selected_answer": None},
+    ]
+
+    result = save_answer_batch(
+        papers.get_paper(enrollment),
+        enrollment.session_id,
+        entries,
+    )
+
+    assert [item["status"] for item in result["data"]["results"]] == [
+        status.HTTP_409_CONFLICT,
+        status.HTTP_400_BAD_REQUEST,
+        status.HTTP_404_NOT_FOUND,
+        status.HTTP_200_OK,
+        status.HTTP_200_OK,
+        status.HTTP_409_CONFLICT,
+        status.HTTP_200_OK,
+    ]
+    assert result["data"]["saved_count"] == 3  # noqa: PLR2004
+    assert answer_buffer.current_answer_ids(
+        enrollment.id,
+        [first, second, third],
+    ) == {
+        first: enrollment.answer_order[str(first)][1],
+        third: enrollment.answer_order[str(third)][2],
+        **({second: None} if answer_mode else {}),
+    }
+    assert StudentAnswer.objects.count() == (0 if answer_mode else 2)
+
+
+def test_answer_batch_ties_go_to_the_later_entry(enrollment):
+    first = enrollment.question_order[0]
+    result = save_answer_batch(
+        papers.get_paper(enrollment),
+        enrollment.session_id,
+        [
+            {"question_id": first, "selected_answer": "a", "client_seq": 1},
+            {"question_id": first, "selected_answer": "c", "client_seq": 1},
+        ],
+    )
+    assert [item["status"] for item in result["data"]["results"]] == [
+        status.HTTP_409_CONFLICT,
+        status.HTTP_200_OK,
+    ]
+    assert StudentAnswer.objects.get().selected_answer_id == (
+        enrollment.answer_order[str(first)][2]
+    )
+
+
+def test_answer_batch_endpoint(enrollment, api_client):
+    first = enrollment.question_order[0]
+    response = api_client.post(
+        "/api/exam/answer/submit/batch/",
+        {"answers": [{"question_id": first, "selected_answer": "b"}]},
+        format="json",
+    )
+    assert response.status_code == status.HTTP_200_OK, response.content
+    assert response.json()["data"]["saved_count"] == 1
+
+    response = api_client.post(
+        "/api/exam/answer/submit/batch/",
+        {"answers": []},
+        format="json",
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_active_enrollment_is_cached_as_a_json_snapshot(
+    enrollment,
+    redis_client,
+    django_assert_num_queries,
+):
+    user = enrollment.candidate.user
+    _, resolved = get_candidate_active_enrollment(user)
+
+    with django_assert_num_queries(0):
+        candidate, cached = get_candidate_active_enrollment(user)
+    assert candidate.user.email == user.email
+    assert cached.pk == resolved.pk
+    assert cached.session_started_at == resolved.session_started_at
+    assert cached.session.base_start == resolved.session.base_start
+    assert cached.session.exam.program.name == enrollment.session.exam.program.name
+
+    raw = redis_client.get(f"exam_enrollment_active_{user.id}")
+    assert json.loads(raw)["enrollment"]["fields"]["id"] == enrollment.pk
+
+
+def test_unloadable_snapshot_counts_as_a_miss(enrollment, redis_client):
+    user = enrollment.candidate.user
+    get_candidate_active_enrollment(user)
+    key = f"exam_enrollment_active_{user.id}"
+    snapshot = json.loads(redis_client.get(key))
+    # Written by an older version of the model
+    snapshot["enrollment"]["fields"].pop("status")
+    redis_client.set(key, json.dumps(snapshot))
+
+    _, resolved = get_candidate_active_enrollment(user)
+    assert resolved.pk == enrollment.pk
+    assert resolved.status == "active"
+
+
+def test_enrollment_resolution_follows_transitions(
+    enrollment,
+    django_capture_on_commit_callbacks,
+):
+    candidate = enrollment.candidate
+    assert get_closest_enrollment(candidate).pk == enrollment.pk
+    get_candidate_active_enrollment(candidate.user)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        enrollment.submit_exam()
+    _, resolved = get_candidate_active_enrollment(candidate.user)
+    assert resolved.status == "submitted"
+
+    session = enrollment.session
+    session.refresh_from_db()
+    with django_capture_on_commit_callbacks(execute=True):
+        session.pause_session()
+    assert get_candidate_active_enrollment(candidate.user) == (candidate, None)
+    assert get_closest_enrollment(candidate).session.status == "paused"
+
+
+def test_enrollment_state_is_served_from_redis(
+    enrollment,
+    django_assert_num_queries,
+):
+    state = get_enrollment_state(enrollment.id, enrollment.session_id)
+    assert state["status"] == "active"
+    assert state["session_status"] == "ongoing"
+    assert state["deadline"]
+
+    with django_assert_num_queries(0):
+        cached = get_enrollment_state(enrollment.id, enrollment.session_id)
+    assert cached["version"] == state["version"]
+    assert cached["deadline"] == state["deadline"]
+
+
+def test_enrollment_state_version_only_moves_forward(
+    enrollment,
+    redis_client,
+    django_capture_on_commit_callbacks,
+):
+    session = enrollment.session
+    state = get_enrollment_state(enrollment.id, session.id)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        enrollment.pause()
+    paused = get_enrollment_state(enrollment.id, session.id)
+    assert paused["status"] == "paused"
+    assert paused["deadline"] is None
+    assert paused["version"] > state["version"]
+
+    session.refresh_from_db()
+    with django_capture_on_commit_callbacks(execute=True):
+        session.end_session()
+    ended = get_enrollment_state(enrollment.id, session.id)
+    assert ended["session_status"] == "completed"
+    assert ended["version"] > paused["version"]
+
+    # An evicted record is rebuilt with newer versions, never older ones
+    redis_client.delete(
+        f"exam_state_enrollment_{enrollment.id}",
+        f"exam_state_session_{session.id}",
+    )
+    rebuilt = get_enrollment_state(enrollment.id, session.id)
+    assert rebuilt["version"] > ended["version"]
+
+
+@pytest.mark.usefixtures("answer_mode")
+def test_answered_index_follows_submissions(
+    enrollment,
+    api_client,
+    redis_client,
+    django_assert_num_queries,
+    django_capture_on_commit_callbacks,
+):
+    first, second, third = enrollment.question_order[:3]
+    with django_capture_on_commit_callbacks(execute=True):
+        for question_id, letter in [(first, "b"), (second, "c"), (second, None)]:
+            api_client.post(
+                "/api/exam/answer/submit/",
+                {"question_id": question_id, "selected_answer": letter},
+                format="json",
+            )
+        api_client.post(
+            "/api/exam/answer/submit/batch/",
+            {"answers": [{"question_id": third, "selected_answer": "a"}]},
+            format="json",
+        )
+    expected = {
+        first: enrollment.answer_order[str(first)][1],
+        third: enrollment.answer_order[str(third)][0],
+    }
+
+    assert answered_index.get_answered(enrollment.id) == expected
+    with django_assert_num_queries(0):
+        assert answered_index.get_answered(enrollment.id) == expected
+
+    redis_client.delete(f"exam_answered_{enrollment.id}")
+    assert answered_index.get_answered(enrollment.id) == expected
+
+
+def test_answered_index_follows_edits_outside_the_exam(
+    enrollment,
+    django_capture_on_commit_callbacks,
+):
+    first = enrollment.question_order[0]
+    answer_ids = enrollment.answer_order[str(first)]
+    assert answered_index.get_answered(enrollment.id) == {}
+
+    with django_capture_on_commit_callbacks(execute=True):
+        answer = StudentAnswer.objects.create(
+            enrollment=enrollment,
+            question_id=first,
+            selected_answer_id=answer_ids[0],
+        )
+    assert answered_index.get_answered(enrollment.id) == {first: answer_ids[0]}
+
+    with django_capture_on_commit_callbacks(execute=True):
+        answer.selected_answer_id = answer_ids[2]
+        answer.save()
+    assert answered_index.answered_answer_id(enrollment.id, first) == answer_ids[2]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        answer.delete()
+    assert answered_index.get_answered(enrollment.id) == {}
+
+
+def test_answered_index_is_not_indexed_before_commit(enrollment):
+    first = enrollment.question_order[0]
+    assert answered_index.get_answered(enrollment.id) == {}
+    answer_buffer.store_answers(
+        enrollment.id,
+        {first: enrollment.answer_order[str(first)][0]},
+    )
+    # The answer may still roll back, so the index has not seen it yet
+    assert answered_index.answered_answer_id(enrollment.id, first) is None
+
+
+def test_answered_index_keeps_the_latest_of_racing_saves(
+    enrollment,
+    answer_mode,
+    django_capture_on_commit_callbacks,
+):
+    first = enrollment.question_order[0]
+    answer_ids = enrollment.answer_order[str(first)]
+    assert answered_index.get_answered(enrollment.id) == {}
+
+    with django_capture_on_commit_callbacks() as older:
+        answer_buffer.store_answers(enrollment.id, {first: answer_ids[0]})
+    with django_capture_on_commit_callbacks() as newer:
+        answer_buffer.store_answers(enrollment.id, {first: answer_ids[1]})
+    # The later save's index update lands before the earlier one's
+    for callback in [*newer, *older]:
+        callback()
+
+    assert answered_index.get_answered(enrollment.id) == {first: answer_ids[1]}
+
+
+@pytest.mark.usefixtures("write_behind")
+def test_answered_index_build_yields_to_concurrent_writes(
+    enrollment,
+    redis_client,
+    monkeypatch,
+):
+    first = enrollment.question_order[0]
+    answer_id = enrollment.answer_order[str(first)][0]
+    read_answers = answer_buffer.current_answer_ids
+
+    def read_then_race(enrollment_id):
+        answers = read_answers(enrollment_id)
+        # An answer is saved while the build is between its read and its write
+        answer_buffer.buffer_answers(enrollment_id, {first: answer_id})
+        return answers
+
+    monkeypatch.setattr(answer_buffer, "current_answer_ids", read_then_race)
+    assert answered_index.get_answered(enrollment.id) == {}
+    # The stale build was dropped instead of overwriting the newer answer
+    assert redis_client.hgetall(f"exam_answered_{enrollment.id}") == {
+        str(first).encode(): str(answer_id).encode(),
+    }
+
+
+def test_warm_up_randomizes_and_publishes_every_paper(
+    exam_session,
+    enrollments,
+    redis_client,
+):
+    result = warm_up_exam_session.apply(args=(exam_session.id,), task_id="warm-up")
+    assert result.get()["randomized"] == len(enrollments)
+
+    question_ids = sorted(exam_session.question_set.values_list("id", flat=True))
+    orders = {}
+    for enrollment in enrollments:
+        enrollment.refresh_from_db()
+        assert sorted(enrollment.question_order) == question_ids
+        paper = json.loads(redis_client.get(f"exam_paper_{enrollment.id}"))
+        assert paper["pages"] == enrollment.question_order
+        orders[enrollment.id] = enrollment.question_order
+    task = CeleryTask.objects.get(task_id="warm-up")
+    assert task.status == "SUCCESS"
+
+    # A second run publishes the same papers without re-randomizing
+    result = warm_up_exam_session.apply(args=(exam_session.id,))
+    assert result.get()["randomized"] == 0
+    assert {
+        enrollment.id: enrollment.question_order
+        for enrollment in StudentExamEnrollment.objects.filter(session=exam_session)
+    } == orders
+
+
+def test_expired_matches_should_submit(exam_session, make_candidate):
+    now = timezone.now()
+    duration = exam_session.base_duration
+    started = now - duration - timedelta(minutes=1)
+    states = {
+        "expired": {"session_started_at": started},
+        "pause credit": {
+            "session_started_at": started,
+            "paused_duration": timedelta(minutes=2),
+        },
+        "paused in time": {
+            "status": "paused",
+            "session_started_at": now - duration - timedelta(minutes=5),
+            "paused_at": now - timedelta(minutes=10),
+        },
+        "individually paused too long": {
+            "status": "paused",
+            "session_started_at": now - duration - timedelta(minutes=5),
+            "individual_paused_at": now - timedelta(minutes=1),
+        },
+        "submitted": {"status": "submitted", "session_started_at": started},
+        "running": {"session_started_at": now},
+    }
+    ids = {}
+    for number, (name, values) in enumerate(states.items()):
+        ids[name] = StudentExamEnrollment.objects.create(
+            candidate=make_candidate(f"x{number}"),
+            session=exam_session,
+            individual_duration=duration,
+            status="active",
+        ).id
+        StudentExamEnrollment.objects.filter(pk=ids[name]).update(**values)
+
+    expired = set(
+        StudentExamEnrollment.objects.filter(id__in=ids.values())
+        .expired(now)
+        .values_list("id", flat=True),
+    )
+    assert expired == {ids["expired"], ids["individually paused too long"]}
+    for enrollment in StudentExamEnrollment.objects.filter(id__in=ids.values()):
+        assert enrollment.should_submit == (enrollment.id in expired)
+
+
+def test_submit_expired_students_in_one_update(
+    enrollment,
+    redis_client,
+    expire,
+    django_capture_on_commit_callbacks,
+):
+    expire(enrollment, present=True)
+    with django_capture_on_commit_callbacks(execute=True):
+        assert submit_expired_students() == (
+            "Auto-submitted 1 students whose time expired"
+        )
+
+    enrollment.refresh_from_db()
+    assert enrollment.status == "submitted"
+    assert not enrollment.present
+    assert redis_client.zscore("exam_deadlines", enrollment.id) is None
+    state = get_enrollment_state(enrollment.id, enrollment.session_id)
+    assert state["status"] == "submitted"
+    assert set(
+        StudentExamEnrollment.objects.exclude(pk=enrollment.pk).values_list(
+            "status",
+            flat=True,
+        ),
+    ) == {"active"}
+
+
+@pytest.mark.usefixtures("write_behind")
+def test_bulk_submit_flushes_buffered_answers(
+    enrollment,
+    django_capture_on_commit_callbacks,
+):
+    first, answer_id = _answer_id(enrollment, 0, 1)
+    answer_buffer.buffer_answers(enrollment.id, {first: answer_id})
+    with django_capture_on_commit_callbacks(execute=True):
+        submitted = StudentExamEnrollment.objects.filter(pk=enrollment.pk).submit()
+    assert submitted == [enrollment.pk]
+    assert StudentAnswer.objects.get().selected_answer_id == answer_id
+    assert StudentExamEnrollment.objects.filter(pk=enrollment.pk).submit() == []
+
+
+def test_bulk_pause_and_resume_move_every_clock_together(
+    enrollment,
+    enrollments,
+    django_capture_on_commit_callbacks,
+):
+    session_enrollments = StudentExamEnrollment.objects.filter(
+        session=enrollment.session,
+    )
+    paused_at = timezone.now() - timedelta(minutes=5)
+    with django_capture_on_commit_callbacks(execute=True):
+        paused = session_enrollments.pause(paused_at)
+    assert sorted(paused) == sorted(e.id for e in enrollments)
+    assert set(session_enrollments.values_list("status", "paused_at")) == {
+        ("paused", paused_at),
+    }
+    assert session_enrollments.pause() == []
+
+    resumed_at = paused_at + timedelta(minutes=5)
+    with django_capture_on_commit_callbacks(execute=True):
+        resumed = session_enrollments.resume(resumed_at)
+    assert sorted(resumed) == sorted(paused)
+    assert set(
+        session_enrollments.values_list("status", "paused_at", "paused_duration"),
+    ) == {("active", None, timedelta(minutes=5))}
+
+
+def test_bulk_grant_extra_time(enrollment, django_capture_on_commit_callbacks):
+    StudentExamEnrollment.objects.filter(pk=enrollment.pk).update(
+        individual_paused_duration=timedelta(minutes=3),
+    )
+    session_enrollments = StudentExamEnrollment.objects.filter(
+        session=enrollment.session,
+    )
+    with django_capture_on_commit_callbacks(execute=True):
+        assert session_enrollments.grant_extra_time() == [enrollment.pk]
+
+    before = enrollment.individual_duration
+    enrollment.refresh_from_db()
+    assert enrollment.individual_duration == before + timedelta(minutes=3)
+    assert enrollment.individual_paused_duration == timedelta()
+
+
+def test_enroll_symbol_range_in_bulk(
+    exam_session,
+    enrollments,
+    make_candidate,
+    django_assert_max_num_queries,
+    django_capture_on_commit_callbacks,
+):
+    for number in range(10, 30):
+        make_candidate(f"b100{number}")
+    small = Hall.objects.create(name="Small", capacity=5)
+    Hall.objects.create(name="Large", capacity=10)
+    SeatAssignment.objects.create(
+        enrollment=enrollments[0],
+        session=exam_session,
+        hall=small,
+        seat_number=2,
+    )
+
+    with (
+        django_capture_on_commit_callbacks(execute=True),
+        django_assert_max_num_queries(40),
+    ):
+        result = enroll_students_by_symbol_range.apply(
+            args=(exam_session.id, None, "b10010|b10025"),
+        ).get()
+    assert result["success"], result
+    # 16 candidates in range for the 14 free seats
+    assert result["enrolled_count"] == 14  # noqa: PLR2004
+    assert result["unassigned_candidates"] == ["b10024", "b10025"]
+
+    seats = list(
+        SeatAssignment.objects.filter(session=exam_session).values_list(
+            "hall__name",
+            "seat_number",
+            "session_base_start",
+        ),
+    )
+    assert len(set(seats)) == len(seats) == 15  # noqa: PLR2004
+    assert {base_start for *_, base_start in seats} == {exam_session.base_start}
+    enrolled = StudentExamEnrollment.objects.filter(session=exam_session)
+    assert enrolled.count() == len(enrollments) + result["enrolled_count"]
+
+    result = enroll_students_by_symbol_range.apply(
+        args=(exam_session.id, None, "b10010|b10025"),
+    ).get()
+    assert result["enrolled_count"] == 0
+    assert result["skipped_count"] == 14  # noqa: PLR2004
+
+
+def _seats(placed):
+    return [(hall.id, seat_number) for hall, seat_number in placed]
+
+
+@pytest.fixture
+def seat_halls():
+    return [SimpleNamespace(id=1, capacity=6), SimpleNamespace(id=2, capacity=4)]
+
+
+@pytest.mark.parametrize(
+    ("strategy", "expected"),
+    [
+        (SEQUENTIAL, [(1, 1), (1, 3), (1, 4)]),
+        (FILL_HALL_FIRST, [(2, 3), (2, 4), (1, 1)]),
+    ],
+)
+def test_seat_allocator_strategies(seat_halls, strategy, expected):
+    session = SimpleNamespace(id=10)
+    # Seat 2 of hall 1 and seats 1-2 of hall 2 belong to other sessions
+    allocator = SeatAllocator(session, seat_halls, {1: {2: 99}, 2: {1: 98, 2: 98}})
+    assert allocator.free_count == 7  # noqa: PLR2004
+    assert _seats(allocator.allocate(3, strategy)) == expected
+    assert allocator.free_count == 4  # noqa: PLR2004
+
+
+def test_seat_allocator_interleaves_sessions(seat_halls):
+    allocator = SeatAllocator(SimpleNamespace(id=10), seat_halls, {})
+    placed = _seats(allocator.allocate(10, INTERLEAVE))
+    # Gaps first so no two neighbours share a session, then the rest
+    assert placed[:5] == [(1, 1), (1, 3), (1, 5), (2, 1), (2, 3)]
+    assert sorted(placed) == [
+        (hall.id, seat_number)
+        for hall in seat_halls
+        for seat_number in range(1, hall.capacity + 1)
+    ]
+
+    # A second session in the slot fills the gaps between the first one's seats
+    allocator = SeatAllocator(
+        SimpleNamespace(id=11),
+        seat_halls[:1],
+        {1: {1: 10, 3: 10, 5: 10}},
+    )
+    assert _seats(allocator.allocate(3, INTERLEAVE)) == [(1, 2), (1, 4), (1, 6)]
+
+
+def test_seat_allocator_stops_when_full(seat_halls):
+    allocator = SeatAllocator(SimpleNamespace(id=10), seat_halls, {})
+    assert len(allocator.allocate(20)) == 10  # noqa: PLR2004
+    assert allocator.allocate(1) == []
+    with pytest.raises(ValueError, match="Unknown seat allocation strategy"):
+        allocator.allocate(1, "random")
+
+
+def _answers(*texts):
+    return [{"text": text, "is_correct": not index} for index, text in enumerate(texts)]
+
+
+def test_import_questions_reports_every_row(
+    exam_session,
+    monkeypatch,
+    django_assert_max_num_queries,
+):
+    invalidated = []
+    monkeypatch.setattr(
+        question_import,
+        "invalidate_session_bank_on_commit",
+        invalidated.append,
+    )
+    rows = [
+        (1, {"question": "Question 0", "answers": _answers("x")}),
+        (2, {"question": " New ", "answers": _answers("a", "b", "")}),
+        (3, {"question": "New", "answers": _answers("c")}),
+        (4, {"question": "", "answers": _answers("c")}),
+        (5, {"question": "No answers", "answers": _answers("")}),
+        (6, {"question": "Other", "answers": _answers("d", "e")}),
+    ]
+
+    with django_assert_max_num_queries(8):
+        report = import_questions(exam_session, rows)
+
+    assert [(entry["row"], entry["status"]) for entry in report] == [
+        (1, question_import.EXISTS),
+        (2, question_import.CREATED),
+        (3, question_import.DUPLICATE),
+        (4, question_import.INVALID),
+        (5, question_import.INVALID),
+        (6, question_import.CREATED),
+    ]
+    assert invalidated == [exam_session.id]
+    question = exam_session.question_set.get(text="New")
+    assert sorted(question.answers.values_list("text", "is_correct")) == [
+        ("a", True),
+        ("b", False),
+    ]
+    assert exam_session.question_set.count() == 7  # noqa: PLR2004
+
+
+def test_import_questions_retries_after_losing_a_race(exam_session, monkeypatch):
+    insert = question_import._insert  # noqa: SLF001
+    raced = []
+
+    def lose_the_race_once(session, pending):
+        if not raced:
+            # Another import adds the same text after the existence check
+            raced.append(Question.objects.create(text="Raced", session=session))
+            raise IntegrityError
+        return insert(session, pending)
+
+    monkeypatch.setattr(question_import, "_insert", lose_the_race_once)
+    rows = [
+        (1, {"question": "Raced", "answers": _answers("a")}),
+        (2, {"question": "Fresh", "answers": _answers("a")}),
+    ]
+
+    report = import_questions(exam_session, rows)
+
+    assert [entry["status"] for entry in report] == [
+        question_import.EXISTS,
+        question_import.CREATED,
+    ]
+    assert exam_session.question_set.filter(text="Raced").get() == raced[0]
+
+
+QUESTION_CSV_HEADER = b"QUESTION,ANSWER,OPTIONS_A,OPTIONS_B,OPTIONS_C,OPTIONS_D\n"
+
+
+def _iterrows_questions(content):
+    """The row-by-row parser parse_questions_from_csv() replaced."""
+    questions = []
+    for _, row in pd.read_csv(io.BytesIO(content)).iterrows():
+        text = str(row.get("QUESTION", "")).strip()
+        letter = str(row.get("ANSWER", "")).strip().lower()
+        answers = [
+            {
+                "text": option,
+                "option_letter": option_letter.upper(),
+                "is_correct": option_letter == letter,
+            }
+            for option_letter in "abcd"
+            if (option := str(row.get(f"OPTIONS_{option_letter.upper()}", "")).strip())
+        ]
+        if text and answers:
+            questions.append({"question": text, "answers": answers})
+    return questions
+
+
+def test_question_csv_parse_matches_the_row_parser():
+    content = QUESTION_CSV_HEADER + (
+        b" Q1 ,B,a1, b1 ,c1,d1\n"
+        b"Q2,d,a2,b2,c2,d2\n"
+        b"Q3,e,a3,b3,c3,d3\n"
+        b"Q4, A ,a4,b4,c4,d4\n"
+    )
+
+    parsed = parse_questions_from_csv(io.BytesIO(content))
+
+    assert [question for _, question in iter_questions(parsed)] == (
+        _iterrows_questions(content)
+    )
+    assert parsed["row"] == [1, 2, 3, 4]
+    assert parsed["answer"] == ["b", "d", "", "a"]
+
+
+def test_question_csv_parse_skips_unusable_rows():
+    content = QUESTION_CSV_HEADER + (
+        b" Q1 ,B,a1, b1 ,,d1\n"
+        b",a,x,y,z,w\n"
+        b"Q3,e,p,q,,\n"
+        b"Q4,a,,,,\n"
+    )
+
+    parsed = parse_questions_from_csv(io.BytesIO(content))
+
+    assert question_count(parsed) == 2  # noqa: PLR2004
+    assert parsed["row"] == [1, 3]
+    assert parsed["question"] == ["Q1", "Q3"]
+    # Empty cells stay empty instead of becoming "nan" options
+    assert next(iter_questions(parsed)) == (
+        1,
+        {
+            "question": "Q1",
+            "answers": [
+                {"text": "a1", "option_letter": "A", "is_correct": False},
+                {"text": "b1", "option_letter": "B", "is_correct": True},
+                {"text": "d1", "option_letter": "D", "is_correct": False},
+            ],
+        },
+    )
+    legacy = old_parse_csv(io.BytesIO(content))
+    assert [question["question"] for question in legacy] == ["Q1", "Q3"]
+
+
+def test_question_preview_is_staged_outside_the_session(
+    admin_client,
+    exam_session,
+    redis_client,
+):
+    content = QUESTION_CSV_HEADER + b"New,b,x,y,,\n"
+    response = admin_client.post(
+        reverse("admin:appExam_question_import_document", args=[exam_session.id]),
+        {"document": SimpleUploadedFile("questions.csv", content)},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.context["questions"][0]["question"] == "New"
+
+    staging_id = admin_client.session["question_staging_id"]
+    assert "parsed_questions" not in admin_client.session
+    assert question_staging.load_staged_questions(staging_id)["question"] == ["New"]
+    assert 0 < redis_client.ttl(f"question_import_{staging_id}") <= (
+        question_staging.STAGING_TTL
+    )
+
+    response = admin_client.post(
+        reverse("admin:appExam_question_parse"),
+        {"question_1": "New", "correct_1": "b", "option_1_a": "x", "option_1_b": "y"},
+    )
+    assert response.url == reverse("admin:appExam_question_changelist")
+    question = exam_session.question_set.get(text="New")
+    assert question.answers.get(is_correct=True).text == "y"
+    assert question_staging.load_staged_questions(staging_id) is None
+    assert "question_staging_id" not in admin_client.session
+
+
+def test_expired_question_preview_imports_nothing(admin_client, exam_session):
+    content = QUESTION_CSV_HEADER + b"New,b,x,y,,\n"
+    admin_client.post(
+        reverse("admin:appExam_question_import_document", args=[exam_session.id]),
+        {"document": SimpleUploadedFile("questions.csv", content)},
+    )
+    question_staging.discard_staged_questions(
+        admin_client.session["question_staging_id"],
+    )
+
+    response = admin_client.post(
+        reverse("admin:appExam_question_parse"),
+        {"question_1": "New", "correct_1": "b", "option_1_a": "x"},
+    )
+
+    assert response.url == reverse("admin:appExam_question_import")
+    assert not exam_session.question_set.filter(text="New").exists()
+
+
+def test_question_preview_reports_an_unavailable_staging_store(
+    admin_client,
+    exam_session,
+    monkeypatch,
+):
+    def unavailable(*args, **kwargs):
+        raise RedisError
+
+    monkeypatch.setattr(question_staging.redis_client, "set", unavailable)
+    upload_url = reverse(
+        "admin:appExam_question_import_document",
+        args=[exam_session.id],
+    )
+    response = admin_client.post(
+        upload_url,
+        {"document": SimpleUploadedFile("questions.csv", QUESTION_CSV_HEADER)},
+        follow=True,
+    )
+
+    assert response.redirect_chain == [(upload_url, status.HTTP_302_FOUND)]
+    assert [str(message) for message in response.context["messages"]] == [
+        "The questions could not be held for review. Please upload the file again.",
+    ]
+    assert "question_staging_id" not in admin_client.session
+
+
+def test_question_text_hash_ignores_whitespace(exam_session):
+    question = Question.objects.create(text="What  is\nX?", session=exam_session)
+    assert question.text_hash == question_text_hash("What is X?")
+
+    question.text = "Changed"
+    question.save(update_fields=["text"])
+    question.refresh_from_db()
+    assert question.text_hash == question_text_hash("Changed")
+
+    with pytest.raises(ValidationError):
+        Question(text=" Changed ", session=exam_session).full_clean()
+    with pytest.raises(IntegrityError), transaction.atomic():
+        Question.objects.create(text="Changed  ", session=exam_session)
+
+
+def test_question_admin_search_finds_the_text_by_hash(exam_session):
+    question = exam_session.question_set.get(text="Question 1")
+    model_admin = QuestionAdmin(Question, admin.site)
+
+    for term in [" Question   1 ", "Question 1", "stion 1"]:
+        results, _ = model_admin.get_search_results(
+            None,
+            Question.objects.all(),
+            term,
+        )
+        assert question in results
+
+
+BEFORE_TEXT_HASH = [("appExam", "0043_question_text_hash")]
+AFTER_TEXT_HASH = [("appExam", "0045_question_unique_session_text_hash")]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_text_hash_backfill_keeps_whitespace_twins_apart(exam_session):
+    executor = MigrationExecutor(connection)
+    executor.migrate(BEFORE_TEXT_HASH)
+    apps = executor.loader.project_state(BEFORE_TEXT_HASH).apps
+    HistoricalQuestion = apps.get_model("appExam", "Question")  # noqa: N806
+    spaced, single, other = (
+        HistoricalQuestion.objects.create(
+            session_id=exam_session.id,
+            text=text,
+            text_hash="",
+        ).pk
+        for text in ["Twin  text", "Twin text", "Other"]
+    )
+
+    executor = MigrationExecutor(connection)
+    executor.migrate(AFTER_TEXT_HASH)
+    executor = MigrationExecutor(connection)
+    executor.migrate(executor.loader.graph.leaf_nodes())
+
+    spaced, single, other = (
+        Question.objects.get(pk=pk) for pk in (spaced, single, other)
+    )
+    assert spaced.text_hash == question_text_hash("Twin text")
+    assert single.text_hash != spaced.text_hash
+    assert other.text_hash == question_text_hash("Other")
+
+    # save() keeps the per-row hash until the text changes
+    backfilled = single.text_hash
+    single.save()
+    single.full_clean()
+    assert Question.objects.get(pk=single.pk).text_hash == backfilled
+    single.text = "Edited"
+    single.save()
+    assert Question.objects.get(pk=single.pk).text_hash == question_text_hash("Edited")
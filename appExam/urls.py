@@ -6,6 +6,7 @@ from .views import get_paginated_questions_view
 from .views import get_question_list_view
 from .views import submit_active_exam
 from .views import submit_answer_view
+from .views import submit_answers_batch
 
 app_name = "exam"
 urlpatterns = [
@@ -13,6 +14,7 @@ urlpatterns = [
     path("questions/", get_paginated_questions_view, name="get_paginated_questions"),
     path("list/questions/", get_question_list_view, name="list_questions"),
     path("answer/submit/", submit_answer_view, name="submit_answer"),
+    path("answer/submit/batch/", submit_answers_batch, name="submit_answers_batch"),
     path("review/", get_exam_review, name="exam_review"),
     path("session/end/", submit_active_exam, name="end_exam"),
 ]
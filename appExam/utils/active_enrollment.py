@@ -2,9 +2,19 @@ from django.utils import timezone
 
 from appExam.models import Candidate
 from appExam.models import StudentExamEnrollment
+from appExam.utils.enrollment_cache import cached_resolution
 
 
 def get_candidate_active_enrollment(user, require_ongoing=True):  # noqa: FBT002
+    """Get candidate's active enrollment, served from the resolution cache"""
+    return cached_resolution(
+        "active" if require_ongoing else "current",
+        user.id,
+        lambda: _resolve_active_enrollment(user, require_ongoing),
+    )
+
+
+def _resolve_active_enrollment(user, require_ongoing):
     """Get candidate's active enrollment with optimized queries"""
     try:
         candidate = Candidate.objects.select_related("user").get(user=user)
@@ -0,0 +1,100 @@
+from appExam.utils.answer_buffer import store_answers
+from appExam.utils.question_bank import get_session_bank
+
+MAX_BATCH_SIZE = 500
+SUPERSEDED = "Superseded by a later entry for this question"
+
+
+def _item_result(entry, status, error=None, answer_id=None):
+    return {
+        "question_id": entry.get("question_id"),
+        "client_seq": entry.get("client_seq"),
+        "selected_answer": entry.get("selected_answer"),
+        "is_answered": answer_id is not None,
+        "status": status,
+        "error": error,
+    }
+
+
+def _resolve_entry(paper, bank, entry):
+    """Return (question_id, answer_id, error, status) for one batch entry."""
+    try:
+        question_id = int(entry.get("question_id"))
+    except (TypeError, ValueError):
+        return None, None, "question_id is required", 400
+
+    if question_id not in paper or question_id not in bank.questions:
+        return question_id, None, "Question not found", 404
+
+    letter = entry.get("selected_answer")
+    if letter is None:
+        return question_id, None, None, 200  # clear the answer
+
+    if not paper.options(question_id):
+        return question_id, None, "Answer order not found for this question", 400
+
+    answer_id = paper.answer_id(question_id, letter)
+    if answer_id is None or answer_id not in bank.answers:
+        return question_id, None, "Invalid answer selection", 400
+
+    return question_id, answer_id, None, 200
+
+
+def save_answer_batch(paper, session_id, entries):
+    """
+    Validate `entries` ([{question_id, selected_answer, client_seq}, ...])
+    against the candidate's `paper` and store the valid ones in one write.
+
+    When a question appears more than once the entry with the highest
+    `client_seq` wins (list order breaks ties). Returns a response payload
+    with per-item results in request order.
+    """
+    if not isinstance(entries, list) or not entries:
+        return {"error": "answers must be a non-empty list", "status": 400}
+    if len(entries) > MAX_BATCH_SIZE:
+        return {
+            "error": f"At most {MAX_BATCH_SIZE} answers can be sent at once",
+            "status": 400,
+        }
+
+    if not paper:
+        return {"error": "Questions not yet randomized", "status": 400}
+    bank = get_session_bank(session_id)
+
+    results = [None] * len(entries)
+    latest = {}  # question_id -> (client_seq, index, answer_id)
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            results[index] = _item_result({}, 400, "Invalid entry")
+            continue
+
+        question_id, answer_id, error, status = _resolve_entry(paper, bank, entry)
+        if error:
+            results[index] = _item_result(entry, status, error)
+            continue
+
+        seq = entry.get("client_seq")
+        seq = seq if isinstance(seq, int) else -1
+        previous = latest.get(question_id)
+        if previous and previous[0] > seq:
+            results[index] = _item_result(entry, 409, SUPERSEDED)
+            continue
+        if previous:
+            results[previous[1]] = _item_result(entries[previous[1]], 409, SUPERSEDED)
+        latest[question_id] = (seq, index, answer_id)
+        results[index] = _item_result(entry, 200, answer_id=answer_id)
+
+    answers = {qid: answer_id for qid, (_, _, answer_id) in latest.items()}
+    if answers:
+        store_answers(paper.enrollment_id, answers)
+
+    return {
+        "data": {
+            "results": results,
+            "saved_count": len(answers),
+            "failed_count": len(entries) - len(answers),
+        },
+        "message": f"Saved {len(answers)} of {len(entries)} answers",
+        "error": None,
+        "status": 200,
+    }
@@ -0,0 +1,202 @@
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from redis.exceptions import RedisError
+from redis.exceptions import ResponseError
+
+from appCore.utils.redis_client import get_redis_client
+from appExam.models import StudentAnswer
+from appExam.utils.answered_index import queue_answers
+from appExam.utils.answered_index import reindex_answers_on_commit
+
+logger = logging.getLogger(__name__)
+redis_client = get_redis_client()
+
+DIRTY_SET_KEY = "exam_answers_dirty"
+BUFFER_TTL = 24 * 60 * 60  # seconds; a safety net, flushes run every few seconds
+FLUSH_LOCK_TIMEOUT = 30  # seconds
+FLUSH_LOCK_WAIT = 10  # seconds a forced flush waits for a running one
+CLEARED = b""  # stored value for a cleared answer
+
+
+def _buffer_key(enrollment_id):
+    return f"exam_answers_{enrollment_id}"
+
+
+def _flushing_key(enrollment_id):
+    return f"exam_answers_flushing_{enrollment_id}"
+
+
+def _lock_key(enrollment_id):
+    return f"exam_answers_lock_{enrollment_id}"
+
+
+def write_behind_enabled():
+    return settings.EXAM_ANSWER_WRITE_BEHIND
+
+
+def _decode(raw):
+    return int(raw) if raw and raw != CLEARED else None
+
+
+def buffer_answers(enrollment_id, answers):
+    """
+    Record {question_id: answer_id or None} for an enrollment in Redis.
+    The answers are persisted later by `flush_enrollment`; the answered
+    index is updated in the same MULTI, so racing saves cannot reorder it.
+    """
+    if not answers:
+        return
+    key = _buffer_key(enrollment_id)
+    pipe = redis_client.pipeline()
+    pipe.hset(
+        key,
+        mapping={
+            qid: CLEARED if aid is None else aid for qid, aid in answers.items()
+        },
+    )
+    pipe.expire(key, BUFFER_TTL)
+    pipe.sadd(DIRTY_SET_KEY, enrollment_id)
+    queue_answers(pipe, enrollment_id, answers)
+    pipe.execute()
+
+
+def upsert_answers(enrollment_id, answers):
+    """
+    Write {question_id: answer_id or None} straight to the database: one
+    upsert for selected answers and one delete for cleared ones, matching
+    what the single-answer endpoint does for a clear. Returns the number of
+    answers written.
+
+    Like bulk_create, the delete sends no signals, so the answered index is
+    left to the caller: a flush must not undo newer buffered answers there.
+    """
+    rows = [
+        StudentAnswer(
+            enrollment_id=enrollment_id,
+            question_id=qid,
+            selected_answer_id=aid,
+        )
+        for qid, aid in answers.items()
+        if aid is not None
+    ]
+    cleared = [qid for qid, aid in answers.items() if aid is None]
+    if rows:
+        StudentAnswer.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["enrollment", "question"],
+            update_fields=["selected_answer"],
+        )
+    if cleared:
+        cleared_rows = StudentAnswer.objects.filter(
+            enrollment_id=enrollment_id,
+            question_id__in=cleared,
+        )
+        cleared_rows._raw_delete(cleared_rows.db)  # noqa: SLF001
+    return len(answers)
+
+
+def store_answers(enrollment_id, answers):
+    """Buffer the answers in write-behind mode, otherwise upsert them now."""
+    if write_behind_enabled():
+        buffer_answers(enrollment_id, answers)
+    else:
+        upsert_answers(enrollment_id, answers)
+        reindex_answers_on_commit(enrollment_id, list(answers))
+
+
+def buffer_answer(enrollment_id, question_id, answer_id):
+    buffer_answers(enrollment_id, {question_id: answer_id})
+
+
+def get_buffered_answers(enrollment_id):
+    """Pending {question_id: answer_id or None}, newest writes winning."""
+    pipe = redis_client.pipeline()
+    pipe.hgetall(_flushing_key(enrollment_id))
+    pipe.hgetall(_buffer_key(enrollment_id))
+    flushing, pending = pipe.execute()
+    merged = {**flushing, **pending}
+    return {int(qid): _decode(aid) for qid, aid in merged.items()}
+
+
+def current_answer_ids(enrollment_id, question_ids=None):
+    """
+    {question_id: answer_id or None} from the database plus pending writes,
+    for `question_ids` or every question.
+    """
+    pending = {}
+    if write_behind_enabled():
+        # Pending writes are read first: a flush committing in between then
+        # shows up in the rows read next instead of vanishing from both
+        try:
+            pending = get_buffered_answers(enrollment_id)
+        except RedisError:
+            logger.warning("Redis unavailable reading answers for %s", enrollment_id)
+        if question_ids is not None:
+            wanted = set(question_ids)
+            pending = {q: a for q, a in pending.items() if q in wanted}
+
+    rows = StudentAnswer.objects.filter(enrollment_id=enrollment_id)
+    if question_ids is not None:
+        rows = rows.filter(question_id__in=question_ids)
+    answers = dict(rows.values_list("question_id", "selected_answer_id"))
+    answers.update(pending)
+    return answers
+
+
+def flush_enrollment(enrollment_id):
+    """
+    Upsert an enrollment's buffered answers in one statement.
+
+    Pending writes are renamed aside first so clicks that arrive during the
+    flush land in a fresh hash; readers consult both hashes until the rows
+    are committed. Returns the number of answers written.
+    """
+    key = _buffer_key(enrollment_id)
+    flushing_key = _flushing_key(enrollment_id)
+
+    with redis_client.lock(
+        _lock_key(enrollment_id),
+        timeout=FLUSH_LOCK_TIMEOUT,
+        blocking_timeout=FLUSH_LOCK_WAIT,
+    ):
+        if redis_client.exists(flushing_key):
+            # A previous flush failed or has not committed yet: retry it and
+            # leave newer writes for the next run so their order is kept
+            if redis_client.exists(key):
+                redis_client.sadd(DIRTY_SET_KEY, enrollment_id)
+        else:
+            try:
+                redis_client.rename(key, flushing_key)
+            except ResponseError:
+                return 0  # nothing buffered
+
+        pending = redis_client.hgetall(flushing_key)
+        written = upsert_answers(
+            enrollment_id,
+            {int(qid): _decode(aid) for qid, aid in pending.items()},
+        )
+        transaction.on_commit(lambda: redis_client.delete(flushing_key))
+        return written
+
+
+def flush_dirty_enrollments(enrollment_ids=None):
+    """
+    Flush every enrollment with pending answers, or only `enrollment_ids`.
+    Returns the total number of answers written.
+    """
+    if enrollment_ids is None:
+        enrollment_ids = [int(eid) for eid in redis_client.smembers(DIRTY_SET_KEY)]
+
+    flushed = 0
+    for enrollment_id in enrollment_ids:
+        redis_client.srem(DIRTY_SET_KEY, enrollment_id)
+        try:
+            flushed += flush_enrollment(enrollment_id)
+        except Exception:
+            # Keep it marked so the next run retries
+            redis_client.sadd(DIRTY_SET_KEY, enrollment_id)
+            logger.exception("Failed to flush answers for enrollment %s", enrollment_id)
+    return flushed
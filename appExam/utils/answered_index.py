@@ -0,0 +1,135 @@
+import logging
+
+from django.db import transaction
+from redis.exceptions import RedisError
+from redis.exceptions import WatchError
+
+from appCore.utils.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+redis_client = get_redis_client()
+
+INDEX_TTL = 12 * 60 * 60  # seconds
+BUILT_FIELD = "_built"  # marks an index loaded from the database
+REINDEX_ATTEMPTS = 3
+
+
+def _index_key(enrollment_id):
+    return f"exam_answered_{enrollment_id}"
+
+
+def queue_answers(pipe, enrollment_id, answers):
+    """Queue the index update for {question_id: answer_id or None} on `pipe`."""
+    key = _index_key(enrollment_id)
+    selected = {qid: aid for qid, aid in answers.items() if aid is not None}
+    cleared = [qid for qid, aid in answers.items() if aid is None]
+    if selected:
+        pipe.hset(key, mapping=selected)
+    if cleared:
+        pipe.hdel(key, *cleared)
+    pipe.expire(key, INDEX_TTL)
+
+
+def reindex_answers(enrollment_id, question_ids):
+    """
+    Index the stored answers of `question_ids` for an enrollment.
+
+    They are read after WATCHing the index, so of two racing writers the
+    one whose EXEC lands last read the database after both commits; the
+    other is aborted and retries. An index that keeps losing is dropped
+    and rebuilt on the next read.
+    """
+    # Lazy import: answer_buffer imports this module
+    from appExam.utils.answer_buffer import current_answer_ids
+
+    key = _index_key(enrollment_id)
+    try:
+        with redis_client.pipeline() as pipe:
+            for _ in range(REINDEX_ATTEMPTS):
+                try:
+                    pipe.watch(key)
+                    stored = current_answer_ids(enrollment_id, question_ids)
+                    pipe.multi()
+                    queue_answers(
+                        pipe,
+                        enrollment_id,
+                        {qid: stored.get(qid) for qid in question_ids},
+                    )
+                    pipe.execute()
+                except WatchError:
+                    continue
+                else:
+                    return
+        redis_client.delete(key)
+    except RedisError:
+        logger.warning("Redis unavailable indexing answers for %s", enrollment_id)
+
+
+def reindex_answers_on_commit(enrollment_id, question_ids):
+    """Index database writes only once they commit; a rollback leaves none."""
+    transaction.on_commit(lambda: reindex_answers(enrollment_id, question_ids))
+
+
+def _build_index(enrollment_id):
+    # Lazy import: answer_buffer imports this module
+    from appExam.utils.answer_buffer import current_answer_ids
+
+    key = _index_key(enrollment_id)
+    with redis_client.pipeline() as pipe:
+        # An index update landing between the read and the write changes
+        # the key and aborts the EXEC, so it is never overwritten or undone
+        pipe.watch(key)
+        answers = {
+            qid: aid
+            for qid, aid in current_answer_ids(enrollment_id).items()
+            if aid is not None
+        }
+        pipe.multi()
+        pipe.delete(key)
+        pipe.hset(key, mapping={BUILT_FIELD: 1, **answers})
+        pipe.expire(key, INDEX_TTL)
+        try:
+            pipe.execute()
+        except WatchError:
+            # Leave it unbuilt; the next read rebuilds from the newer state
+            logger.info("Answered index for %s changed while building", enrollment_id)
+    return answers
+
+
+def get_answered(enrollment_id):
+    """
+    {question_id: answer_id} for every answered question of an enrollment.
+    Served from Redis; the database is read only to build a missing index.
+    """
+    try:
+        raw = redis_client.hgetall(_index_key(enrollment_id))
+        if BUILT_FIELD.encode() not in raw:
+            return _build_index(enrollment_id)
+    except RedisError:
+        logger.warning("Redis unavailable reading answers for %s", enrollment_id)
+        from appExam.utils.answer_buffer import current_answer_ids
+
+        return {
+            qid: aid
+            for qid, aid in current_answer_ids(enrollment_id).items()
+            if aid is not None
+        }
+
+    return {
+        int(qid): int(aid) for qid, aid in raw.items() if qid != BUILT_FIELD.encode()
+    }
+
+
+def answered_answer_id(enrollment_id, question_id):
+    """Selected answer id for one question, or None."""
+    try:
+        built, answer_id = redis_client.hmget(
+            _index_key(enrollment_id),
+            BUILT_FIELD,
+            question_id,
+        )
+    except RedisError:
+        built = None
+    if not built:
+        return get_answered(enrollment_id).get(question_id)
+    return int(answer_id) if answer_id else None
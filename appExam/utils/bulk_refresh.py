@@ -0,0 +1,40 @@
+from django.db import transaction
+
+from appCore.utils.broadcast import enrollment_group
+from appCore.utils.broadcast import send_to_group
+from appExam.models import StudentExamEnrollment
+from appExam.utils.deadlines import schedule_deadlines
+from appExam.utils.enrollment_cache import invalidate_user_enrollments
+from appExam.utils.enrollment_state import store_enrollment_states
+from appExam.utils.timer import TimerState
+
+
+def refresh_enrollments(enrollment_ids, *, push_timers=True):
+    """
+    Bring caches, status records, deadlines and open sockets in line with
+    enrollments changed by a bulk UPDATE, which fires no post_save signals.
+    """
+    if not enrollment_ids:
+        return
+    enrollments = list(
+        StudentExamEnrollment.objects.filter(id__in=enrollment_ids).select_related(
+            "candidate",
+        ),
+    )
+    invalidate_user_enrollments([e.candidate.user_id for e in enrollments])
+    store_enrollment_states(enrollments)
+    schedule_deadlines(enrollments)
+    if not push_timers:
+        return
+    for enrollment in enrollments:
+        send_to_group(
+            enrollment_group(enrollment.id),
+            "exam.timer_updated",
+            timer=TimerState.from_enrollment(enrollment).to_dict(),
+        )
+
+
+def refresh_enrollments_on_commit(enrollment_ids, *, push_timers=True):
+    transaction.on_commit(
+        lambda: refresh_enrollments(enrollment_ids, push_timers=push_timers),
+    )
@@ -0,0 +1,82 @@
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+from redis.exceptions import RedisError
+
+from appCore.utils.redis_client import get_redis_client
+from appExam.utils.timer import TimerState
+
+logger = logging.getLogger(__name__)
+redis_client = get_redis_client()
+
+# Sorted set of enrollment id -> effective deadline (epoch seconds). Only
+# running timers are indexed; paused and finished enrollments are removed.
+DEADLINE_KEY = "exam_deadlines"
+
+
+def _deadline(enrollment, now):
+    timer = TimerState.from_enrollment(enrollment)
+    if timer.status != "active" or not timer.session_started_at:
+        return None
+    return (now + timer.remaining(now)).timestamp()
+
+
+def _index(pipe, enrollment, now):
+    deadline = _deadline(enrollment, now)
+    if deadline is None:
+        pipe.zrem(DEADLINE_KEY, enrollment.id)
+    else:
+        pipe.zadd(DEADLINE_KEY, {enrollment.id: deadline})
+
+
+def schedule_deadlines(enrollments):
+    """Index (or unindex) the deadline of each enrollment."""
+    now = timezone.now()
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for enrollment in enrollments:
+            _index(pipe, enrollment, now)
+        pipe.execute()
+    except RedisError:
+        logger.warning("Redis unavailable updating exam deadlines")
+
+
+def schedule_deadline_on_commit(enrollment):
+    transaction.on_commit(lambda: schedule_deadlines([enrollment]))
+
+
+def schedule_session_deadlines_on_commit(session_id):
+    from appExam.models import StudentExamEnrollment
+
+    transaction.on_commit(
+        lambda: schedule_deadlines(
+            StudentExamEnrollment.objects.filter(session_id=session_id).iterator(),
+        ),
+    )
+
+
+def pop_due_enrollments(now=None, limit=500):
+    """
+    Remove and return up to `limit` enrollment ids whose deadline has passed.
+
+    Each id is claimed with its own ZREM, so concurrent tickers never return
+    the same enrollment twice.
+    """
+    now = now or timezone.now()
+    due = redis_client.zrangebyscore(
+        DEADLINE_KEY,
+        "-inf",
+        now.timestamp(),
+        start=0,
+        num=limit,
+    )
+    if not due:
+        return []
+
+    pipe = redis_client.pipeline(transaction=False)
+    for member in due:
+        pipe.zrem(DEADLINE_KEY, member)
+    claimed = pipe.execute()
+    return [int(member) for member, won in zip(due, claimed, strict=True) if won]
+
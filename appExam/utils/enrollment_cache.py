@@ -0,0 +1,189 @@
+import json
+import logging
+from datetime import datetime
+from datetime import time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import router
+from django.db import transaction
+from django.db.models.fields.files import FieldFile
+from django.utils import timezone
+from redis.exceptions import RedisError
+
+from appCore.utils.redis_client import get_redis_client
+from appExam.models import Candidate
+from appExam.models import StudentExamEnrollment
+
+logger = logging.getLogger(__name__)
+redis_client = get_redis_client()
+
+RESOLUTION_TTL = 60  # seconds
+
+
+def _resolution_key(kind, user_id):
+    return f"exam_enrollment_{kind}_{user_id}"
+
+
+def _generation_key(user_id):
+    return f"exam_enrollment_gen_{user_id}"
+
+
+class _SnapshotEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder rounds to milliseconds; timers need the exact value
+        if isinstance(o, datetime | time):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _dump_instance(instance):
+    """
+    JSON-safe snapshot of a model instance: its concrete field values plus
+    every forward relation already loaded on it (select_related).
+    """
+    if instance is None:
+        return None
+    fields = {}
+    related = {}
+    for field in instance._meta.concrete_fields:  # noqa: SLF001
+        value = field.value_from_object(instance)
+        if isinstance(value, FieldFile):
+            value = value.name
+        fields[field.attname] = value
+        if field.is_relation and field.is_cached(instance):
+            related[field.name] = _dump_instance(field.get_cached_value(instance))
+    return {"fields": fields, "related": related}
+
+
+def _load_instance(model, data):
+    """
+    Rebuild an instance dumped by `_dump_instance` without a query. Raises
+    KeyError when the snapshot predates a change to the model's fields.
+    """
+    if data is None:
+        return None
+    concrete_fields = model._meta.concrete_fields  # noqa: SLF001
+    if len(data["fields"]) != len(concrete_fields):
+        raise KeyError(model.__name__)
+    values = []
+    for field in concrete_fields:
+        value = data["fields"][field.attname]
+        values.append(None if value is None else field.to_python(value))
+    instance = model.from_db(
+        router.db_for_read(model),
+        [field.attname for field in concrete_fields],
+        values,
+    )
+    for name, related in data["related"].items():
+        field = model._meta.get_field(name)  # noqa: SLF001
+        field.set_cached_value(instance, _load_instance(field.related_model, related))
+    return instance
+
+
+def _dumps(generation, candidate, enrollment):
+    return json.dumps(
+        {
+            "generation": generation,
+            "candidate": _dump_instance(candidate),
+            "enrollment": _dump_instance(enrollment),
+        },
+        cls=_SnapshotEncoder,
+    )
+
+
+def _loads(raw):
+    """(generation, (candidate, enrollment)), or None for an unusable entry."""
+    try:
+        data = json.loads(raw)
+        return data["generation"], (
+            _load_instance(Candidate, data["candidate"]),
+            _load_instance(StudentExamEnrollment, data["enrollment"]),
+        )
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _ttl_for(enrollment):
+    """Expire before a scheduled session's start moves it to another tier."""
+    ttl = RESOLUTION_TTL
+    session = enrollment.session
+    if session.status == "scheduled":
+        until_start = (session.base_start - timezone.now()).total_seconds()
+        ttl = min(ttl, int(until_start))
+    return ttl
+
+
+def cached_resolution(kind, user_id, resolve):
+    """
+    Return `resolve()` -> (candidate, enrollment) for a user, cached in Redis.
+
+    Entries are tagged with the user's generation counter, read before the
+    database, so a transition committed while we resolve still invalidates
+    what we store. Misses (no enrollment) are never cached. Instances are
+    stored as JSON field snapshots; one written before a model change no
+    longer loads and counts as a miss.
+    """
+    key = _resolution_key(kind, user_id)
+    try:
+        raw, generation = redis_client.mget(key, _generation_key(user_id))
+        generation = int(generation or 0)
+        cached = _loads(raw) if raw else None
+        if cached and cached[0] == generation:
+            return cached[1]
+    except RedisError:
+        logger.warning("Redis unavailable resolving enrollment for %s", user_id)
+        return resolve()
+
+    candidate, enrollment = resolve()
+    if enrollment is not None:
+        ttl = _ttl_for(enrollment)
+        if ttl > 0:
+            try:
+                redis_client.set(
+                    key,
+                    _dumps(generation, candidate, enrollment),
+                    ex=ttl,
+                )
+            except RedisError:
+                logger.warning("Redis unavailable caching enrollment for %s", user_id)
+    return candidate, enrollment
+
+
+def invalidate_user_enrollments(user_ids):
+    """Bump the generation of each user so cached resolutions are dropped."""
+    user_ids = [uid for uid in user_ids if uid is not None]
+    if not user_ids:
+        return
+    try:
+        pipe = redis_client.pipeline()
+        for user_id in user_ids:
+            pipe.incr(_generation_key(user_id))
+        pipe.execute()
+    except RedisError:
+        logger.warning("Redis unavailable invalidating enrollments")
+
+
+def invalidate_enrollment_on_commit(enrollment):
+    if StudentExamEnrollment.candidate.is_cached(enrollment):
+        user_id = enrollment.candidate.user_id
+    else:
+        user_id = (
+            Candidate.objects.filter(pk=enrollment.candidate_id)
+            .values_list("user_id", flat=True)
+            .first()
+        )
+    transaction.on_commit(lambda: invalidate_user_enrollments([user_id]))
+
+
+def invalidate_session_enrollments_on_commit(session_id):
+    """Invalidate every candidate enrolled in a session, once committed."""
+
+    def invalidate():
+        invalidate_user_enrollments(
+            StudentExamEnrollment.objects.filter(session_id=session_id).values_list(
+                "candidate__user_id",
+                flat=True,
+            ),
+        )
+
+    transaction.on_commit(invalidate)
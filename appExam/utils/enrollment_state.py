@@ -0,0 +1,189 @@
+import json
+import logging
+from datetime import datetime
+
+from django.db import transaction
+from django.utils import timezone
+from redis.exceptions import RedisError
+
+from appCore.utils.redis_client import get_redis_client
+from appExam.models import ExamSession
+from appExam.models import StudentExamEnrollment
+from appExam.utils.timer import TimerState
+
+logger = logging.getLogger(__name__)
+redis_client = get_redis_client()
+
+STATE_TTL = 12 * 60 * 60  # seconds
+# Global, never-expiring counter every record version is drawn from
+VERSION_KEY = "exam_state_version"
+
+
+def _enrollment_key(enrollment_id):
+    return f"exam_state_enrollment_{enrollment_id}"
+
+
+def _session_key(session_id):
+    return f"exam_state_session_{session_id}"
+
+
+def _next_versions(count):
+    """
+    Reserve `count` versions from the global counter. Every write gets a
+    version above any handed out before, so a record rebuilt after its key
+    expired never repeats one a client has already seen.
+    """
+    last = redis_client.incrby(VERSION_KEY, count)
+    return iter(range(last - count + 1, last + 1))
+
+
+def _write(pipe, key, record, version):
+    # Setting the version and the data in one MULTI keeps them paired
+    pipe.hset(key, mapping={"version": version, "data": json.dumps(record)})
+    pipe.expire(key, STATE_TTL)
+
+
+def _enrollment_record(enrollment):
+    return {
+        "status": enrollment.status,
+        "present": enrollment.present,
+        "timer": TimerState.from_enrollment(enrollment).to_dict(),
+    }
+
+
+def _session_record(session):
+    return {
+        "status": session.status,
+        "effective_end": session.expected_end.isoformat(),
+    }
+
+
+def store_enrollment_states(enrollments):
+    enrollments = list(enrollments)
+    if not enrollments:
+        return
+    try:
+        versions = _next_versions(len(enrollments))
+        pipe = redis_client.pipeline(transaction=True)
+        for enrollment in enrollments:
+            _write(
+                pipe,
+                _enrollment_key(enrollment.id),
+                _enrollment_record(enrollment),
+                next(versions),
+            )
+        pipe.execute()
+    except RedisError:
+        logger.warning("Redis unavailable storing enrollment states")
+
+
+def store_enrollment_state(enrollment):
+    store_enrollment_states([enrollment])
+
+
+def store_session_states(session_id):
+    """Rewrite the session record and every enrollment record of the session."""
+    session = ExamSession.objects.filter(pk=session_id).first()
+    if session is None:
+        return
+    enrollments = list(StudentExamEnrollment.objects.filter(session=session))
+    try:
+        versions = _next_versions(len(enrollments) + 1)
+        pipe = redis_client.pipeline(transaction=True)
+        _write(pipe, _session_key(session.id), _session_record(session), next(versions))
+        for enrollment in enrollments:
+            _write(
+                pipe,
+                _enrollment_key(enrollment.id),
+                _enrollment_record(enrollment),
+                next(versions),
+            )
+        pipe.execute()
+    except RedisError:
+        logger.warning("Redis unavailable storing states for session %s", session_id)
+
+
+def store_enrollment_state_on_commit(enrollment):
+    transaction.on_commit(lambda: store_enrollment_state(enrollment))
+
+
+def store_session_states_on_commit(session_id):
+    transaction.on_commit(lambda: store_session_states(session_id))
+
+
+def _load_records(enrollment_id, session_id):
+    pipe = redis_client.pipeline()
+    pipe.hmget(_enrollment_key(enrollment_id), "version", "data")
+    pipe.hmget(_session_key(session_id), "version", "data")
+    return pipe.execute()
+
+
+def get_enrollment_state(enrollment_id, session_id):
+    """
+    Return the status record of an enrollment, rebuilding it from the database
+    only when Redis has no copy.
+
+    `version` is the newer of the two records' versions, drawn from one
+    global counter: it increases with every write to the enrollment or its
+    session, including rebuilds after a key expired, so clients can skip
+    unchanged replies.
+    """
+    try:
+        (e_version, e_data), (s_version, s_data) = _load_records(
+            enrollment_id,
+            session_id,
+        )
+        if not (e_data and s_data):
+            enrollment = StudentExamEnrollment.objects.select_related(
+                "session",
+            ).get(pk=enrollment_id)
+            versions = _next_versions(2)
+            pipe = redis_client.pipeline(transaction=True)
+            if not e_data:
+                record = _enrollment_record(enrollment)
+                _write(pipe, _enrollment_key(enrollment_id), record, next(versions))
+            if not s_data:
+                record = _session_record(enrollment.session)
+                _write(pipe, _session_key(session_id), record, next(versions))
+            pipe.execute()
+            (e_version, e_data), (s_version, s_data) = _load_records(
+                enrollment_id,
+                session_id,
+            )
+    except RedisError:
+        logger.warning("Redis unavailable loading state for %s", enrollment_id)
+        enrollment = StudentExamEnrollment.objects.select_related("session").get(
+            pk=enrollment_id,
+        )
+        return _format_state(
+            0,
+            _enrollment_record(enrollment),
+            _session_record(enrollment.session),
+        )
+
+    return _format_state(
+        max(int(e_version), int(s_version)),
+        json.loads(e_data),
+        json.loads(s_data),
+    )
+
+
+def _format_state(version, enrollment_record, session_record):
+    timer = TimerState.from_dict(enrollment_record["timer"])
+    now = timezone.now()
+    remaining = timer.remaining(now)
+    deadline = None
+    if timer.status == "active" and remaining.total_seconds() > 0:
+        deadline = timezone.localtime(now + remaining).isoformat()
+
+    return {
+        "version": version,
+        "status": enrollment_record["status"],
+        "present": enrollment_record["present"],
+        "session_status": session_record["status"],
+        "time_remaining": max(0, remaining.total_seconds()),
+        "deadline": deadline,
+        "session_effective_end": timezone.localtime(
+            datetime.fromisoformat(session_record["effective_end"]),
+        ).isoformat(),
+    }
@@ -1,9 +1,10 @@
 import re
-from io import TextIOWrapper
 from typing import Any
 
 import docx
-import pandas as pd
+
+from appExam.utils.questionParser import iter_questions
+from appExam.utils.questionParser import parse_questions_from_csv as parse_columns
 
 
 def parse_questions_from_document(content: str) -> list[dict[str, Any]]:  # noqa: C901, PLR0912
@@ -189,40 +190,9 @@ def parse_questions_with_debug(content: str) -> dict[str, Any]:
     return {"questions": questions, "debug_info": debug_info}
 
 
-
 def parse_questions_from_csv(file) -> list[dict[str, Any]]:
     """
     Parses questions from a CSV file in the provided format:
     QUESTION, ANSWER, OPTIONS_A, OPTIONS_B, OPTIONS_C, OPTIONS_D
     """
-    df = pd.read_csv(TextIOWrapper(file, encoding="utf-8"))
-
-    questions = []
-    for _, row in df.iterrows():
-        question_text = str(row.get("QUESTION", "")).strip()
-        answer_letter = str(row.get("ANSWER", "")).strip().lower()
-
-        options = {
-            "a": str(row.get("OPTIONS_A", "")).strip(),
-            "b": str(row.get("OPTIONS_B", "")).strip(),
-            "c": str(row.get("OPTIONS_C", "")).strip(),
-            "d": str(row.get("OPTIONS_D", "")).strip(),
-        }
-
-        answers = []
-        for letter, text in options.items():
-            if not text:
-                continue
-            answers.append({
-                "text": text,
-                "option_letter": letter.upper(),
-                "is_correct": (letter == answer_letter),
-            })
-
-        if question_text and answers:
-            questions.append({
-                "question": question_text,
-                "answers": answers,
-            })
-
-    return questions
+    return [question for _, question in iter_questions(parse_columns(file))]
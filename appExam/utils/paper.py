@@ -0,0 +1,186 @@
+import json
+import logging
+import time
+
+from redis.exceptions import RedisError
+
+from appCore.utils.broadcast import enrollment_group
+from appCore.utils.broadcast import send_to_group
+from appCore.utils.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+redis_client = get_redis_client()
+
+PAPER_TTL = 6 * 60 * 60  # seconds
+L1_TTL = 60  # seconds before an in-process paper is re-read from Redis
+L1_MAX_PAPERS = 10000
+
+ANSWER_LETTERS = ("a", "b", "c", "d")
+
+# In-process L1: {enrollment_id: (stored_at, Paper)}
+_local_papers = {}
+
+
+def _paper_key(enrollment_id):
+    return f"exam_paper_{enrollment_id}"
+
+
+def answer_label(index):
+    """Letter shown for the answer at `index` (a-d, then 5, 6, ...)."""
+    return ANSWER_LETTERS[index] if index < len(ANSWER_LETTERS) else str(index + 1)
+
+
+class Paper:
+    """
+    A candidate's randomized paper, materialized for O(1) lookups.
+
+    `pages` lists question ids in page order, `letters` maps
+    question id -> {letter: answer id} in display order and `answer_letters`
+    is the reverse map question id -> {answer id: letter}.
+    """
+
+    __slots__ = ("answer_letters", "enrollment_id", "letters", "pages")
+
+    def __init__(self, enrollment_id, pages, answer_ids):
+        self.enrollment_id = enrollment_id
+        self.pages = pages
+        self.letters = {}
+        self.answer_letters = {}
+        for qid, aids in answer_ids.items():
+            by_letter = {answer_label(idx): aid for idx, aid in enumerate(aids)}
+            self.letters[qid] = by_letter
+            self.answer_letters[qid] = {
+                aid: letter for letter, aid in by_letter.items()
+            }
+
+    def __contains__(self, question_id):
+        return question_id in self.letters
+
+    @property
+    def num_pages(self):
+        return len(self.pages)
+
+    def question_for_page(self, page):
+        """Question id shown on a 1-based page, or None when out of range."""
+        if 1 <= page <= len(self.pages):
+            return self.pages[page - 1]
+        return None
+
+    def options(self, question_id):
+        """[(letter, answer id), ...] in the candidate's display order."""
+        return list(self.letters.get(question_id, {}).items())
+
+    def answer_id(self, question_id, letter):
+        if not isinstance(letter, str):
+            return None
+        return self.letters.get(question_id, {}).get(letter.lower())
+
+    def letter_for(self, question_id, answer_id):
+        return self.answer_letters.get(question_id, {}).get(answer_id)
+
+    def to_json(self):
+        return json.dumps(
+            {
+                "enrollment_id": self.enrollment_id,
+                "pages": self.pages,
+                "answers": {
+                    qid: list(by_letter.values())
+                    for qid, by_letter in self.letters.items()
+                },
+            },
+        )
+
+    @classmethod
+    def from_json(cls, raw):
+        data = json.loads(raw)
+        return cls(
+            data["enrollment_id"],
+            data["pages"],
+            {int(qid): aids for qid, aids in data["answers"].items()},
+        )
+
+    @classmethod
+    def from_enrollment(cls, enrollment):
+        answer_order = enrollment.answer_order or {}
+        return cls(
+            enrollment.id,
+            list(enrollment.question_order),
+            {
+                qid: list(answer_order.get(str(qid), []))
+                for qid in enrollment.question_order
+            },
+        )
+
+
+def _remember(paper):
+    if len(_local_papers) >= L1_MAX_PAPERS:
+        _local_papers.clear()
+    _local_papers[paper.enrollment_id] = (time.monotonic(), paper)
+
+
+def cache_paper(enrollment):
+    """Materialize the enrollment's paper and publish it to Redis."""
+    if not enrollment.question_order:
+        return None
+
+    paper = Paper.from_enrollment(enrollment)
+    try:
+        redis_client.set(_paper_key(enrollment.id), paper.to_json(), ex=PAPER_TTL)
+    except RedisError:
+        logger.warning("Redis unavailable storing paper for %s", enrollment.id)
+    _remember(paper)
+    return paper
+
+
+def cache_papers(enrollments):
+    """
+    Publish many papers to Redis in one round trip. Used by the pre-start
+    warm-up, so nothing is kept in this process's L1.
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    count = 0
+    for enrollment in enrollments:
+        if not enrollment.question_order:
+            continue
+        paper = Paper.from_enrollment(enrollment)
+        pipe.set(_paper_key(enrollment.id), paper.to_json(), ex=PAPER_TTL)
+        count += 1
+    try:
+        pipe.execute()
+    except RedisError:
+        logger.warning("Redis unavailable storing %s papers", count)
+        return 0
+    return count
+
+
+def get_paper(enrollment):
+    """
+    Return the enrollment's paper, or None if it has not been randomized yet.
+    """
+    cached = _local_papers.get(enrollment.id)
+    if cached and time.monotonic() - cached[0] < L1_TTL:
+        return cached[1]
+
+    try:
+        raw = redis_client.get(_paper_key(enrollment.id))
+    except RedisError:
+        logger.warning("Redis unavailable loading paper for %s", enrollment.id)
+        raw = None
+
+    if raw:
+        paper = Paper.from_json(raw)
+        _remember(paper)
+        return paper
+
+    return cache_paper(enrollment)
+
+
+def invalidate_paper(enrollment_id):
+    _local_papers.pop(enrollment_id, None)
+    try:
+        redis_client.delete(_paper_key(enrollment_id))
+    except RedisError:
+        logger.warning("Redis unavailable invalidating paper for %s", enrollment_id)
+
+    # Open exam sockets hold the paper in their connection context
+    send_to_group(enrollment_group(enrollment_id), "exam.context_invalidated")
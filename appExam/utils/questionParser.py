@@ -6,70 +6,94 @@ import pandas as pd
 
 logger = logging.getLogger(__name__)
 
+QUESTION_COLUMN = "QUESTION"
+ANSWER_COLUMN = "ANSWER"
+OPTION_LETTERS = ("a", "b", "c", "d")
+OPTION_COLUMNS = {letter: f"OPTIONS_{letter.upper()}" for letter in OPTION_LETTERS}
 
-def parse_questions_from_csv(file) -> list[dict[str, Any]]:
+
+def _log_rows(message, mask):
+    rows = (mask[mask].index + 1).tolist()
+    if rows:
+        logger.warning(message, len(rows), rows[:20])
+
+
+def parse_questions_from_csv(file) -> dict[str, Any]:
     """
     Parses questions from a CSV file in the following format:
     QUESTION, ANSWER, OPTIONS_A, OPTIONS_B, OPTIONS_C, OPTIONS_D
 
     ANSWER should be one of: a, b, c, d (case-insensitive)
+
+    Returns the valid questions column by column:
+    {"row": [...], "question": [...], "answer": [...], "options": {"a": [...]}}
+    where `row` is the 1-based data row and `answer` is the lowercase correct
+    letter, or "" when the file gave an invalid one.
     """
     try:
-        df = pd.read_csv(TextIOWrapper(file, encoding="utf-8"))  # noqa: PD901
+        df = pd.read_csv(  # noqa: PD901
+            TextIOWrapper(file, encoding="utf-8"),
+            dtype=str,
+            keep_default_na=False,
+        )
         logger.info("CSV file successfully read with %d rows.", len(df))
     except Exception as e:
         logger.exception("Failed to read CSV file: %s", str(e))
         raise
 
-    questions = []
-    for idx, row in df.iterrows():
-        question_text = str(row.get("QUESTION", "")).strip()
-        answer_letter = str(row.get("ANSWER", "")).strip().lower()
-
-        options = {
-            "a": str(row.get("OPTIONS_A", "")).strip(),
-            "b": str(row.get("OPTIONS_B", "")).strip(),
-            "c": str(row.get("OPTIONS_C", "")).strip(),
-            "d": str(row.get("OPTIONS_D", "")).strip(),
-        }
-
-        if answer_letter not in options:
-            logger.warning(
-                "Row %d: Invalid answer '%s'. Must be one of a/b/c/d.",
-                idx + 1,
-                answer_letter,
-            )
-
-        answers = []
-        for letter, text in options.items():
-            if not text:
-                continue
-            answers.append(
-                {
-                    "text": text,
-                    "option_letter": letter.strip().upper(),
-                    "is_correct": (letter.strip().lower() == answer_letter),
-                },
-            )
-
-        if not question_text:
-            logger.warning("Row %d: Empty question text.", idx + 1)
-
-        if not answers:
-            logger.warning("Row %d: No valid options provided.", idx + 1)
-
-        if question_text and answers:
-            questions.append(
-                {
-                    "question": question_text,
-                    "answers": answers,
-                },
-            )
-            logger.debug(
-                "Row %d: Parsed question with %d options.",
-                idx + 1,
-                len(answers),
-            )
-
-    logger.info("Total valid questions parsed: %d", len(questions))
-    return questions
+    columns = [QUESTION_COLUMN, ANSWER_COLUMN, *OPTION_COLUMNS.values()]
+    df = df.reindex(columns=columns, fill_value="")  # noqa: PD901
+    df = df.apply(lambda column: column.str.strip())  # noqa: PD901
+    answers = df[ANSWER_COLUMN].str.lower()
+
+    empty_question = df[QUESTION_COLUMN] == ""
+    no_options = (df[list(OPTION_COLUMNS.values())] == "").all(axis=1)
+    invalid_answer = ~answers.isin(OPTION_LETTERS)
+
+    _log_rows("%d rows with an invalid answer letter: %s", invalid_answer)
+    _log_rows("%d rows with empty question text: %s", empty_question)
+    _log_rows("%d rows with no valid options: %s", no_options)
+
+    valid = ~(empty_question | no_options)
+    kept = df[valid]
+    parsed = {
+        "row": (kept.index + 1).tolist(),
+        "question": kept[QUESTION_COLUMN].tolist(),
+        "answer": answers[valid].where(~invalid_answer[valid], "").tolist(),
+        "options": {
+            letter: kept[column].tolist() for letter, column in OPTION_COLUMNS.items()
+        },
+    }
+    logger.info("Total valid questions parsed: %d", len(parsed["question"]))
+    return parsed
+
+
+def question_count(parsed) -> int:
+    return len(parsed["question"])
+
+
+def iter_questions(parsed):
+    """
+    Yield (row, {"question", "answers"}) per parsed question, the shape
+    the review template and import_questions() take. Empty options are left
+    out of "answers".
+    """
+    options = parsed["options"]
+    for index, (row, question, answer) in enumerate(
+        zip(parsed["row"], parsed["question"], parsed["answer"], strict=True),
+    ):
+        yield (
+            row,
+            {
+                "question": question,
+                "answers": [
+                    {
+                        "text": options[letter][index],
+                        "option_letter": letter.upper(),
+                        "is_correct": letter == answer,
+                    }
+                    for letter in OPTION_LETTERS
+                    if options[letter][index]
+                ],
+            },
+        )
@@ -0,0 +1,152 @@
+import json
+import logging
+import time
+
+from django.db import transaction
+from redis.exceptions import RedisError
+
+from appCore.utils.redis_client import get_redis_client
+from appExam.models import Answer
+from appExam.models import Question
+
+logger = logging.getLogger(__name__)
+redis_client = get_redis_client()
+
+BANK_TTL = 6 * 60 * 60  # seconds
+L1_REVALIDATE_INTERVAL = 5  # seconds between version checks against Redis
+
+# In-process L1: {session_id: (checked_at, QuestionBank)}
+_local_banks = {}
+
+
+def _bank_key(session_id):
+    return f"exam_bank_{session_id}"
+
+
+def _version_key(session_id):
+    return f"exam_bank_version_{session_id}"
+
+
+class QuestionBank:
+    """
+    Read-only snapshot of a session's questions and answer texts.
+
+    `questions` maps question id -> text and `answers` maps answer id -> text.
+    `version` is the Redis version counter the snapshot was compiled against.
+    """
+
+    __slots__ = ("answers", "questions", "session_id", "version")
+
+    def __init__(self, session_id, version, questions, answers):
+        self.session_id = session_id
+        self.version = version
+        self.questions = questions
+        self.answers = answers
+
+    def __len__(self):
+        return len(self.questions)
+
+    def to_json(self):
+        return json.dumps(
+            {
+                "session_id": self.session_id,
+                "version": self.version,
+                "questions": self.questions,
+                "answers": self.answers,
+            },
+        )
+
+    @classmethod
+    def from_json(cls, raw):
+        data = json.loads(raw)
+        # JSON object keys are always strings; restore integer ids
+        return cls(
+            session_id=data["session_id"],
+            version=data["version"],
+            questions={int(k): v for k, v in data["questions"].items()},
+            answers={int(k): v for k, v in data["answers"].items()},
+        )
+
+
+def _current_version(session_id):
+    return int(redis_client.get(_version_key(session_id)) or 0)
+
+
+def build_session_bank(session_id, version=None):
+    """
+    Compile the bank for a session from the database and publish it to Redis.
+    Called on session start and on the first cache miss.
+    """
+    if version is None:
+        try:
+            version = _current_version(session_id)
+        except RedisError:
+            logger.warning("Redis unavailable reading bank version for %s", session_id)
+            version = 0
+
+    questions = dict(
+        Question.objects.filter(session_id=session_id).values_list("id", "text"),
+    )
+    answers = dict(
+        Answer.objects.filter(question__session_id=session_id).values_list(
+            "id",
+            "text",
+        ),
+    )
+    bank = QuestionBank(session_id, version, questions, answers)
+
+    try:
+        redis_client.set(_bank_key(session_id), bank.to_json(), ex=BANK_TTL)
+    except RedisError:
+        logger.warning("Redis unavailable storing bank for session %s", session_id)
+
+    _local_banks[session_id] = (time.monotonic(), bank)
+    return bank
+
+
+def get_session_bank(session_id):
+    """
+    Return the compiled bank for a session.
+
+    Served from the in-process copy while it is fresh, then from Redis as long
+    as the stored version still matches. Only a version bump or a cold cache
+    falls through to the database.
+    """
+    now = time.monotonic()
+    cached = _local_banks.get(session_id)
+    if cached and now - cached[0] < L1_REVALIDATE_INTERVAL:
+        return cached[1]
+
+    try:
+        version = _current_version(session_id)
+        if cached and cached[1].version == version:
+            _local_banks[session_id] = (now, cached[1])
+            return cached[1]
+
+        raw = redis_client.get(_bank_key(session_id))
+        if raw:
+            bank = QuestionBank.from_json(raw)
+            if bank.version == version:
+                _local_banks[session_id] = (now, bank)
+                return bank
+    except RedisError:
+        logger.warning("Redis unavailable loading bank for session %s", session_id)
+        version = None
+
+    return build_session_bank(session_id, version)
+
+
+def invalidate_session_bank(session_id):
+    """Bump the bank version so every process recompiles on its next read."""
+    _local_banks.pop(session_id, None)
+    try:
+        pipe = redis_client.pipeline()
+        pipe.incr(_version_key(session_id))
+        pipe.delete(_bank_key(session_id))
+        pipe.execute()
+    except RedisError:
+        logger.warning("Redis unavailable invalidating bank for %s", session_id)
+
+
+def invalidate_session_bank_on_commit(session_id):
+    transaction.on_commit(lambda: invalidate_session_bank(session_id))
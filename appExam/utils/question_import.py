@@ -0,0 +1,134 @@
+import logging
+
+from django.db import IntegrityError
+from django.db import transaction
+
+from appExam.models import Answer
+from appExam.models import Question
+from appExam.utils.question_bank import invalidate_session_bank_on_commit
+from appExam.utils.question_text import question_text_hash
+
+logger = logging.getLogger(__name__)
+
+# Per-row outcomes of import_questions()
+CREATED = "created"
+EXISTS = "exists"
+DUPLICATE = "duplicate"
+INVALID = "invalid"
+
+
+def _existing_hashes(session, hashes):
+    return set(
+        Question.objects.filter(session=session, text_hash__in=hashes).values_list(
+            "text_hash",
+            flat=True,
+        ),
+    )
+
+
+def _insert(session, accepted):
+    with transaction.atomic():
+        questions = Question.objects.bulk_create(
+            [
+                Question(session=session, text=text, text_hash=text_hash)
+                for _, text, text_hash, _ in accepted
+            ],
+        )
+        Answer.objects.bulk_create(
+            [
+                Answer(
+                    question=question,
+                    text=answer["text"],
+                    is_correct=answer["is_correct"],
+                )
+                for question, (*_, answers) in zip(questions, accepted, strict=True)
+                for answer in answers
+            ],
+        )
+    return questions
+
+
+def _screen(rows):
+    """
+    Split `rows` into report entries for rows that cannot be imported and
+    accepted (row_number, text, text_hash, answers) tuples.
+    """
+    report = []
+    accepted = []
+    seen = set()
+    for row_number, data in rows:
+        text = (data.get("question") or "").strip()
+        answers = [answer for answer in data.get("answers", []) if answer["text"]]
+        if not text:
+            report.append(
+                {"row": row_number, "status": INVALID, "message": "Empty question"},
+            )
+        elif not answers:
+            report.append(
+                {"row": row_number, "status": INVALID, "message": "No answers"},
+            )
+        elif (text_hash := question_text_hash(text)) in seen:
+            report.append(
+                {
+                    "row": row_number,
+                    "status": DUPLICATE,
+                    "message": "Repeats an earlier question in this file",
+                },
+            )
+        else:
+            seen.add(text_hash)
+            accepted.append((row_number, text, text_hash, answers))
+    return report, accepted
+
+
+def import_questions(session, rows):
+    """
+    Create the questions of `rows` [(row_number, {"question", "answers"})]
+    for `session` with one bulk insert for questions and one for answers.
+
+    Texts already in the session are found by text_hash with a single query
+    up front, so unique_session_text_hash never aborts the import. Returns a
+    report with one {"row", "status", "message"} entry per input row (see
+    CREATED etc.).
+    """
+    report, accepted = _screen(rows)
+
+    for attempt in range(2):
+        existing = _existing_hashes(session, [entry[2] for entry in accepted])
+        pending = [entry for entry in accepted if entry[2] not in existing]
+        try:
+            questions = _insert(session, pending) if pending else []
+            break
+        except IntegrityError:
+            # Another import added some of these texts since the check
+            if attempt:
+                raise
+            logger.warning("Question import raced on session %s, retrying", session.id)
+
+    created_ids = {
+        row_number: question.id
+        for (row_number, *_), question in zip(pending, questions, strict=True)
+    }
+    for row_number, *_ in accepted:
+        if row_number in created_ids:
+            report.append(
+                {
+                    "row": row_number,
+                    "status": CREATED,
+                    "message": f"Created question {created_ids[row_number]}",
+                },
+            )
+        else:
+            report.append(
+                {
+                    "row": row_number,
+                    "status": EXISTS,
+                    "message": "Already in this session",
+                },
+            )
+    report.sort(key=lambda entry: entry["row"])
+
+    if created_ids:
+        # bulk_create sends no post_save, so the bank signals never fire
+        invalidate_session_bank_on_commit(session.id)
+    return report
@@ -0,0 +1,53 @@
+import json
+import logging
+import uuid
+
+from redis.exceptions import RedisError
+
+from appCore.utils.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+redis_client = get_redis_client()
+
+# How long a parsed CSV waits for the admin to review and save it
+STAGING_TTL = 60 * 60  # seconds
+
+
+def _staging_key(staging_id):
+    return f"question_import_{staging_id}"
+
+
+def stage_questions(parsed):
+    """
+    Store a parsed question CSV until it is imported and return its staging
+    id, or None when Redis is unavailable. Only the id goes into the admin's
+    session.
+    """
+    staging_id = uuid.uuid4().hex
+    try:
+        redis_client.set(
+            _staging_key(staging_id),
+            json.dumps(parsed),
+            ex=STAGING_TTL,
+        )
+    except RedisError:
+        logger.warning("Redis unavailable staging questions %s", staging_id)
+        return None
+    return staging_id
+
+
+def load_staged_questions(staging_id):
+    """The staged questions, or None once they expired or were discarded."""
+    try:
+        raw = redis_client.get(_staging_key(staging_id))
+    except RedisError:
+        logger.warning("Redis unavailable loading staged questions %s", staging_id)
+        return None
+    return json.loads(raw) if raw else None
+
+
+def discard_staged_questions(staging_id):
+    try:
+        redis_client.delete(_staging_key(staging_id))
+    except RedisError:
+        logger.warning("Redis unavailable discarding staged questions %s", staging_id)
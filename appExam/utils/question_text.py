@@ -0,0 +1,11 @@
+import hashlib
+
+
+def normalize_question_text(text):
+    """Collapse runs of whitespace so reformatted copies compare equal."""
+    return " ".join((text or "").split())
+
+
+def question_text_hash(text):
+    """sha256 hex digest of the normalized text, as stored in Question.text_hash."""
+    return hashlib.sha256(normalize_question_text(text).encode()).hexdigest()
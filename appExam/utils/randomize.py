@@ -0,0 +1,66 @@
+import random
+from collections import defaultdict
+
+from django.db import transaction
+
+from appExam.models import Answer
+from appExam.models import Question
+from appExam.models import StudentExamEnrollment
+
+
+def load_session_layout(session_id):
+    """
+    Return (question_ids, {question_id: [answer_id, ...]}) for a session,
+    in two queries. Shared by every enrollment shuffled from it.
+    """
+    question_ids = list(
+        Question.objects.filter(session_id=session_id).values_list("id", flat=True),
+    )
+    grouped = defaultdict(list)
+    for qid, aid in Answer.objects.filter(
+        question__session_id=session_id,
+    ).values_list("question_id", "id"):
+        grouped[qid].append(aid)
+    return question_ids, grouped
+
+
+def randomize_enrollment(enrollment, question_ids, grouped):
+    """Set a fresh question_order and answer_order on `enrollment` (not saved)."""
+    question_order = list(question_ids)
+    random.shuffle(question_order)
+
+    answer_order = {}
+    for qid in question_order:
+        answer_list = list(grouped.get(qid, []))
+        random.shuffle(answer_list)
+        answer_order[str(qid)] = answer_list
+
+    enrollment.question_order = question_order
+    enrollment.answer_order = answer_order
+
+
+def is_randomized(enrollment):
+    return bool(enrollment.question_order and enrollment.answer_order)
+
+
+def randomize_unless_done(enrollment):
+    """
+    Randomize `enrollment` under a row lock unless the warm-up or another
+    login already has. Copies the stored order onto `enrollment` either way
+    and returns True only when this call wrote it.
+    """
+    with transaction.atomic():
+        locked = (
+            StudentExamEnrollment.objects.select_for_update()
+            .only("id", "session_id", "question_order", "answer_order")
+            .get(pk=enrollment.pk)
+        )
+        randomized = not is_randomized(locked)
+        if randomized:
+            question_ids, grouped = load_session_layout(locked.session_id)
+            randomize_enrollment(locked, question_ids, grouped)
+            locked.save(update_fields=["question_order", "answer_order"])
+
+    enrollment.question_order = locked.question_order
+    enrollment.answer_order = locked.answer_order
+    return randomized
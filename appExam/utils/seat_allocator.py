@@ -0,0 +1,135 @@
+from appExam.models import SeatAssignment
+
+SEQUENTIAL = "sequential"
+INTERLEAVE = "interleave"
+FILL_HALL_FIRST = "fill_hall_first"
+
+STRATEGY_CHOICES = [
+    (SEQUENTIAL, "Sequential (hall by hall, seat by seat)"),
+    (INTERLEAVE, "Interleave (avoid same-session neighbours where possible)"),
+    (FILL_HALL_FIRST, "Fill hall first (most occupied halls first)"),
+]
+
+
+def _set_bits(bitmap):
+    """Yield the 1-based positions of the set bits of `bitmap`, ascending."""
+    while bitmap:
+        low = bitmap & -bitmap
+        yield low.bit_length()
+        bitmap ^= low
+
+
+class HallSeats:
+    """
+    Free seats of one hall in one time slot, as a bitmap: bit n - 1 is set
+    while seat n is free. `owners` maps taken seats to their session id.
+    """
+
+    __slots__ = ("free", "hall", "owners")
+
+    def __init__(self, hall, owners):
+        self.hall = hall
+        self.owners = owners
+        self.free = (1 << hall.capacity) - 1
+        for seat_number in owners:
+            if 1 <= seat_number <= hall.capacity:
+                self.free &= ~(1 << (seat_number - 1))
+
+    @property
+    def free_count(self):
+        return self.free.bit_count()
+
+    def take(self, seat_number, session_id):
+        self.free &= ~(1 << (seat_number - 1))
+        self.owners[seat_number] = session_id
+
+    def next_free(self):
+        if not self.free:
+            return None
+        return (self.free & -self.free).bit_length()
+
+    def isolated_free_seats(self, session_id):
+        """
+        Free seats with no neighbour from `session_id`. Lazy, so seats taken
+        while iterating are seen by the neighbour check.
+        """
+        for seat_number in _set_bits(self.free):
+            if (
+                self.owners.get(seat_number - 1) != session_id
+                and self.owners.get(seat_number + 1) != session_id
+            ):
+                yield seat_number
+
+
+class SeatAllocator:
+    """
+    Allocates seats for one session against a single snapshot of the
+    session_base_start slot. Callers hold a lock on the halls (see
+    `for_session`) and write the result with one bulk_create.
+    """
+
+    def __init__(self, session, halls, occupied):
+        self.session = session
+        self.halls = [
+            HallSeats(hall, dict(occupied.get(hall.id, {}))) for hall in halls
+        ]
+
+    @classmethod
+    def for_session(cls, session, halls):
+        """
+        Lock `halls` and load every seat taken in the session's time slot.
+        Must run inside a transaction; concurrent allocations for these halls
+        wait here instead of failing on unique_seat_per_time.
+        """
+        halls = list(halls.select_for_update().order_by("id"))
+        occupied = {}
+        for hall_id, seat_number, session_id in SeatAssignment.objects.filter(
+            hall__in=halls,
+            session_base_start=session.base_start,
+        ).values_list("hall_id", "seat_number", "session_id"):
+            occupied.setdefault(hall_id, {})[seat_number] = session_id
+        return cls(session, halls, occupied)
+
+    @property
+    def free_count(self):
+        return sum(hall.free_count for hall in self.halls)
+
+    def allocate(self, count, strategy=SEQUENTIAL):
+        """Reserve up to `count` seats; returns [(hall, seat_number), ...]."""
+        if strategy == INTERLEAVE:
+            return self._interleave(count)
+        if strategy == FILL_HALL_FIRST:
+            # Most occupied halls first keeps the slot in as few halls as possible
+            halls = sorted(
+                self.halls,
+                key=lambda seats: seats.hall.capacity - seats.free_count,
+                reverse=True,
+            )
+            return self._in_order(halls, count)
+        if strategy == SEQUENTIAL:
+            return self._in_order(self.halls, count)
+        msg = f"Unknown seat allocation strategy: {strategy}"
+        raise ValueError(msg)
+
+    def _in_order(self, halls, count):
+        placed = []
+        for seats in halls:
+            while len(placed) < count:
+                seat_number = seats.next_free()
+                if seat_number is None:
+                    break
+                seats.take(seat_number, self.session.id)
+                placed.append((seats.hall, seat_number))
+        return placed
+
+    def _interleave(self, count):
+        # First pass: seats whose neighbours sit another session's paper;
+        # whatever is left is then filled in order
+        placed = []
+        for seats in self.halls:
+            for seat_number in seats.isolated_free_seats(self.session.id):
+                if len(placed) >= count:
+                    return placed
+                seats.take(seat_number, self.session.id)
+                placed.append((seats.hall, seat_number))
+        return placed + self._in_order(self.halls, count - len(placed))
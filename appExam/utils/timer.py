@@ -0,0 +1,140 @@
+from dataclasses import dataclass
+from dataclasses import replace
+from datetime import datetime
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from appCore.utils.broadcast import enrollment_group
+from appCore.utils.broadcast import send_to_group
+from appCore.utils.broadcast import session_group
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def _parse(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+@dataclass(frozen=True)
+class TimerState:
+    """
+    The inputs of StudentExamEnrollment.effective_time_remaining.
+
+    Exam sockets keep one of these and compute the remaining time locally;
+    pause/resume/extra-time/end events replace or transform it.
+    """
+
+    status: str
+    session_started_at: datetime | None
+    individual_duration: timedelta
+    paused_duration: timedelta
+    individual_paused_duration: timedelta
+    paused_at: datetime | None = None
+    individual_paused_at: datetime | None = None
+
+    @classmethod
+    def from_enrollment(cls, enrollment):
+        return cls(
+            status=enrollment.status,
+            session_started_at=enrollment.session_started_at,
+            individual_duration=enrollment.individual_duration,
+            paused_duration=enrollment.paused_duration,
+            individual_paused_duration=enrollment.individual_paused_duration,
+            paused_at=enrollment.paused_at,
+            individual_paused_at=enrollment.individual_paused_at,
+        )
+
+    def remaining(self, now=None):
+        if not self.session_started_at or self.status not in ["active", "paused"]:
+            return timedelta(0)
+
+        now = now or timezone.now()
+        base_elapsed = now - self.session_started_at
+
+        ongoing_pause = timedelta()
+        if self.status == "paused":
+            if self.paused_at:
+                ongoing_pause += now - self.paused_at
+            if self.individual_paused_at:
+                ongoing_pause += now - self.individual_paused_at
+
+        total_pause = (
+            self.paused_duration + self.individual_paused_duration + ongoing_pause
+        )
+        adjusted_elapsed = base_elapsed - total_pause
+
+        return max(self.individual_duration - adjusted_elapsed, timedelta(0))
+
+    # Session-wide transitions, mirroring the pause/resume/end tasks
+
+    def paused(self, at):
+        if self.status != "active":
+            return self
+        return replace(self, status="paused", paused_at=at)
+
+    def resumed(self, at):
+        if self.status != "paused" or not self.paused_at:
+            return self
+        return replace(
+            self,
+            status="active",
+            paused_duration=self.paused_duration + (at - self.paused_at),
+            paused_at=None,
+        )
+
+    def submitted(self):
+        return replace(self, status="submitted")
+
+    def to_dict(self):
+        return {
+            "status": self.status,
+            "session_started_at": _iso(self.session_started_at),
+            "individual_duration": self.individual_duration.total_seconds(),
+            "paused_duration": self.paused_duration.total_seconds(),
+            "individual_paused_duration": (
+                self.individual_paused_duration.total_seconds()
+            ),
+            "paused_at": _iso(self.paused_at),
+            "individual_paused_at": _iso(self.individual_paused_at),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            status=data["status"],
+            session_started_at=_parse(data["session_started_at"]),
+            individual_duration=timedelta(seconds=data["individual_duration"]),
+            paused_duration=timedelta(seconds=data["paused_duration"]),
+            individual_paused_duration=timedelta(
+                seconds=data["individual_paused_duration"],
+            ),
+            paused_at=_parse(data["paused_at"]),
+            individual_paused_at=_parse(data["individual_paused_at"]),
+        )
+
+
+def publish_timer(enrollment):
+    """Push the enrollment's new timer inputs to its sockets once committed."""
+    state = TimerState.from_enrollment(enrollment).to_dict()
+    transaction.on_commit(
+        lambda: send_to_group(
+            enrollment_group(enrollment.id),
+            "exam.timer_updated",
+            timer=state,
+        ),
+    )
+
+
+def publish_session_event(session_id, event_type, at=None):
+    """
+    Push a session-wide start/pause/resume/end (`exam.session_paused` etc.) to
+    every socket of the session once committed.
+    """
+    payload = {"at": _iso(at)} if at else {}
+    transaction.on_commit(
+        lambda: send_to_group(session_group(session_id), event_type, **payload),
+    )
@@ -1,7 +1,5 @@
 # appExam/views.py - Performance Optimized Version
 
-from django.core.cache import cache
-from django.core.paginator import Paginator
 from django.db import transaction
 from django.utils import timezone
 from rest_framework import status
@@ -11,12 +9,19 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
 from appAuthentication.models import Candidate
-from appExam.models import Answer
-from appExam.models import Question
 from appExam.models import StudentAnswer
 from appExam.models import StudentExamEnrollment
 
 from .utils.active_enrollment import get_candidate_active_enrollment
+from .utils.answer_batch import save_answer_batch
+from .utils.answer_buffer import buffer_answer
+from .utils.answer_buffer import current_answer_ids
+from .utils.answer_buffer import flush_dirty_enrollments
+from .utils.answer_buffer import write_behind_enabled
+from .utils.answered_index import answered_answer_id
+from .utils.answered_index import get_answered
+from .utils.paper import get_paper
+from .utils.question_bank import get_session_bank
 
 
 # ------------------------- Get Exam Session Details -------------------------
@@ -67,12 +72,8 @@ def get_exam_session_view(request):
 
     exam = session.exam
 
-    # Use cache for question count if it doesn't change frequently
-    cache_key = f"question_count_{session.id}"
-    total_questions = cache.get(cache_key)
-    if total_questions is None:
-        total_questions = Question.objects.filter(session=session).count()
-        cache.set(cache_key, total_questions, 3600)  # Cache for 1 hour
+    # Question count comes from the compiled session bank
+    total_questions = len(get_session_bank(session.id))
 
     # Calculate duration and time remaining
     duration_minutes = (
@@ -145,91 +146,52 @@ def get_paginated_questions_view(request):  # noqa: C901
 
     # Get pagination parameters
     page = int(request.GET.get("page", 1))
-    page_size = 1
 
-    # Get randomized orders
-    question_order = enrollment.question_order
-    answer_order = enrollment.answer_order
+    # Materialized paper: page -> question id, letter <-> answer id
+    paper = get_paper(enrollment)
 
-    if not question_order:
+    if not paper:
         return Response(
             {"error": "Questions not yet randomized for this candidate", "status": 400},
             status=status.HTTP_400_BAD_REQUEST,
         )
 
     # Validate page number
-    paginator = Paginator(question_order, page_size)
-    if page > paginator.num_pages:
+    question_id = paper.question_for_page(page)
+    if question_id is None:
         return Response(
             {"error": "Page number out of range", "status": 404},
             status=status.HTTP_404_NOT_FOUND,
         )
 
-    # Get single question ID for this page
-    page_obj = paginator.get_page(page)
-    question_id = page_obj.object_list[0]
-
-    # Single query to get question with prefetch
-    try:
-        question = Question.objects.get(id=question_id)
-    except Question.DoesNotExist:
+    # Question and answer texts come from the compiled session bank
+    bank = get_session_bank(enrollment.session_id)
+    question_text = bank.questions.get(question_id)
+    if question_text is None:
         return Response(
             {"error": "Question not found", "status": 404},
             status=status.HTTP_404_NOT_FOUND,
         )
 
-    # Get randomized answer IDs for this question
-    randomized_answer_ids = answer_order.get(str(question_id), [])
-
-    # Bulk fetch answers in one query
-    answers = Answer.objects.filter(id__in=randomized_answer_ids)
-    answer_map = {ans.id: ans for ans in answers}
-
-    # Build answers in correct order
-    answers_data = []
-    answer_letters = ["a", "b", "c", "d"]
-
-    for index, answer_id in enumerate(randomized_answer_ids):
-        if answer_id in answer_map:
-            answers_data.append(
-                {
-                    "options": answer_map[answer_id].text,
-                    "answer_number": answer_letters[index]
-                    if index < len(answer_letters)
-                    else str(index + 1),
-                },
-            )
-
-    # Check student's existing answer with single query
-    student_answer = None
-    is_answered = False
+    # Build answers in the candidate's order
+    answers_data = [
+        {
+            "options": bank.answers[answer_id],
+            "answer_number": letter,
+        }
+        for letter, answer_id in paper.options(question_id)
+        if answer_id in bank.answers
+    ]
 
-    try:
-        student_answer_obj = StudentAnswer.objects.select_related(
-            "selected_answer",
-        ).get(
-            enrollment=enrollment,
-            question=question,
-        )
-        if student_answer_obj.selected_answer:
-            selected_answer_id = student_answer_obj.selected_answer.id
-            try:
-                answer_index = randomized_answer_ids.index(selected_answer_id)
-                student_answer = (
-                    answer_letters[answer_index]
-                    if answer_index < len(answer_letters)
-                    else str(answer_index + 1)
-                )
-                is_answered = True
-            except ValueError:
-                pass
-    except StudentAnswer.DoesNotExist:
-        pass
+    # Check student's existing answer, including any not yet flushed
+    selected_answer_id = answered_answer_id(enrollment.id, question_id)
+    student_answer = paper.letter_for(question_id, selected_answer_id)
+    is_answered = student_answer is not None
 
     question_data = {
-        "id": question.id,
+        "id": question_id,
         "shift_plan_program_id": enrollment.session.exam.program.id,
-        "question": question.text,
+        "question": question_text,
         "answers": answers_data,
         "student_answer": student_answer,
         "is_answered": is_answered,
@@ -267,83 +229,46 @@ def get_question_list_view(request):
             status=status.HTTP_404_NOT_FOUND,
         )
 
-    q_order = enrollment.question_order or []
-    a_order = enrollment.answer_order or {}
+    paper = get_paper(enrollment)
 
-    if not q_order:
+    if not paper:
         return Response(
             {"error": "Questions not yet randomized", "status": 400},
             status=status.HTTP_400_BAD_REQUEST,
         )
 
-    # MASSIVE OPTIMIZATION: Single bulk query for all questions
-    questions = Question.objects.filter(id__in=q_order).only("id", "text")
-    q_map = {q.id: q for q in questions}
+    # Question and answer texts come from the compiled session bank
+    bank = get_session_bank(enrollment.session_id)
 
-    # MASSIVE OPTIMIZATION: Single bulk query for all answers
-    all_answer_ids = [aid for qid_str in a_order.values() for aid in qid_str]
-    answers = Answer.objects.filter(id__in=all_answer_ids).only("id", "text")
-    ans_map = {ans.id: ans for ans in answers}
-
-    # MASSIVE OPTIMIZATION: Single bulk query for all student answers
-    student_answers = (
-        StudentAnswer.objects.filter(
-            enrollment=enrollment,
-            question_id__in=q_order,
-        )
-        .select_related("selected_answer")
-        .only("question_id", "selected_answer_id")
-    )
-    sa_map = {sa.question_id: sa for sa in student_answers}
+    # Answered questions come from the per-enrollment index, no query
+    sa_map = get_answered(enrollment.id)
 
-    answer_letters = ["a", "b", "c", "d"]
     questions_data = []
 
     # Process all questions in memory (very fast)
-    for qid in q_order:
-        q = q_map.get(qid)
-        if not q:
+    for qid in paper.pages:
+        question_text = bank.questions.get(qid)
+        if question_text is None:
             continue
 
-        # Build answers for this question
-        randomized_ids = a_order.get(str(qid), [])
-        answers_data = []
-
-        for idx, aid in enumerate(randomized_ids):
-            ans = ans_map.get(aid)
-            if ans:
-                letter = (
-                    answer_letters[idx] if idx < len(answer_letters) else str(idx + 1)
-                )
-                answers_data.append(
-                    {
-                        "options": ans.text,
-                        "answer_number": letter,
-                    },
-                )
-
-        # Check student answer
-        student_answer = None
-        is_answered = False
-        sa = sa_map.get(qid)
-
-        if sa and sa.selected_answer_id:
-            try:
-                pos = randomized_ids.index(sa.selected_answer_id)
-                student_answer = (
-                    answer_letters[pos] if pos < len(answer_letters) else str(pos + 1)
-                )
-                is_answered = True
-            except ValueError:
-                pass
+        answers_data = [
+            {
+                "options": bank.answers[aid],
+                "answer_number": letter,
+            }
+            for letter, aid in paper.options(qid)
+            if aid in bank.answers
+        ]
+
+        student_answer = paper.letter_for(qid, sa_map.get(qid))
 
         questions_data.append(
             {
-                "id": q.id,
-                "question": q.text,
+                "id": qid,
+                "question": question_text,
                 "answers": answers_data,
                 "student_answer": student_answer,
-                "is_answered": is_answered,
+                "is_answered": student_answer is not None,
             },
         )
 
@@ -358,6 +283,37 @@ def get_question_list_view(request):
 
 
 # ------------------------- Submit Answer -------------------------
+def _clear_answer(enrollment, question_id):
+    """Clear a stored answer; returns whether there was one to clear"""
+    if write_behind_enabled():
+        buffer_answer(enrollment.id, question_id, None)
+        return True
+    deleted, _ = StudentAnswer.objects.filter(
+        enrollment=enrollment,
+        question_id=question_id,
+    ).delete()
+    return bool(deleted)
+
+
+def _store_answer(enrollment, question_id, selected_answer_id):
+    """Save an answer; returns the answer row id, or None while buffered"""
+    if write_behind_enabled():
+        # Acknowledge straight away; the flusher persists it in bulk
+        buffer_answer(enrollment.id, question_id, selected_answer_id)
+        return None
+    with transaction.atomic():
+        student_answer, created = StudentAnswer.objects.get_or_create(
+            enrollment=enrollment,
+            question_id=question_id,
+            defaults={"selected_answer_id": selected_answer_id},
+        )
+
+        if not created:
+            student_answer.selected_answer_id = selected_answer_id
+            student_answer.save(update_fields=["selected_answer"])
+    return student_answer.id
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def submit_answer_view(request):  # noqa: PLR0911
@@ -387,9 +343,15 @@ def submit_answer_view(request):  # noqa: PLR0911
             status=status.HTTP_400_BAD_REQUEST,
         )
 
+    paper = get_paper(enrollment)
+    bank = get_session_bank(enrollment.session_id)
+
     try:
-        question = Question.objects.get(id=question_id)
-    except Question.DoesNotExist:
+        question_id = int(question_id)
+    except (TypeError, ValueError):
+        question_id = None
+
+    if not paper or question_id not in paper or question_id not in bank.questions:
         return Response(
             {"error": "Question not found", "status": 404},
             status=status.HTTP_404_NOT_FOUND,
@@ -397,16 +359,13 @@ def submit_answer_view(request):  # noqa: PLR0911
 
     # If selected_answer is null → clear answer
     if selected_answer_letter is None:
-        deleted, _ = StudentAnswer.objects.filter(
-            enrollment=enrollment,
-            question=question,
-        ).delete()
+        deleted = _clear_answer(enrollment, question_id)
         return Response(
             {
                 "data": {
                     "question_id": question_id,
                     "selected_answer": None,
-                    "cleared": bool(deleted),
+                    "cleared": deleted,
                 },
                 "message": "Answer cleared successfully",
                 "error": None,
@@ -415,43 +374,27 @@ def submit_answer_view(request):  # noqa: PLR0911
         )
 
     # Proceed with normal answer submission
-    answer_order = enrollment.answer_order
-    randomized_answer_ids = answer_order.get(str(question_id), [])
-
-    if not randomized_answer_ids:
+    if not paper.options(question_id):
         return Response(
             {"error": "Answer order not found for this question", "status": 400},
             status=status.HTTP_400_BAD_REQUEST,
         )
 
-    answer_letters = ["a", "b", "c", "d"]
-    try:
-        answer_index = answer_letters.index(selected_answer_letter.lower())
-        selected_answer_id = randomized_answer_ids[answer_index]
-        selected_answer = Answer.objects.get(id=selected_answer_id)
-    except (ValueError, IndexError, Answer.DoesNotExist):
+    selected_answer_id = paper.answer_id(question_id, selected_answer_letter)
+    if selected_answer_id is None or selected_answer_id not in bank.answers:
         return Response(
             {"error": "Invalid answer selection", "status": 400},
             status=status.HTTP_400_BAD_REQUEST,
         )
 
-    with transaction.atomic():
-        student_answer, created = StudentAnswer.objects.get_or_create(
-            enrollment=enrollment,
-            question=question,
-            defaults={"selected_answer": selected_answer},
-        )
-
-        if not created:
-            student_answer.selected_answer = selected_answer
-            student_answer.save(update_fields=["selected_answer"])
+    answer_row_id = _store_answer(enrollment, question_id, selected_answer_id)
 
     return Response(
         {
             "data": {
                 "question_id": question_id,
                 "selected_answer": selected_answer_letter,
-                "submitted_at": student_answer.id,
+                "submitted_at": answer_row_id,
             },
             "message": "Answer submitted successfully",
             "error": None,
@@ -460,6 +403,41 @@ def submit_answer_view(request):  # noqa: PLR0911
     )
 
 
+# ------------------------- Submit Answers Batch -------------------------
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def submit_answers_batch(request):
+    """
+    Submit or clear several answers at once, e.g. to resync after a reconnect.
+    Expects {"answers": [{question_id, selected_answer, client_seq}, ...]}
+    or the bare list.
+    """
+    candidate, enrollment = get_candidate_active_enrollment(request.user)
+
+    if not candidate:
+        return Response(
+            {"error": "Candidate profile not found", "status": 404},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+
+    if not enrollment:
+        return Response(
+            {"error": "No scheduled exams found for the user", "status": 404},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+
+    entries = request.data
+    if not isinstance(entries, list):
+        entries = entries.get("answers")
+
+    result = save_answer_batch(
+        get_paper(enrollment),
+        enrollment.session_id,
+        entries,
+    )
+    return Response(result, status=result["status"])
+
+
 # ------------------------- Get Exam Review -------------------------
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
@@ -493,67 +471,45 @@ def get_exam_review(request):
         institute = enrollment.session.exam.program.institute
         show_submissions = institute.show_student_submissions
 
-        q_order = enrollment.question_order or []
-        a_order = enrollment.answer_order or {}
+        paper = get_paper(enrollment)
 
-        if not q_order:
+        if not paper:
             return Response(
                 {"error": "Exam data not available", "status": 400},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        questions = Question.objects.filter(id__in=q_order)
-        q_map = {q.id: q for q in questions}
-
-        all_answer_ids = [aid for qid in q_order for aid in a_order.get(str(qid), [])]
-        answers = Answer.objects.filter(id__in=all_answer_ids)
-        ans_map = {ans.id: ans for ans in answers}
-
-        sa_map = {}
-
         questions_data = None
 
         if show_submissions:
-            student_answers = StudentAnswer.objects.filter(
-                enrollment=enrollment,
-                question_id__in=q_order,
-            )
-            sa_map = {sa.question_id: sa for sa in student_answers}
+            sa_map = current_answer_ids(enrollment.id, paper.pages)
 
-            answer_letters = ["a", "b", "c", "d"]
+            bank = get_session_bank(enrollment.session_id)
             questions_data = []
 
-            for qid in q_order:
-                q = q_map.get(qid)
-                if not q:
+            for qid in paper.pages:
+                question_text = bank.questions.get(qid)
+                if question_text is None:
                     continue
 
-                randomized_ids = a_order.get(str(qid), [])
                 answers_data = [
                     {
-                        "options": ans_map[aid].text,
-                        "answer_number": answer_letters[idx]
-                        if idx < len(answer_letters)
-                        else str(idx + 1),
+                        "options": bank.answers[aid],
+                        "answer_number": letter,
                     }
-                    for idx, aid in enumerate(randomized_ids)
-                    if aid in ans_map
+                    for letter, aid in paper.options(qid)
+                    if aid in bank.answers
                 ]
 
                 entry = {
-                    "id": q.id,
-                    "question": q.text,
+                    "id": qid,
+                    "question": question_text,
                     "answers": answers_data,
                 }
 
-                sa = sa_map.get(qid)
-                if sa and sa.selected_answer_id in randomized_ids:
-                    pos = randomized_ids.index(sa.selected_answer_id)
-                    entry["student_answer"] = (
-                        answer_letters[pos]
-                        if pos < len(answer_letters)
-                        else str(pos + 1)
-                    )
+                student_answer = paper.letter_for(qid, sa_map.get(qid))
+                if student_answer is not None:
+                    entry["student_answer"] = student_answer
 
                 questions_data.append(entry)
 
@@ -627,6 +583,9 @@ def submit_active_exam(request):
                 status=status.HTTP_404_NOT_FOUND,
             )
 
+        if write_behind_enabled():
+            flush_dirty_enrollments([enrollment.id])
+
         enrollment.status = "submitted"
         enrollment.present = False
         enrollment.disconnected_at = timezone.now()
@@ -124,6 +124,8 @@ PASSWORD_HASHERS = [
     "django.contrib.auth.hashers.PBKDF2PasswordHasher",
     "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
     "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    # Opt-in per candidate import, see appAuthentication.hashers
+    "appAuthentication.hashers.ExamCredentialPasswordHasher",
 ]
 # https://docs.djangoproject.com/en/dev/ref/settings/#auth-password-validators
 AUTH_PASSWORD_VALIDATORS = [
@@ -279,6 +281,20 @@ LOGGING = {
 REDIS_URL = env("REDIS_URL", default="redis://redis:6379/0")
 REDIS_SSL = REDIS_URL.startswith("rediss://")
 
+# Channels
+# ------------------------------------------------------------------------------
+# https://channels.readthedocs.io/en/stable/topics/channel_layers.html
+# Exam-control events (pause, resume, extra time, end) are published once per
+# session/enrollment group and fanned out to the sockets on every ASGI node.
+CHANNEL_LAYERS = {
+    "default": {
+        "BACKEND": "channels_redis.core.RedisChannelLayer",
+        "CONFIG": {
+            "hosts": [REDIS_URL],
+        },
+    },
+}
+
 # Celery
 # ------------------------------------------------------------------------------
 if USE_TZ:
@@ -403,6 +419,18 @@ MIDDLEWARE = [
     "appCore.middleware.APILogMiddleware",
 ]
 
+# Exam answers
+# ------------------------------------------------------------------------------
+# Buffer answer clicks in Redis and persist them in bulk every
+# EXAM_ANSWER_FLUSH_INTERVAL seconds instead of one write per click
+EXAM_ANSWER_WRITE_BEHIND = env.bool("EXAM_ANSWER_WRITE_BEHIND", default=False)
+EXAM_ANSWER_FLUSH_INTERVAL = env.float("EXAM_ANSWER_FLUSH_INTERVAL", default=5.0)
+# Randomize papers and prime the bank/paper caches this many minutes before
+# a session's base_start, so candidate logins only read caches
+EXAM_WARMUP_LEAD_MINUTES = env.int("EXAM_WARMUP_LEAD_MINUTES", default=30)
+# Seconds between sweeps of the exam deadline index
+EXAM_DEADLINE_TICK_INTERVAL = env.float("EXAM_DEADLINE_TICK_INTERVAL", default=1.0)
+
 JAZZMIN_UI_TWEAKS = {
     "theme": "simplex",
 }
@@ -419,4 +447,16 @@ CELERY_BEAT_SCHEDULE = {
         "task": "appCore.tasks.exam_monitor",
         "schedule": crontab(minute="*"),
     },
+    "submit_due_enrollments": {
+        "task": "appCore.tasks.submit_due_enrollments",
+        "schedule": EXAM_DEADLINE_TICK_INTERVAL,
+        # A backed-up tick is superseded by the next one
+        "options": {"expires": EXAM_DEADLINE_TICK_INTERVAL},
+    },
 }
+
+if EXAM_ANSWER_WRITE_BEHIND:
+    CELERY_BEAT_SCHEDULE["flush_answer_buffers"] = {
+        "task": "appCore.tasks.flush_answer_buffers",
+        "schedule": EXAM_ANSWER_FLUSH_INTERVAL,
+    }
@@ -0,0 +1,168 @@
+import importlib
+from datetime import timedelta
+
+import fakeredis
+import pytest
+from django.utils import timezone
+
+# Modules holding a module-level `redis_client`
+REDIS_CLIENT_MODULES = [
+    "appCore.tasks",
+    "appCore.views",
+    "appExam.utils.answer_buffer",
+    "appExam.utils.answered_index",
+    "appExam.utils.deadlines",
+    "appExam.utils.enrollment_cache",
+    "appExam.utils.enrollment_state",
+    "appExam.utils.paper",
+    "appExam.utils.question_bank",
+    "appExam.utils.question_staging",
+]
+
+# In-process L1 caches that would leak between tests
+LOCAL_CACHES = [
+    ("appExam.utils.paper", "_local_papers"),
+    ("appExam.utils.question_bank", "_local_banks"),
+]
+
+
+@pytest.fixture(autouse=True)
+def redis_client(monkeypatch):
+    """Point every module-level Redis client at one empty in-memory server."""
+    client = fakeredis.FakeRedis()
+    for module_name in REDIS_CLIENT_MODULES:
+        monkeypatch.setattr(f"{module_name}.redis_client", client)
+    for module_name, cache_name in LOCAL_CACHES:
+        getattr(importlib.import_module(module_name), cache_name).clear()
+    return client
+
+
+@pytest.fixture
+def write_behind(settings):
+    settings.EXAM_ANSWER_WRITE_BEHIND = True
+
+
+@pytest.fixture(params=[False, True], ids=["direct", "buffered"])
+def answer_mode(request, settings):
+    """Runs a test with answers written directly and through the buffer."""
+    settings.EXAM_ANSWER_WRITE_BEHIND = request.param
+    return request.param
+
+
+@pytest.fixture
+def institute(db):
+    from appInstitutions.models import Institute
+
+    return Institute.objects.create(name="Institute", email="institute@example.com")
+
+
+@pytest.fixture
+def exam_session(institute):
+    """An exam session with five questions of four answers, the first correct."""
+    from appExam.models import Answer
+    from appExam.models import Exam
+    from appExam.models import ExamSession
+    from appExam.models import Question
+    from appInstitutions.models import Program
+
+    program = Program.objects.create(name="Program", institute=institute, program_id=1)
+    exam = Exam.objects.create(program=program, total_marks=10)
+    session = ExamSession.objects.create(exam=exam, base_start=timezone.now())
+    for number in range(5):
+        question = Question.objects.create(text=f"Question {number}", session=session)
+        Answer.objects.bulk_create(
+            Answer(
+                question=question,
+                text=f"Answer {number}{index}",
+                is_correct=not index,
+            )
+            for index in range(4)
+        )
+    return session
+
+
+@pytest.fixture
+def make_candidate(institute):
+    from appAuthentication.models import Candidate
+    from appAuthentication.models import User
+
+    def make_candidate(symbol_number, password="password"):  # noqa: S107
+        email = f"{symbol_number}@example.com"
+        user = User.objects.create_user(
+            email=email,
+            password=password,
+            is_candidate=True,
+        )
+        return Candidate.objects.create(
+            user=user,
+            admit_card_id=1,
+            profile_id=1,
+            symbol_number=symbol_number,
+            exam_processing_id=1,
+            gender="male",
+            citizenship_no="1",
+            first_name="First",
+            last_name="Last",
+            dob_nep="2060-01-01",
+            email=email,
+            phone="9800000000",
+            level_id=1,
+            level="Level",
+            program_id=1,
+            program="Program",
+            generated_password=password,
+            institute=institute,
+        )
+
+    return make_candidate
+
+
+@pytest.fixture
+def enrollments(exam_session, make_candidate):
+    """Three candidates enrolled in `exam_session`."""
+    from appExam.models import StudentExamEnrollment
+
+    return [
+        StudentExamEnrollment.objects.create(
+            candidate=make_candidate(f"b1000{number}"),
+            session=exam_session,
+            individual_duration=exam_session.base_duration,
+        )
+        for number in range(3)
+    ]
+
+
+@pytest.fixture
+def enrollment(exam_session, enrollments, django_capture_on_commit_callbacks):
+    """The first candidate's enrollment in the started session, randomized."""
+    from appExam.utils.randomize import randomize_unless_done
+
+    with django_capture_on_commit_callbacks(execute=True):
+        exam_session.start_session()
+    enrollment = enrollments[0]
+    enrollment.refresh_from_db()
+    randomize_unless_done(enrollment)
+    return enrollment
+
+
+@pytest.fixture
+def api_client(enrollment):
+    """An API client logged in as `enrollment`'s candidate."""
+    from rest_framework.test import APIClient
+
+    client = APIClient()
+    client.force_authenticate(enrollment.candidate.user)
+    return client
+
+
+@pytest.fixture
+def expire(db):
+    """Moves enrollments' start back far enough that their time has run out."""
+    from appExam.models import StudentExamEnrollment
+
+    def expire(*enrollments, **values):
+        StudentExamEnrollment.objects.filter(
+            pk__in=[enrollment.pk for enrollment in enrollments],
+        ).update(session_started_at=timezone.now() - timedelta(hours=5), **values)
+
+    return expire